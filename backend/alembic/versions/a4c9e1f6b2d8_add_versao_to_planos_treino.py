@@ -0,0 +1,26 @@
+"""add versao to planos_treino
+
+Revision ID: a4c9e1f6b2d8
+Revises: f1b7d4a9c3e6
+Create Date: 2026-10-18
+
+Versão de conteúdo do plano, incrementada a cada alteração na árvore
+(plano, treinos, prescrições). Base do ETag de /alunos/me/plano-ativo.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = 'a4c9e1f6b2d8'
+down_revision: Union[str, None] = 'f1b7d4a9c3e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('planos_treino', sa.Column('versao', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    op.drop_column('planos_treino', 'versao')
@@ -0,0 +1,48 @@
+"""add word-prefix search terms for alunos
+
+Revision ID: b2f7c4e9d1a6
+Revises: c2e6a8d4f9b1
+Create Date: 2026-10-18
+
+A busca do roster passa a casar o início de qualquer palavra do nome ("silva"
+encontra "Ana Silva"). alunos_termos_busca guarda as palavras do nome em
+minúsculas, uma por linha, com btree text_pattern_ops para LIKE 'termo%'
+(pg_trgm não está disponível em todo Postgres gerenciado). O índice de prefixo
+em lower(nome) deixa de ser usado e é removido.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = 'b2f7c4e9d1a6'
+down_revision: Union[str, None] = 'c2e6a8d4f9b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'alunos_termos_busca',
+        sa.Column('aluno_id', sa.Integer(), sa.ForeignKey('alunos.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('termo', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('aluno_id', 'termo'),
+    )
+    op.create_index('ix_alunos_termos_busca_termo', 'alunos_termos_busca',
+                    [sa.text('termo text_pattern_ops')])
+    op.execute(
+        "INSERT INTO alunos_termos_busca (aluno_id, termo) "
+        "SELECT DISTINCT id, lower(palavra) FROM alunos, regexp_split_to_table(nome, '\\s+') AS palavra "
+        "WHERE palavra <> ''"
+    )
+
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_alunos_nome_prefixo', table_name='alunos', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_alunos_nome_prefixo', 'alunos', [sa.text('lower(nome) text_pattern_ops')],
+                        postgresql_concurrently=True, if_not_exists=True)
+    op.drop_index('ix_alunos_termos_busca_termo', table_name='alunos_termos_busca')
+    op.drop_table('alunos_termos_busca')
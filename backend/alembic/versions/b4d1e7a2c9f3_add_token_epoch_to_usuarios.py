@@ -0,0 +1,26 @@
+"""add token_epoch to usuarios
+
+Revision ID: b4d1e7a2c9f3
+Revises: a9b8c7d6e5f4
+Create Date: 2026-10-18
+
+Época por usuário assinada no token (claim "epoch"). Incrementá-la revoga
+todos os tokens emitidos antes (reset de senha, troca de papel).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = 'b4d1e7a2c9f3'
+down_revision: Union[str, None] = 'a9b8c7d6e5f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('usuarios', sa.Column('token_epoch', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('usuarios', 'token_epoch')
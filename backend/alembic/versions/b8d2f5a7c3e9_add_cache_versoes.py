@@ -0,0 +1,33 @@
+"""add cache_versoes
+
+Revision ID: b8d2f5a7c3e9
+Revises: a4c9e1f6b2d8
+Create Date: 2026-10-18
+
+Versão por chave dos caches em memória (ex: biblioteca de exercícios). Cada
+worker compara a versão do banco (lookup por PK) com a do seu cache local;
+os caminhos de escrita incrementam a versão na mesma transação.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = 'b8d2f5a7c3e9'
+down_revision: Union[str, None] = 'a4c9e1f6b2d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    tabela = op.create_table(
+        'cache_versoes',
+        sa.Column('chave', sa.String(length=50), nullable=False),
+        sa.Column('versao', sa.Integer(), nullable=False, server_default='1'),
+        sa.PrimaryKeyConstraint('chave'),
+    )
+    op.bulk_insert(tabela, [{'chave': 'exercicios', 'versao': 1}])
+
+
+def downgrade() -> None:
+    op.drop_table('cache_versoes')
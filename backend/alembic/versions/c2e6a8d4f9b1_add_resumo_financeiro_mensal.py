@@ -0,0 +1,46 @@
+"""add resumo_financeiro_mensal
+
+Revision ID: c2e6a8d4f9b1
+Revises: b8d2f5a7c3e9
+Create Date: 2026-10-18
+
+Rollup mensal de receita por trainer (trainer_id = 0 para alunos sem trainer),
+lido pelo dashboard financeiro em vez de agregar o histórico de pagamentos.
+A tabela já nasce preenchida a partir dos pagamentos existentes; depois é
+mantida pelos controllers e pode ser refeita com `python -m src.reconstruir_resumo`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = 'c2e6a8d4f9b1'
+down_revision: Union[str, None] = 'b8d2f5a7c3e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'resumo_financeiro_mensal',
+        sa.Column('trainer_id', sa.Integer(), nullable=False),
+        sa.Column('periodo', sa.Date(), nullable=False),
+        sa.Column('receita', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('n_pagamentos', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('n_alunos_pagantes', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('trainer_id', 'periodo'),
+    )
+    op.execute(
+        """
+        INSERT INTO resumo_financeiro_mensal (trainer_id, periodo, receita, n_pagamentos, n_alunos_pagantes)
+        SELECT COALESCE(a.trainer_id, 0), p.periodo, COALESCE(SUM(p.valor), 0), COUNT(p.id), COUNT(DISTINCT p.aluno_id)
+        FROM pagamentos p
+        JOIN alunos a ON a.id = p.aluno_id
+        WHERE p.periodo IS NOT NULL
+        GROUP BY COALESCE(a.trainer_id, 0), p.periodo
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('resumo_financeiro_mensal')
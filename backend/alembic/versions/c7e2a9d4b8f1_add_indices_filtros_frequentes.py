@@ -0,0 +1,39 @@
+"""add indices for hot filter paths
+
+Revision ID: c7e2a9d4b8f1
+Revises: b4d1e7a2c9f3
+Create Date: 2026-10-18
+
+Índices compostos para os filtros de listar_alunos_ativos, get_aluno,
+calcular_frequencia_mensal, calcular_estatisticas_financeiras e
+criar_plano_treino. Criados com CONCURRENTLY (fora de transação) para não
+bloquear escritas em produção; IF NOT EXISTS permite reexecutar após falha.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = 'c7e2a9d4b8f1'
+down_revision: Union[str, None] = 'b4d1e7a2c9f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDICES = [
+    ('ix_sessoes_treino_aluno_data_hora', 'sessoes_treino', ['aluno_id', 'data_hora']),
+    ('ix_pagamentos_aluno_referencia_mes', 'pagamentos', ['aluno_id', 'referencia_mes']),
+    ('ix_treinos_plano_id', 'treinos', ['plano_id']),
+    ('ix_prescricoes_treino_id', 'prescricoes', ['treino_id']),
+    ('ix_planos_treino_aluno_ativo', 'planos_treino', ['aluno_id', 'esta_ativo']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for nome, tabela, colunas in INDICES:
+            op.create_index(nome, tabela, colunas, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for nome, tabela, _ in reversed(INDICES):
+            op.drop_index(nome, table_name=tabela, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,55 @@
+"""add periodo (date) to pagamentos
+
+Revision ID: d3f8b1c6e2a7
+Revises: c7e2a9d4b8f1
+Create Date: 2026-10-18
+
+Pagamento.periodo guarda o mês de referência como o 1º dia do mês (DATE),
+substituindo o filtro por string "MM/YYYY" nos caminhos quentes. Linhas
+existentes são preenchidas a partir de referencia_mes; valores fora do
+formato ficam NULL. O índice antigo (aluno_id, referencia_mes) é trocado
+por (aluno_id, periodo) e (periodo).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = 'd3f8b1c6e2a7'
+down_revision: Union[str, None] = 'c7e2a9d4b8f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDICES = [
+    ('ix_pagamentos_aluno_periodo', ['aluno_id', 'periodo']),
+    ('ix_pagamentos_periodo', ['periodo']),
+]
+
+
+def upgrade() -> None:
+    op.add_column('pagamentos', sa.Column('periodo', sa.Date(), nullable=True))
+    op.execute(
+        "UPDATE pagamentos SET periodo = to_date(referencia_mes, 'MM/YYYY') "
+        "WHERE referencia_mes ~ '^(0[1-9]|1[0-2])/[0-9]{4}$'"
+    )
+    # Normaliza "1/2026" -> "01/2026" para manter a string coerente com periodo
+    op.execute(
+        "UPDATE pagamentos SET periodo = to_date(referencia_mes, 'MM/YYYY'), "
+        "referencia_mes = to_char(to_date(referencia_mes, 'MM/YYYY'), 'MM/YYYY') "
+        "WHERE referencia_mes ~ '^[1-9]/[0-9]{4}$'"
+    )
+
+    with op.get_context().autocommit_block():
+        for nome, colunas in INDICES:
+            op.create_index(nome, 'pagamentos', colunas, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_pagamentos_aluno_referencia_mes', table_name='pagamentos',
+                      postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_pagamentos_aluno_referencia_mes', 'pagamentos', ['aluno_id', 'referencia_mes'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        for nome, _ in reversed(INDICES):
+            op.drop_index(nome, table_name='pagamentos', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('pagamentos', 'periodo')
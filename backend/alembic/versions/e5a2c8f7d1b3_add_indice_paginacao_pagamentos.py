@@ -0,0 +1,29 @@
+"""add keyset index for payment listing
+
+Revision ID: e5a2c8f7d1b3
+Revises: d3f8b1c6e2a7
+Create Date: 2026-10-18
+
+(data_pagamento, id) sustenta a ordenação e o cursor de /pagamentos/pagina
+e /pagamentos/stream quando a listagem não é filtrada por aluno.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = 'e5a2c8f7d1b3'
+down_revision: Union[str, None] = 'd3f8b1c6e2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_pagamentos_data_pagamento_id', 'pagamentos', ['data_pagamento', 'id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_pagamentos_data_pagamento_id', table_name='pagamentos',
+                      postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,32 @@
+"""add prefix search indexes on alunos
+
+Revision ID: f1b7d4a9c3e6
+Revises: e5a2c8f7d1b3
+Create Date: 2026-10-18
+
+Busca do roster por prefixo: lower(nome) LIKE 'termo%' e cpf LIKE 'digitos%'.
+text_pattern_ops deixa o btree atender LIKE em qualquer collation.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = 'f1b7d4a9c3e6'
+down_revision: Union[str, None] = 'e5a2c8f7d1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_alunos_nome_prefixo', 'alunos', [sa.text('lower(nome) text_pattern_ops')],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_alunos_cpf_prefixo', 'alunos', [sa.text('cpf text_pattern_ops')],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for nome in ('ix_alunos_cpf_prefixo', 'ix_alunos_nome_prefixo'):
+            op.drop_index(nome, table_name='alunos', postgresql_concurrently=True, if_exists=True)
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import logging
 from contextlib import asynccontextmanager
@@ -8,8 +9,8 @@ from fastapi.exceptions import RequestValidationError
 from fastapi.staticfiles import StaticFiles
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from src import exceptions
-from src.routes import alunos, planos, pagamentos, sessoes, auth, exercicios, meu_perfil, admin, prescricoes
+from src import exceptions, security
+from src.routes import alunos, planos, pagamentos, sessoes, auth, exercicios, meu_perfil, admin, prescricoes, exportacao
 from src.config import settings # Importa as configurações
 
 # Configuração básica de logging
@@ -21,12 +22,15 @@ async def lifespan(app: FastAPI):
     # A criação de tabelas agora é gerida via Alembic Migrations.
     print(f"Sistema {settings.PROJECT_NAME} (v{settings.VERSION}) pronto!")
     yield
+    # shutdown(wait=True) bloqueia até os processos saírem: fora do event loop
+    await asyncio.to_thread(security.pool_hashes_importacao.encerrar)
 
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API profissional para Personal Trainers",
-    version=settings.VERSION
+    version=settings.VERSION,
+    lifespan=lifespan,
 )
 
 # --- MIDDLEWARES ---
@@ -36,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "ETag", "Content-Disposition", "X-Importados", "X-Total-Erros"],
 )
 
 # --- EXCEPTION HANDLERS ---
@@ -53,6 +58,14 @@ async def business_rule_handler(request: Request, exc: exceptions.BusinessRuleEr
         content={"message": str(exc), "type": "BusinessRuleViolation"}
     )
 
+@app.exception_handler(exceptions.ServiceUnavailableError)
+async def service_unavailable_handler(request: Request, exc: exceptions.ServiceUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={"message": str(exc), "type": "ServiceUnavailable"},
+        headers={"Retry-After": "1"},
+    )
+
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     return JSONResponse(
@@ -94,6 +107,7 @@ app.include_router(prescricoes.router)
 app.include_router(exercicios.router)
 app.include_router(pagamentos.router)
 app.include_router(sessoes.router)
+app.include_router(exportacao.router)
 
 # --- SERVIR FRONTEND (PRODUÇÃO) ---
 # Verifica se a pasta static existe (criada no Docker build)
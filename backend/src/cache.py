@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """Cache em memória (por processo) com expiração por tempo e limite de tamanho (LRU)."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._dados: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave: Hashable) -> Any | None:
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave: Hashable, valor: Any) -> None:
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._dados[chave] = (time.monotonic() + self.ttl_seconds, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_size:
+                self._dados.popitem(last=False)
+
+    def invalidate(self, chave: Hashable) -> None:
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self) -> int:
+        return len(self._dados)
+
+
+def etag_forte(*partes: Any) -> str:
+    """ETag forte a partir de identificadores de versão: ("plano", 7, 3) -> '"plano-7-3"'."""
+    return '"' + "-".join(str(p) for p in partes) + '"'
+
+
+def etag_confere(if_none_match: str | None, etag: str) -> bool:
+    """Comparação fraca do If-None-Match (RFC 9110): aceita lista, "*" e prefixo W/."""
+    if not if_none_match:
+        return False
+    candidatos = {c.strip().removeprefix("W/") for c in if_none_match.split(",")}
+    return "*" in candidatos or etag in candidatos
+
+
+class CacheVersionado:
+    """
+    Cache em memória (por processo) de valores derivados de uma versão externa.
+    Uma entrada só é servida enquanto a versão pedida for a mesma com que foi gravada,
+    então invalidar em outro worker é só incrementar a versão compartilhada.
+    """
+
+    def __init__(self):
+        self._dados: dict[Hashable, tuple[Any, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, chave: Hashable, versao: Any) -> Any | None:
+        with self._lock:
+            item = self._dados.get(chave)
+        if item is None or item[0] != versao:
+            return None
+        return item[1]
+
+    def set(self, chave: Hashable, versao: Any, valor: Any) -> None:
+        with self._lock:
+            self._dados[chave] = (versao, valor)
+
+    def invalidate(self, chave: Hashable) -> None:
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dados.clear()
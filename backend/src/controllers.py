@@ -1,13 +1,22 @@
 from __future__ import annotations
 import calendar
+import re
 import secrets
 from datetime import datetime, date
-from sqlalchemy import select, func, or_, and_, update
+from sqlalchemy import select, func, or_, and_, update, delete, tuple_, exists, insert, case, literal, true, Date, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Any
-from src import models, schemas, exceptions
-from src.security import get_password_hash
+from pydantic import TypeAdapter, ValidationError
+from typing import Any, AsyncIterator, BinaryIO
+from src import models, schemas, exceptions, importacao
+from src.cache import CacheVersionado
+from src.paginacao import codificar_cursor, decodificar_cursor
+from src.security import (
+    get_password_hash_async, get_password_hashes_em_lote, verify_password_async, invalidar_principal, revogar_tokens,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,51 +24,184 @@ logger = logging.getLogger(__name__)
 # --- AUXILIARES ---
 
 async def _preencher_status_aluno(db: AsyncSession, aluno: models.Aluno):
-    """Calcula status financeiro e volumetria de sessões no mês atual."""
+    """Calcula status financeiro e volumetria de sessões no mês atual (uma única query)."""
     hoje = date.today()
-    ref_mes = f"{hoje.month:02d}/{hoje.year}"
+    periodo_atual = date(hoje.year, hoje.month, 1)
     inicio_mes = datetime(hoje.year, hoje.month, 1)
 
-    # 1. Status Financeiro
+    pago_no_mes = (
+        select(models.Pagamento.id)
+        .where(models.Pagamento.aluno_id == aluno.id, models.Pagamento.periodo == periodo_atual)
+        .exists()
+    )
+    aulas_no_mes = (
+        select(func.count(models.SessaoTreino.id))
+        .where(
+            models.SessaoTreino.aluno_id == aluno.id,
+            models.SessaoTreino.data_hora >= inicio_mes,
+            models.SessaoTreino.realizada,
+        )
+        .scalar_subquery()
+    )
+    pago, aulas = (await db.execute(select(pago_no_mes.label("pago"), aulas_no_mes.label("aulas")))).one()
+
+    # Pacote: em dia se tiver saldo de aulas. Mensal: se pagou o mês de referência
     if aluno.tipo_pagamento == "pacote":
-        # Se for pacote, está em dia se tiver saldo de aulas
         aluno.status_financeiro = "em_dia" if aluno.saldo_aulas > 0 else "atrasado"
     else:
-        # Se for mensal, verifica pagamento no mês de referência
-        stmt_pag = select(models.Pagamento).where(
-            models.Pagamento.aluno_id == aluno.id,
-            models.Pagamento.referencia_mes == ref_mes
-        )
-        result_pag = await db.execute(stmt_pag)
-        pagamento = result_pag.scalars().first() 
-        aluno.status_financeiro = "em_dia" if pagamento else "atrasado"
-
-    # 2. Contagem de Sessões Realizadas
-    stmt_sessao = select(func.count(models.SessaoTreino.id)).where(
-        models.SessaoTreino.aluno_id == aluno.id,
-        models.SessaoTreino.data_hora >= inicio_mes,
-        models.SessaoTreino.realizada
-    )
-    result_sessao = await db.execute(stmt_sessao)
-    aluno.aulas_feitas_mes = result_sessao.scalar() or 0
-    
+        aluno.status_financeiro = "em_dia" if pago else "atrasado"
+    aluno.aulas_feitas_mes = aulas or 0
+
+    return aluno
+
+
+async def _get_aluno_do_trainer(
+    db: AsyncSession, aluno_id: int, trainer_id: int | None = None, travar: bool = False
+) -> models.Aluno:
+    """
+    Só a linha do aluno (sem relacionamentos nem status): para validar ownership antes de escrever.
+    travar=True prende a linha (FOR UPDATE) até o commit e relê os valores: serializa as escritas
+    que leem e depois alteram dados do aluno (saldo, resumo financeiro).
+    """
+    stmt = select(models.Aluno).where(models.Aluno.id == aluno_id)
+    if trainer_id is not None:
+        stmt = stmt.where(models.Aluno.trainer_id == trainer_id)
+    if travar:
+        stmt = stmt.with_for_update().execution_options(populate_existing=True)
+    aluno = await db.scalar(stmt)
+    if not aluno:
+        raise exceptions.ResourceNotFoundError(f"Aluno {aluno_id} não encontrado")
     return aluno
 
+# Respostas serializadas em memória; a validade vem da tabela cache_versoes (compartilhada)
+_cache_respostas = CacheVersionado()
+CHAVE_EXERCICIOS = "exercicios"
+CHAVE_TEMPLATES = "templates"
+_lista_exercicios = TypeAdapter(list[schemas.ExercicioPublic])
+_lista_planos = TypeAdapter(list[schemas.PlanoTreinoPublic])
+
+
+async def versao_cache(db: AsyncSession, chave: str) -> int:
+    """Versão atual de uma chave de cache (lookup por PK; 0 se nunca foi incrementada)."""
+    versao = await db.scalar(select(models.CacheVersao.versao).where(models.CacheVersao.chave == chave))
+    return versao or 0
+
+
+async def incrementar_versao_cache(db: AsyncSession, chave: str) -> None:
+    """Invalida a chave em todos os workers. Chamar antes do commit da escrita que a afeta."""
+    # Upsert atômico: a primeira escrita de uma chave sem linha não corre contra outra (PK duplicada)
+    dialeto = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    stmt = dialeto.insert(models.CacheVersao).values(chave=chave, versao=1)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.CacheVersao.chave],
+        set_={"versao": models.CacheVersao.versao + 1},
+    ))
+    _cache_respostas.invalidate(chave)
+
 # --- CONTROLLERS DE ALUNO ---
 
-async def listar_alunos_ativos(db: AsyncSession, trainer_id: int | None = None):
-    """Listagem leve: sem coleções pesadas e com status calculado em queries agregadas."""
+_PARECE_CPF = re.compile(r"[\d.\-]+")
+
+
+def _padrao_prefixo(termo: str) -> str:
+    """LIKE 'termo%' com os curingas do próprio termo escapados (escape='/')."""
+    return termo.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+
+
+def _termos_do_nome(nome: str | None) -> set[str]:
+    return set((nome or "").lower().split())
+
+
+async def _gravar_termos_busca(db: AsyncSession, nomes: dict[int, str | None]) -> None:
+    """Reescreve os termos de busca (palavras do nome) dos alunos informados, na transação corrente."""
+    await db.execute(delete(models.AlunoTermoBusca).where(models.AlunoTermoBusca.aluno_id.in_(nomes)))
+    linhas = [{"aluno_id": aluno_id, "termo": t} for aluno_id, nome in nomes.items() for t in _termos_do_nome(nome)]
+    if linhas:
+        await db.execute(insert(models.AlunoTermoBusca), linhas)
+
+
+def _filtrar_alunos(
+    stmt,
+    trainer_id: int | None = None,
+    busca: str | None = None,
+    status: list[str] | None = None,
+    tipo_pagamento: str | None = None,
+    status_financeiro: str | None = None,
+):
+    """
+    Filtros do roster. A busca casa o início do CPF ou, para cada palavra buscada, o início de
+    alguma palavra do nome ("silva" encontra "Ana Silva") via alunos_termos_busca.
+    """
+    if trainer_id is not None:
+        stmt = stmt.where(models.Aluno.trainer_id == trainer_id)
+    termo = (busca or "").strip()
+    if termo:
+        if _PARECE_CPF.fullmatch(termo):
+            stmt = stmt.where(models.Aluno.cpf.like(_padrao_prefixo(termo), escape="/"))
+        else:
+            for palavra in _termos_do_nome(termo):
+                stmt = stmt.where(models.Aluno.id.in_(
+                    select(models.AlunoTermoBusca.aluno_id)
+                    .where(models.AlunoTermoBusca.termo.like(_padrao_prefixo(palavra), escape="/"))
+                ))
+    if status:
+        stmt = stmt.where(models.Aluno.status.in_(status))
+    if tipo_pagamento is not None:
+        stmt = stmt.where(models.Aluno.tipo_pagamento == tipo_pagamento)
+    if status_financeiro is not None:
+        em_dia = _aluno_em_dia()
+        stmt = stmt.where(em_dia if status_financeiro == "em_dia" else ~em_dia)
+    return stmt
+
+
+def _aluno_em_dia():
+    """Mesma regra de _preencher_status_aluno, como expressão SQL: pacote com saldo ou mensal pago no mês."""
+    hoje = date.today()
+    pago_no_mes = (
+        select(models.Pagamento.id)
+        .where(
+            models.Pagamento.aluno_id == models.Aluno.id,
+            models.Pagamento.periodo == date(hoje.year, hoje.month, 1),
+        )
+        .exists()
+    )
+    pacote = func.coalesce(models.Aluno.tipo_pagamento, "mensal") == "pacote"
+    return or_(
+        and_(pacote, func.coalesce(models.Aluno.saldo_aulas, 0) > 0),
+        and_(~pacote, pago_no_mes),
+    )
+
+
+async def contar_alunos(db: AsyncSession, trainer_id: int | None = None, **filtros) -> int:
+    stmt = _filtrar_alunos(select(func.count(models.Aluno.id)), trainer_id=trainer_id, **filtros)
+    return int(await db.scalar(stmt) or 0)
+
+
+async def listar_alunos_ativos(
+    db: AsyncSession,
+    trainer_id: int | None = None,
+    busca: str | None = None,
+    status: list[str] | None = None,
+    tipo_pagamento: str | None = None,
+    status_financeiro: str | None = None,
+    limit: int | None = None,
+    offset: int = 0,
+):
+    """Listagem leve: sem coleções pesadas e com status calculado em queries agregadas (só da página)."""
     hoje = date.today()
-    ref_mes = f"{hoje.month:02d}/{hoje.year}"
+    periodo_atual = date(hoje.year, hoje.month, 1)
     inicio_mes = datetime(hoje.year, hoje.month, 1)
 
-    query = (
-        select(models.Aluno)
-        .options(selectinload(models.Aluno.usuario))
-        .order_by(models.Aluno.nome)
-    )
-    if trainer_id is not None:
-        query = query.where(models.Aluno.trainer_id == trainer_id)
+    query = _filtrar_alunos(
+        select(models.Aluno).options(selectinload(models.Aluno.usuario)),
+        trainer_id=trainer_id,
+        busca=busca,
+        status=status,
+        tipo_pagamento=tipo_pagamento,
+        status_financeiro=status_financeiro,
+    ).order_by(models.Aluno.nome, models.Aluno.id)
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
     result = await db.execute(query)
     alunos = result.scalars().all()
 
@@ -73,7 +215,7 @@ async def listar_alunos_ativos(db: AsyncSession, trainer_id: int | None = None):
         select(models.Pagamento.aluno_id)
         .where(
             models.Pagamento.aluno_id.in_(ids),
-            models.Pagamento.referencia_mes == ref_mes,
+            models.Pagamento.periodo == periodo_atual,
         )
         .distinct()
     )
@@ -100,19 +242,78 @@ async def listar_alunos_ativos(db: AsyncSession, trainer_id: int | None = None):
 
     return alunos
 
-async def get_aluno(db: AsyncSession, aluno_id: int, trainer_id: int | None = None):
+# Coleções opcionais do detalhe do aluno (?include=): nome público -> relacionamento
+INCLUDES_ALUNO = {
+    "planos": "planos_treino",
+    "sessoes": "sessoes_treino",
+    "pagamentos": "pagamentos",
+}
+
+
+COLUNAS_EXPORTACAO_ALUNOS = [
+    "id", "nome", "email", "cpf", "data_inicio", "status", "tipo_pagamento", "saldo_aulas", "dia_vencimento",
+    "valor_mensalidade", "frequencia_semanal_plano", "idade", "objetivo", "restricoes",
+]
+
+
+async def stream_alunos(
+    db: AsyncSession,
+    trainer_id: int | None = None,
+    status: list[str] | None = None,
+    tipo_pagamento: str | None = None,
+    lote: int = 500,
+) -> AsyncIterator[dict[str, Any]]:
+    """Cadastro dos alunos (colunas) por cursor no servidor, na ordem do roster."""
+    stmt = _filtrar_alunos(
+        select(*(getattr(models.Aluno, coluna) for coluna in COLUNAS_EXPORTACAO_ALUNOS)),
+        trainer_id=trainer_id, status=status, tipo_pagamento=tipo_pagamento,
+    ).order_by(models.Aluno.nome, models.Aluno.id)
+    result = await db.stream(stmt.execution_options(yield_per=lote))
+    async for row in result:
+        yield dict(row._mapping)
+
+
+def resolver_include(include: str | None) -> frozenset[str]:
+    """"planos,sessoes" -> {"planos", "sessoes"}; None mantém o detalhe completo."""
+    if include is None:
+        return frozenset(INCLUDES_ALUNO)
+    pedidos = frozenset(p.strip() for p in include.split(",") if p.strip())
+    invalidos = pedidos - INCLUDES_ALUNO.keys()
+    if invalidos:
+        raise exceptions.BusinessRuleError(
+            f"include inválido: {', '.join(sorted(invalidos))} (use {', '.join(INCLUDES_ALUNO)})"
+        )
+    return pedidos
+
+
+# Janelas do histórico embutido no detalhe; o restante sai pelos endpoints paginados
+JANELA_SESSOES = 20
+JANELA_PAGAMENTOS_MESES = 12
+
+# Árvore completa de um plano (treinos -> prescrições -> exercício)
+_ARVORE_PLANO = (
+    selectinload(models.PlanoTreino.treinos)
+    .selectinload(models.Treino.prescricoes)
+    .selectinload(models.Prescricao.exercicio)
+)
+
+
+async def get_aluno(
+    db: AsyncSession,
+    aluno_id: int,
+    trainer_id: int | None = None,
+    include: frozenset[str] = frozenset(INCLUDES_ALUNO),
+):
+    """
+    Detalhe do aluno com histórico em janela de tamanho fixo: últimas JANELA_SESSOES sessões,
+    pagamentos dos últimos JANELA_PAGAMENTOS_MESES meses, o plano ativo completo e só o
+    cabeçalho dos inativos. `historico` traz os totais e o cursor para continuar a paginação.
+    Coleções fora de `include` não são consultadas e saem vazias.
+    """
     query = (
         select(models.Aluno)
         .where(models.Aluno.id == aluno_id)
-        .options(
-            selectinload(models.Aluno.planos_treino)
-                .selectinload(models.PlanoTreino.treinos)
-                .selectinload(models.Treino.prescricoes)
-                .selectinload(models.Prescricao.exercicio),
-            selectinload(models.Aluno.sessoes_treino),
-            selectinload(models.Aluno.pagamentos),
-            selectinload(models.Aluno.usuario)
-        )
+        .options(selectinload(models.Aluno.usuario))
     )
     if trainer_id is not None:
         query = query.where(models.Aluno.trainer_id == trainer_id)
@@ -123,11 +324,85 @@ async def get_aluno(db: AsyncSession, aluno_id: int, trainer_id: int | None = No
     if not aluno:
         raise exceptions.ResourceNotFoundError(f"Aluno {aluno_id} não encontrado")
 
+    historico = await _totais_historico(db, aluno_id)
+    planos, sessoes, pagamentos = [], [], []
+
+    if "planos" in include:
+        planos = await _planos_em_janela(db, aluno_id)
+
+    if "sessoes" in include:
+        stmt = (
+            select(models.SessaoTreino)
+            .where(models.SessaoTreino.aluno_id == aluno_id)
+            .order_by(models.SessaoTreino.data_hora.desc(), models.SessaoTreino.id.desc())
+            .limit(JANELA_SESSOES)
+        )
+        sessoes = list((await db.execute(stmt)).scalars().all())
+        if historico["total_sessoes"] > len(sessoes):
+            historico["sessoes_next_cursor"] = codificar_cursor(sessoes[-1].data_hora, sessoes[-1].id)
+
+    if "pagamentos" in include:
+        hoje = date.today()
+        inicio_janela = _month_starts(date(hoje.year, hoje.month, 1), n=JANELA_PAGAMENTOS_MESES)[0]
+        stmt = (
+            select(models.Pagamento)
+            .where(models.Pagamento.aluno_id == aluno_id, models.Pagamento.data_pagamento >= inicio_janela)
+            .order_by(models.Pagamento.data_pagamento.desc(), models.Pagamento.id.desc())
+        )
+        pagamentos = list((await db.execute(stmt)).scalars().all())
+        if historico["total_pagamentos"] > len(pagamentos):
+            # Continua logo antes da janela: (data, id) < (último embutido) ou < (início da janela, 0)
+            ultimo = (pagamentos[-1].data_pagamento, pagamentos[-1].id) if pagamentos else (inicio_janela, 0)
+            historico["pagamentos_next_cursor"] = codificar_cursor(*ultimo)
+
+    # Coleções montadas à mão: marcadas como carregadas para o schema não disparar lazy load
+    set_committed_value(aluno, "planos_treino", planos)
+    set_committed_value(aluno, "sessoes_treino", sessoes)
+    set_committed_value(aluno, "pagamentos", pagamentos)
+    aluno.historico = historico
+
     await _preencher_status_aluno(db, aluno)
 
     return aluno
 
 
+async def _totais_historico(db: AsyncSession, aluno_id: int) -> dict[str, Any]:
+    def _contar(coluna_id, coluna_aluno):
+        return select(func.count(coluna_id)).where(coluna_aluno == aluno_id).scalar_subquery()
+
+    totais = (await db.execute(select(
+        _contar(models.SessaoTreino.id, models.SessaoTreino.aluno_id).label("total_sessoes"),
+        _contar(models.Pagamento.id, models.Pagamento.aluno_id).label("total_pagamentos"),
+        _contar(models.PlanoTreino.id, models.PlanoTreino.aluno_id).label("total_planos"),
+    ))).one()
+    return {
+        **totais._asdict(),
+        "sessoes_next_cursor": None,
+        "pagamentos_next_cursor": None,
+        "sessoes_url": f"/sessoes/pagina?aluno_id={aluno_id}",
+        "pagamentos_url": f"/pagamentos/pagina?aluno_id={aluno_id}",
+    }
+
+
+async def _planos_em_janela(db: AsyncSession, aluno_id: int) -> list[models.PlanoTreino]:
+    """Plano ativo com a árvore completa; inativos só com o cabeçalho (árvore via GET /planos/{id})."""
+    ativos = (await db.execute(
+        select(models.PlanoTreino)
+        .where(models.PlanoTreino.aluno_id == aluno_id, models.PlanoTreino.esta_ativo)
+        .options(_ARVORE_PLANO)
+        .order_by(models.PlanoTreino.id.desc())
+    )).scalars().all()
+    inativos = (await db.execute(
+        select(models.PlanoTreino)
+        .where(models.PlanoTreino.aluno_id == aluno_id, ~models.PlanoTreino.esta_ativo)
+        .order_by(models.PlanoTreino.data_inicio.desc(), models.PlanoTreino.id.desc())
+    )).scalars().all()
+    for plano in inativos:
+        if "treinos" not in plano.__dict__:
+            set_committed_value(plano, "treinos", [])
+    return [*ativos, *inativos]
+
+
 
 async def criar_aluno(db: AsyncSession, aluno_in: schemas.AlunoCreate, trainer_id: int):
     if aluno_in.cpf:
@@ -150,6 +425,7 @@ async def criar_aluno(db: AsyncSession, aluno_in: schemas.AlunoCreate, trainer_i
     
     try:
         await db.flush() # Garante o ID do aluno antes de criar o usuário
+        await _gravar_termos_busca(db, {novo_aluno.id: novo_aluno.nome})
         
         # Criação de usuário (Geração automática se não fornecido)
         username = auth_data.get("username")
@@ -174,7 +450,7 @@ async def criar_aluno(db: AsyncSession, aluno_in: schemas.AlunoCreate, trainer_i
 
         novo_usuario = models.Usuario(
             username=username,
-            hashed_password=get_password_hash(senha),
+            hashed_password=await get_password_hash_async(senha),
             email=email_usuario,
             role="aluno",
             aluno_id=novo_aluno.id
@@ -210,15 +486,132 @@ async def criar_aluno(db: AsyncSession, aluno_in: schemas.AlunoCreate, trainer_i
         await db.rollback()
         raise e
 
+_COLUNAS_IMPORTACAO_ALUNO = set(schemas.AlunoCreate.model_fields) - {"trainer_id"}
+
+
+def _aluno_create_da_linha(linha: dict[str, str]) -> schemas.AlunoCreate:
+    """Valida uma linha da planilha de alunos com o mesmo schema do cadastro individual."""
+    dados = {k: v for k, v in linha.items() if k in _COLUNAS_IMPORTACAO_ALUNO and v}
+    if "valor_mensalidade" in dados:
+        dados["valor_mensalidade"] = importacao.decimal(dados["valor_mensalidade"])
+    try:
+        return schemas.AlunoCreate.model_validate(dados)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+
+
+async def _valores_existentes(db: AsyncSession, coluna, valores: set[str]) -> set[str]:
+    if not valores:
+        return set()
+    return set((await db.scalars(select(coluna).where(coluna.in_(valores)))).all())
+
+
+async def importar_alunos(
+    db: AsyncSession, arquivo: BinaryIO, trainer_id: int, tamanho_lote: int = importacao.TAMANHO_LOTE
+) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """
+    Cadastro em massa a partir de um CSV (mesmas colunas do AlunoCreate). Por lote: unicidade
+    de CPF, e-mail e username em queries por conjunto, hash das senhas num pool de processos,
+    alunos e usuários em INSERTs multi-linha e um commit. Retorna o relatório e as credenciais
+    (linha, aluno_id, nome, username, senha — a senha só quando foi gerada aqui).
+    """
+    relatorio = importacao.RelatorioImportacao()
+    credenciais: list[dict[str, Any]] = []
+    vistos: dict[str, set[str]] = {"cpf": set(), "email": set(), "username": set()}
+
+    for lote in importacao.ler_csv_em_lotes(arquivo, tamanho_lote):
+        candidatos: list[tuple[int, schemas.AlunoCreate]] = []
+        for numero, linha in lote:
+            try:
+                candidatos.append((numero, _aluno_create_da_linha(linha)))
+            except ValueError as e:
+                relatorio.erro(numero, str(e))
+
+        cpfs = await _valores_existentes(db, models.Aluno.cpf, {a.cpf for _, a in candidatos if a.cpf})
+        emails = {a.email for _, a in candidatos if a.email}
+        emails_alunos = await _valores_existentes(db, models.Aluno.email, emails)
+        emails_usuarios = await _valores_existentes(db, models.Usuario.email, emails)
+        usernames = await _valores_existentes(db, models.Usuario.username, {a.username for _, a in candidatos if a.username})
+
+        aceitos: list[tuple[int, schemas.AlunoCreate]] = []
+        for numero, aluno in candidatos:
+            if aluno.cpf and (aluno.cpf in cpfs or aluno.cpf in vistos["cpf"]):
+                relatorio.erro(numero, f"CPF {aluno.cpf} já está cadastrado.")
+            elif aluno.email and (aluno.email in emails_alunos or aluno.email in vistos["email"]):
+                relatorio.erro(numero, f"E-mail {aluno.email} já está cadastrado em outro aluno.")
+            elif aluno.email and aluno.email in emails_usuarios:
+                relatorio.erro(numero, f"E-mail {aluno.email} já está em uso por outro usuário.")
+            elif aluno.username and (aluno.username in usernames or aluno.username in vistos["username"]):
+                relatorio.erro(numero, f"Username {aluno.username} já está em uso.")
+            else:
+                aceitos.append((numero, aluno))
+                for campo in vistos:
+                    if getattr(aluno, campo):
+                        vistos[campo].add(getattr(aluno, campo))
+        if not aceitos:
+            continue
+
+        # bcrypt antes de qualquer escrita: a transação não fica aberta durante o hash
+        senhas = [aluno.password or secrets.token_urlsafe(12) for _, aluno in aceitos]
+        hashes = await get_password_hashes_em_lote(senhas)
+
+        try:
+            aluno_ids = (await db.execute(
+                insert(models.Aluno).returning(models.Aluno.id, sort_by_parameter_order=True),
+                [aluno.model_dump(exclude={"username", "password", "trainer_id"}) | {"trainer_id": trainer_id} for _, aluno in aceitos],
+            )).scalars().all()
+            await _gravar_termos_busca(db, {aluno_id: aluno.nome for (_, aluno), aluno_id in zip(aceitos, aluno_ids)})
+
+            # Mesmo padrão do cadastro individual (primeiro nome + id); colisões ganham sufixo aleatório
+            gerados = {
+                i: f"{aluno.nome.split()[0].lower()}.{aluno_id}"
+                for i, ((_, aluno), aluno_id) in enumerate(zip(aceitos, aluno_ids)) if not aluno.username
+            }
+            # Ocupados: os do banco e os pedidos explicitamente por linhas da importação
+            ocupados = await _valores_existentes(db, models.Usuario.username, set(gerados.values())) | vistos["username"]
+            for i, username in gerados.items():
+                if username in ocupados:
+                    gerados[i] = f"{username}.{secrets.token_hex(2)}"
+
+            usuarios, novas = [], []
+            for i, ((numero, aluno), aluno_id) in enumerate(zip(aceitos, aluno_ids)):
+                username = aluno.username or gerados[i]
+                usuarios.append({
+                    "username": username,
+                    "hashed_password": hashes[i],
+                    "email": aluno.email or f"{username}@sistema.com",
+                    "role": "aluno",
+                    "aluno_id": aluno_id,
+                })
+                novas.append({
+                    "linha": numero, "aluno_id": aluno_id, "nome": aluno.nome, "username": username,
+                    "senha": None if aluno.password else senhas[i],
+                })
+            await db.execute(insert(models.Usuario), usuarios)
+            await db.commit()
+        except IntegrityError:
+            # Cadastro concorrente ocupou algum CPF/e-mail/username entre a checagem e o INSERT
+            await db.rollback()
+            for numero, _ in aceitos:
+                relatorio.erro(numero, "conflito de unicidade ao gravar o lote; reenvie estas linhas")
+            continue
+        credenciais.extend(novas)
+        relatorio.importados += len(aceitos)
+
+    return relatorio.como_dict(), credenciais
+
+
 async def atualizar_status_aluno(db: AsyncSession, aluno_id: int, novo_status: str, trainer_id: int | None = None):
-    aluno = await get_aluno(db, aluno_id, trainer_id)
+    aluno = await _get_aluno_do_trainer(db, aluno_id, trainer_id)
     aluno.status = novo_status
     await db.commit()
-    await db.refresh(aluno)
-    return aluno
+    return await get_aluno(db, aluno_id, trainer_id, include=frozenset())
 
 async def atualizar_aluno(db: AsyncSession, aluno_id: int, aluno_up: schemas.AlunoUpdate, trainer_id: int | None = None, permitir_troca_trainer: bool = False):
-    aluno = await get_aluno(db, aluno_id, trainer_id)
+    if permitir_troca_trainer and "trainer_id" in aluno_up.model_fields_set:
+        # Trava antes de ler: pagamentos concorrentes não caem no trainer antigo após a transferência
+        await _get_aluno_do_trainer(db, aluno_id, trainer_id, travar=True)
+    aluno = await get_aluno(db, aluno_id, trainer_id, include=frozenset())
 
     if aluno_up.cpf and aluno_up.cpf != aluno.cpf:
         stmt = select(models.Aluno).where(models.Aluno.cpf == aluno_up.cpf)
@@ -229,25 +622,41 @@ async def atualizar_aluno(db: AsyncSession, aluno_id: int, aluno_up: schemas.Alu
     dados = aluno_up.model_dump(exclude_unset=True)
     if not permitir_troca_trainer:
         dados.pop("trainer_id", None)
+    elif "trainer_id" in dados and dados["trainer_id"] != aluno.trainer_id:
+        await _transferir_resumo_do_aluno(db, aluno_id, de=aluno.trainer_id, para=dados["trainer_id"])
 
     for key, value in dados.items():
         setattr(aluno, key, value)
+    if "nome" in dados:
+        await _gravar_termos_busca(db, {aluno_id: aluno.nome})
     
     try:
         await db.commit()
-        await db.refresh(aluno)
-        await _preencher_status_aluno(db, aluno)
-        return aluno
+        invalidar_principal(aluno.usuario)
+        return await get_aluno(db, aluno_id, trainer_id, include=frozenset())
     except Exception as e:
         await db.rollback()
         raise e
 
 async def excluir_aluno(db: AsyncSession, aluno_id: int, trainer_id: int | None = None):
-    aluno = await get_aluno(db, aluno_id, trainer_id)
-    if aluno.usuario:
-        await db.delete(aluno.usuario)
-    await db.delete(aluno)
+    aluno = await _get_aluno_do_trainer(db, aluno_id, trainer_id, travar=True)
+    usuario = await db.scalar(select(models.Usuario).where(models.Usuario.aluno_id == aluno_id))
+
+    # Remove o histórico em lote (filhos antes dos pais), sem carregar as coleções no ORM
+    planos_do_aluno = select(models.PlanoTreino.id).where(models.PlanoTreino.aluno_id == aluno_id)
+    treinos_do_aluno = select(models.Treino.id).where(models.Treino.plano_id.in_(planos_do_aluno))
+    await _transferir_resumo_do_aluno(db, aluno_id, de=aluno.trainer_id, para=None, remover=True)
+    await db.execute(delete(models.SessaoTreino).where(models.SessaoTreino.aluno_id == aluno_id))
+    await db.execute(delete(models.Pagamento).where(models.Pagamento.aluno_id == aluno_id))
+    await db.execute(delete(models.AlunoTermoBusca).where(models.AlunoTermoBusca.aluno_id == aluno_id))
+    await db.execute(delete(models.Prescricao).where(models.Prescricao.treino_id.in_(treinos_do_aluno)))
+    await db.execute(delete(models.Treino).where(models.Treino.plano_id.in_(planos_do_aluno)))
+    await db.execute(delete(models.PlanoTreino).where(models.PlanoTreino.aluno_id == aluno_id))
+    if usuario:
+        await db.delete(usuario)
+    await db.execute(delete(models.Aluno).where(models.Aluno.id == aluno_id))
     await db.commit()
+    invalidar_principal(usuario, removido=True)
     return True
 
 # --- CONTROLLERS DE PLANO DE TREINO ---
@@ -286,21 +695,142 @@ async def listar_templates_globais(db: AsyncSession):
     return result.scalars().all()
 
 
+async def versao_templates(db: AsyncSession) -> tuple[int, int]:
+    """Templates embutem os exercícios: a lista muda com qualquer uma das duas versões."""
+    versoes = dict((await db.execute(
+        select(models.CacheVersao.chave, models.CacheVersao.versao)
+        .where(models.CacheVersao.chave.in_((CHAVE_TEMPLATES, CHAVE_EXERCICIOS)))
+    )).all())
+    return versoes.get(CHAVE_TEMPLATES, 0), versoes.get(CHAVE_EXERCICIOS, 0)
+
+
+async def templates_json(db: AsyncSession, versao: tuple[int, int]) -> bytes:
+    """Árvore dos templates já serializada, montada uma vez por versão em cada worker."""
+    corpo = _cache_respostas.get(CHAVE_TEMPLATES, versao)
+    if corpo is None:
+        templates = await listar_templates_globais(db)
+        corpo = _lista_planos.dump_json(_lista_planos.validate_python(templates, from_attributes=True))
+        _cache_respostas.set(CHAVE_TEMPLATES, versao, corpo)
+    return corpo
+
+
+# --- RESUMO FINANCEIRO MENSAL (ROLLUP) ---
+
+def _chave_trainer(trainer_id: int | None) -> int:
+    """Alunos sem trainer entram na linha trainer_id = 0 do resumo."""
+    return trainer_id or 0
+
+
+async def _somar_resumo(
+    db: AsyncSession, trainer_id: int | None, periodo: date,
+    receita: float, n_pagamentos: int, n_alunos_pagantes: int,
+) -> None:
+    """Aplica um delta na célula (trainer, período) com upsert atômico, na transação corrente."""
+    await _somar_resumo_em_lote(db, {(trainer_id, periodo): (receita, n_pagamentos, n_alunos_pagantes)})
+
+
+async def _somar_resumo_em_lote(
+    db: AsyncSession, deltas: dict[tuple[int | None, date], tuple[float, int, int]]
+) -> None:
+    """Vários deltas (trainer, período) -> (receita, pagamentos, pagantes) num único upsert multi-linha."""
+    if not deltas:
+        return
+    tabela = models.ResumoFinanceiroMensal
+    dialeto = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    stmt = dialeto.insert(tabela).values([
+        {
+            "trainer_id": _chave_trainer(trainer_id), "periodo": periodo,
+            "receita": receita, "n_pagamentos": n_pagamentos, "n_alunos_pagantes": n_alunos_pagantes,
+        }
+        for (trainer_id, periodo), (receita, n_pagamentos, n_alunos_pagantes) in deltas.items()
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[tabela.trainer_id, tabela.periodo],
+        set_={
+            "receita": tabela.receita + stmt.excluded.receita,
+            "n_pagamentos": tabela.n_pagamentos + stmt.excluded.n_pagamentos,
+            "n_alunos_pagantes": tabela.n_alunos_pagantes + stmt.excluded.n_alunos_pagantes,
+        },
+    ))
+
+
+async def _contabilizar_pagamento(
+    db: AsyncSession, trainer_id: int | None, aluno_id: int, periodo: date, valor: float,
+    sinal: int, ignorar_id: int | None = None,
+) -> None:
+    """
+    Soma (sinal=1) ou retira (sinal=-1) um pagamento do resumo. O aluno só conta como
+    pagante novo/perdido se não tiver outro pagamento no mesmo período.
+    """
+    outros = select(models.Pagamento.id).where(
+        models.Pagamento.aluno_id == aluno_id, models.Pagamento.periodo == periodo
+    )
+    if ignorar_id is not None:
+        outros = outros.where(models.Pagamento.id != ignorar_id)
+    tem_outros = await db.scalar(select(exists(outros)))
+    await _somar_resumo(db, trainer_id, periodo, sinal * (valor or 0), sinal, 0 if tem_outros else sinal)
+
+
+async def _transferir_resumo_do_aluno(db: AsyncSession, aluno_id: int, de: int | None, para: int | None, remover: bool = False) -> None:
+    """Move (troca de trainer) ou retira (remover=True) todo o histórico do aluno do resumo."""
+    linhas = (await db.execute(
+        select(models.Pagamento.periodo, func.coalesce(func.sum(models.Pagamento.valor), 0), func.count(models.Pagamento.id))
+        .where(models.Pagamento.aluno_id == aluno_id, models.Pagamento.periodo.is_not(None))
+        .group_by(models.Pagamento.periodo)
+    )).all()
+    # Tudo num único upsert; deltas que caem na mesma célula são somados antes (o ON CONFLICT
+    # do Postgres não aceita tocar a mesma linha duas vezes no mesmo comando).
+    deltas: dict[tuple[int | None, date], tuple[float, int, int]] = {}
+    destinos = [(de, -1)] if remover else [(de, -1), (para, 1)]
+    for periodo, receita, quantidade in linhas:
+        for trainer_id, sinal in destinos:
+            chave = (_chave_trainer(trainer_id), periodo)
+            receita_acc, n, pagantes = deltas.get(chave, (0.0, 0, 0))
+            deltas[chave] = (receita_acc + sinal * float(receita), n + sinal * quantidade, pagantes + sinal)
+    await _somar_resumo_em_lote(db, deltas)
+
+
+async def reconstruir_resumo_financeiro(db: AsyncSession) -> int:
+    """Refaz o resumo inteiro a partir dos pagamentos (corrige qualquer desvio). Retorna as linhas gravadas."""
+    tabela = models.ResumoFinanceiroMensal
+    trainer = func.coalesce(models.Aluno.trainer_id, 0)
+    agregado = (
+        select(
+            trainer,
+            models.Pagamento.periodo,
+            func.coalesce(func.sum(models.Pagamento.valor), 0),
+            func.count(models.Pagamento.id),
+            func.count(func.distinct(models.Pagamento.aluno_id)),
+        )
+        .join(models.Aluno, models.Pagamento.aluno_id == models.Aluno.id)
+        .where(models.Pagamento.periodo.is_not(None))
+        .group_by(trainer, models.Pagamento.periodo)
+    )
+    await db.execute(delete(tabela))
+    res = await db.execute(insert(tabela).from_select(
+        ["trainer_id", "periodo", "receita", "n_pagamentos", "n_alunos_pagantes"], agregado
+    ))
+    await db.commit()
+    return res.rowcount
+
 
 async def registrar_pagamento(db: AsyncSession, dados: schemas.PagamentoCreate, trainer_id: int | None = None) -> models.Pagamento:
     """
     Registra a entrada financeira de um aluno.
     """
-    aluno = await get_aluno(db, dados.aluno_id, trainer_id)
+    # Trava o aluno: a checagem de "outro pagamento no mês" em _contabilizar_pagamento não pode
+    # correr contra outro pagamento concorrente do mesmo aluno
+    aluno = await _get_aluno_do_trainer(db, dados.aluno_id, trainer_id, travar=True)
 
     hoje = date.today()
     ref = dados.referencia_mes or f"{hoje.month:02d}/{hoje.year}"
-    _parse_referencia_mes(ref)
+    periodo = _periodo_de_referencia(ref)
 
     novo_pagamento = models.Pagamento(
         aluno_id=dados.aluno_id,
         valor=dados.valor,
-        referencia_mes=ref,
+        referencia_mes=_referencia_do_periodo(periodo),
+        periodo=periodo,
         forma_pagamento=dados.forma_pagamento,
         observacao=dados.observacao,
         data_pagamento=dados.data_pagamento or hoje,
@@ -311,6 +841,7 @@ async def registrar_pagamento(db: AsyncSession, dados: schemas.PagamentoCreate,
     if dados.quantidade_aulas > 0:
         aluno.saldo_aulas += dados.quantidade_aulas
 
+    await _contabilizar_pagamento(db, aluno.trainer_id, aluno.id, periodo, dados.valor, 1)
     db.add(novo_pagamento)
     try:
         await db.commit()
@@ -320,37 +851,248 @@ async def registrar_pagamento(db: AsyncSession, dados: schemas.PagamentoCreate,
         await db.rollback()
         raise e
 
-async def listar_pagamentos(db: AsyncSession, trainer_id: int | None = None) -> list[dict[str, Any]]:
+def _pagamento_da_linha(linha: dict[str, str]) -> dict[str, Any]:
+    """Valida uma linha da planilha de pagamentos (ValueError com a mensagem para o relatório)."""
+    valor = importacao.decimal(linha.get("valor"))
+    if valor is None or valor <= 0:
+        raise ValueError("valor obrigatório e maior que zero")
+    if not linha.get("referencia_mes"):
+        raise ValueError("referencia_mes obrigatória (MM/YYYY)")
+    try:
+        periodo = _periodo_de_referencia(linha["referencia_mes"])
+    except exceptions.BusinessRuleError as e:
+        raise ValueError(str(e))
+    if not linha.get("forma_pagamento"):
+        raise ValueError("forma_pagamento obrigatória")
+    quantidade_aulas = importacao.inteiro(linha.get("quantidade_aulas"), padrao=0)
+    if quantidade_aulas < 0:
+        raise ValueError("quantidade_aulas não pode ser negativa")
+    if not (linha.get("aluno_id") or linha.get("cpf") or linha.get("email")):
+        raise ValueError("informe aluno_id, cpf ou email do aluno")
+    return {
+        "valor": valor,
+        "referencia_mes": _referencia_do_periodo(periodo),
+        "periodo": periodo,
+        "forma_pagamento": linha["forma_pagamento"],
+        "quantidade_aulas": quantidade_aulas,
+        # Histórico sem data: usa o mês de referência, não a data da importação
+        "data_pagamento": importacao.data(linha.get("data_pagamento")) or periodo,
+        "observacao": importacao.texto_opcional(linha, "observacao"),
+    }
+
+
+async def _resolver_alunos_do_lote(
+    db: AsyncSession, linhas: list[dict[str, str]], trainer_id: int | None
+) -> dict[tuple[str, Any], tuple[int, int | None]]:
+    """
+    Uma query para todo o lote: mapeia ("id", 1), ("cpf", "12345678900") e ("email", "a@b")
+    para (aluno_id, trainer_id). CPF casa com ou sem pontuação; email sem diferenciar caixa.
+    """
+    ids, cpfs, emails = set(), set(), set()
+    for linha in linhas:
+        if linha.get("aluno_id", "").isdigit():
+            ids.add(int(linha["aluno_id"]))
+        if linha.get("cpf"):
+            cpfs.update({linha["cpf"], importacao.so_digitos(linha["cpf"])})
+        if linha.get("email"):
+            emails.add(linha["email"].lower())
+    condicoes = []
+    if ids:
+        condicoes.append(models.Aluno.id.in_(ids))
+    if cpfs:
+        condicoes.append(models.Aluno.cpf.in_(cpfs))
+    if emails:
+        condicoes.append(func.lower(models.Aluno.email).in_(emails))
+    if not condicoes:
+        return {}
+
+    stmt = select(models.Aluno.id, models.Aluno.cpf, models.Aluno.email, models.Aluno.trainer_id).where(or_(*condicoes))
+    if trainer_id is not None:
+        stmt = stmt.where(models.Aluno.trainer_id == trainer_id)
+    mapa: dict[tuple[str, Any], tuple[int, int | None]] = {}
+    for aluno_id, cpf, email, dono in (await db.execute(stmt)).all():
+        mapa[("id", aluno_id)] = (aluno_id, dono)
+        if cpf:
+            mapa[("cpf", importacao.so_digitos(cpf))] = (aluno_id, dono)
+        if email:
+            mapa[("email", email.lower())] = (aluno_id, dono)
+    return mapa
+
+
+def _aluno_da_linha(mapa: dict, linha: dict[str, str]) -> tuple[int, int | None] | None:
+    if linha.get("aluno_id"):
+        return mapa.get(("id", int(linha["aluno_id"]))) if linha["aluno_id"].isdigit() else None
+    if linha.get("cpf"):
+        return mapa.get(("cpf", importacao.so_digitos(linha["cpf"])))
+    return mapa.get(("email", linha["email"].lower()))
+
+
+async def importar_pagamentos(
+    db: AsyncSession, arquivo: BinaryIO, trainer_id: int | None = None, tamanho_lote: int = importacao.TAMANHO_LOTE
+) -> dict[str, Any]:
+    """
+    Importa pagamentos de um CSV em lotes: valida as linhas, resolve os alunos numa query,
+    insere o lote num INSERT multi-linha e aplica saldo de aulas e resumo financeiro em
+    agregado. Cada lote é commitado; linhas inválidas vão para o relatório e não param o resto.
+    """
+    relatorio = importacao.RelatorioImportacao()
+    for lote in importacao.ler_csv_em_lotes(arquivo, tamanho_lote):
+        validas = []
+        for numero, linha in lote:
+            try:
+                validas.append((numero, linha, _pagamento_da_linha(linha)))
+            except ValueError as e:
+                relatorio.erro(numero, str(e))
+        if not validas:
+            continue
+
+        alunos = await _resolver_alunos_do_lote(db, [linha for _, linha, _ in validas], trainer_id)
+        registros, donos = [], {}
+        for numero, linha, dados in validas:
+            encontrado = _aluno_da_linha(alunos, linha)
+            if encontrado is None:
+                relatorio.erro(numero, "aluno não encontrado")
+                continue
+            aluno_id, dono = encontrado
+            donos[aluno_id] = dono
+            registros.append({**dados, "aluno_id": aluno_id})
+        if not registros:
+            continue
+
+        await _gravar_pagamentos_importados(db, registros, donos)
+        await db.commit()
+        relatorio.importados += len(registros)
+    return relatorio.como_dict()
+
+
+async def _gravar_pagamentos_importados(
+    db: AsyncSession, registros: list[dict[str, Any]], donos: dict[int, int | None]
+) -> None:
+    aluno_ids = set(donos)
+    periodos = {r["periodo"] for r in registros}
+
+    # Mesma trava de registrar_pagamento, em ordem de id para lotes concorrentes não se travarem
+    await db.execute(
+        select(models.Aluno.id).where(models.Aluno.id.in_(aluno_ids)).order_by(models.Aluno.id).with_for_update()
+    )
+    # Pares (aluno, mês) que já tinham pagamento: o aluno não conta de novo como pagante
+    ja_pagantes = set((await db.execute(
+        select(models.Pagamento.aluno_id, models.Pagamento.periodo)
+        .where(models.Pagamento.aluno_id.in_(aluno_ids), models.Pagamento.periodo.in_(periodos))
+        .distinct()
+    )).all())
+
+    await db.execute(insert(models.Pagamento), registros)
+
+    aulas: dict[int, int] = {}
+    deltas: dict[tuple[int | None, date], list] = {}
+    for r in registros:
+        if r["quantidade_aulas"]:
+            aulas[r["aluno_id"]] = aulas.get(r["aluno_id"], 0) + r["quantidade_aulas"]
+        celula = deltas.setdefault((donos[r["aluno_id"]], r["periodo"]), [0.0, 0, 0])
+        celula[0] += r["valor"]
+        celula[1] += 1
+        if (r["aluno_id"], r["periodo"]) not in ja_pagantes:
+            ja_pagantes.add((r["aluno_id"], r["periodo"]))
+            celula[2] += 1
+
+    if aulas:
+        await db.execute(
+            update(models.Aluno)
+            .where(models.Aluno.id.in_(aulas))
+            .values(saldo_aulas=func.coalesce(models.Aluno.saldo_aulas, 0) + case(aulas, value=models.Aluno.id, else_=0))
+            .execution_options(synchronize_session=False)
+        )
+    await _somar_resumo_em_lote(db, {chave: tuple(v) for chave, v in deltas.items()})
+
+
+def _select_pagamentos(
+    trainer_id: int | None = None,
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+):
+    """Colunas do PagamentoPublic direto do banco (sem montar objetos ORM), já filtradas."""
     stmt = (
         select(
-            models.Pagamento,
-            models.Aluno.nome.label("aluno_nome")
+            models.Pagamento.id,
+            models.Pagamento.aluno_id,
+            models.Aluno.nome.label("aluno_nome"),
+            models.Pagamento.valor,
+            models.Pagamento.referencia_mes,
+            models.Pagamento.forma_pagamento,
+            models.Pagamento.data_pagamento,
+            models.Pagamento.observacao,
+            models.Pagamento.quantidade_aulas,
         )
         .join(models.Aluno, models.Pagamento.aluno_id == models.Aluno.id)
-        .order_by(models.Pagamento.data_pagamento.desc())
     )
     if trainer_id is not None:
         stmt = stmt.where(models.Aluno.trainer_id == trainer_id)
-    result = await db.execute(stmt)
-    
-    pagamentos = []
-    for row in result.all():
-        pagamento = row.Pagamento
-        # Converte o objeto do banco em um dicionário compatível com o schema
-        pag_dict = {
-            "id": pagamento.id,
-            "aluno_id": pagamento.aluno_id,
-            "aluno_nome": row.aluno_nome,
-            "valor": pagamento.valor,
-            "referencia_mes": pagamento.referencia_mes,
-            "forma_pagamento": pagamento.forma_pagamento,
-            "data_pagamento": pagamento.data_pagamento,
-            "observacao": pagamento.observacao,
-            "quantidade_aulas": pagamento.quantidade_aulas
-        }
-        pagamentos.append(pag_dict)
-    
-    return pagamentos
+    if aluno_id is not None:
+        stmt = stmt.where(models.Pagamento.aluno_id == aluno_id)
+    if de is not None:
+        stmt = stmt.where(models.Pagamento.data_pagamento >= de)
+    if ate is not None:
+        stmt = stmt.where(models.Pagamento.data_pagamento <= ate)
+    return stmt.order_by(models.Pagamento.data_pagamento.desc(), models.Pagamento.id.desc())
+
+
+async def listar_pagamentos(
+    db: AsyncSession,
+    trainer_id: int | None = None,
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+) -> list[dict[str, Any]]:
+    result = await db.execute(_select_pagamentos(trainer_id, aluno_id, de, ate))
+    return [dict(row._mapping) for row in result]
+
+
+async def paginar_pagamentos(
+    db: AsyncSession,
+    trainer_id: int | None = None,
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> dict[str, Any]:
+    """Página por chave (data_pagamento, id) decrescente; next_cursor é None na última página."""
+    stmt = _select_pagamentos(trainer_id, aluno_id, de, ate)
+    if cursor is not None:
+        ultima_data, ultimo_id = decodificar_cursor(cursor, date, int)
+        stmt = stmt.where(
+            tuple_(models.Pagamento.data_pagamento, models.Pagamento.id) < tuple_(ultima_data, ultimo_id)
+        )
+
+    pagamentos = [dict(row._mapping) for row in await db.execute(stmt.limit(limit + 1))]
+    next_cursor = None
+    if len(pagamentos) > limit:
+        pagamentos = pagamentos[:limit]
+        next_cursor = codificar_cursor(pagamentos[-1]["data_pagamento"], pagamentos[-1]["id"])
+    return {"items": pagamentos, "next_cursor": next_cursor}
+
+
+COLUNAS_EXPORTACAO_PAGAMENTOS = [
+    "id", "aluno_id", "aluno_nome", "valor", "referencia_mes", "forma_pagamento",
+    "data_pagamento", "observacao", "quantidade_aulas",
+]
+
+
+async def stream_pagamentos(
+    db: AsyncSession,
+    trainer_id: int | None = None,
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    lote: int = 500,
+) -> AsyncIterator[dict[str, Any]]:
+    """Itera os pagamentos por cursor no servidor, buscando `lote` linhas por vez."""
+    stmt = _select_pagamentos(trainer_id, aluno_id, de, ate).execution_options(yield_per=lote)
+    result = await db.stream(stmt)
+    async for row in result:
+        yield dict(row._mapping)
 
 async def get_pagamento(db: AsyncSession, pagamento_id: int, trainer_id: int | None = None) -> models.Pagamento:
     stmt = (
@@ -368,26 +1110,47 @@ async def get_pagamento(db: AsyncSession, pagamento_id: int, trainer_id: int | N
 
     return pagamento
 
+async def _pagamento_com_aluno_travado(
+    db: AsyncSession, pagamento_id: int, trainer_id: int | None = None
+) -> tuple[models.Pagamento, models.Aluno]:
+    """Trava o aluno dono (como em registrar_pagamento) e relê o pagamento já sob a trava."""
+    pagamento = await get_pagamento(db, pagamento_id, trainer_id)
+    aluno = await _get_aluno_do_trainer(db, pagamento.aluno_id, travar=True)
+    pagamento = await db.scalar(
+        select(models.Pagamento)
+        .where(models.Pagamento.id == pagamento_id)
+        .execution_options(populate_existing=True)
+    )
+    if not pagamento:
+        raise exceptions.ResourceNotFoundError(f"Pagamento {pagamento_id} não encontrado")
+    return pagamento, aluno
+
+
 async def atualizar_pagamento(db: AsyncSession, pagamento_id: int, dados: schemas.PagamentoCreate, trainer_id: int | None = None) -> models.Pagamento:
 
-    pagamento = await get_pagamento(db, pagamento_id, trainer_id)
+    pagamento, aluno = await _pagamento_com_aluno_travado(db, pagamento_id, trainer_id)
 
-    _parse_referencia_mes(dados.referencia_mes)
+    periodo = _periodo_de_referencia(dados.referencia_mes)
+    trainer_do_aluno = aluno.trainer_id
+    if pagamento.periodo is not None:
+        await _contabilizar_pagamento(
+            db, trainer_do_aluno, pagamento.aluno_id, pagamento.periodo, pagamento.valor, -1, ignorar_id=pagamento.id
+        )
 
     # Ajusta o saldo de aulas do aluno pela diferença entre o valor antigo e o novo
     delta_aulas = dados.quantidade_aulas - (pagamento.quantidade_aulas or 0)
     if delta_aulas != 0:
-        aluno = await db.get(models.Aluno, pagamento.aluno_id)
-        if aluno:
-            aluno.saldo_aulas = max((aluno.saldo_aulas or 0) + delta_aulas, 0)
+        aluno.saldo_aulas = max((aluno.saldo_aulas or 0) + delta_aulas, 0)
 
     pagamento.valor = dados.valor
     pagamento.forma_pagamento = dados.forma_pagamento
     pagamento.observacao = dados.observacao
-    pagamento.referencia_mes = dados.referencia_mes
+    pagamento.referencia_mes = _referencia_do_periodo(periodo)
+    pagamento.periodo = periodo
     pagamento.quantidade_aulas = dados.quantidade_aulas
     if dados.data_pagamento:
         pagamento.data_pagamento = dados.data_pagamento
+    await _contabilizar_pagamento(db, trainer_do_aluno, pagamento.aluno_id, periodo, dados.valor, 1, ignorar_id=pagamento.id)
 
     try:
         await db.commit()
@@ -398,18 +1161,35 @@ async def atualizar_pagamento(db: AsyncSession, pagamento_id: int, dados: schema
         raise e
 
 async def deletar_pagamento(db: AsyncSession, pagamento_id: int, trainer_id: int | None = None) -> dict:
-    pagamento = await get_pagamento(db, pagamento_id, trainer_id)
+    pagamento, aluno = await _pagamento_com_aluno_travado(db, pagamento_id, trainer_id)
 
     # Estorna aulas creditadas por este pagamento (recarga de pacote)
     if pagamento.quantidade_aulas and pagamento.quantidade_aulas > 0:
-        aluno = await db.get(models.Aluno, pagamento.aluno_id)
-        if aluno:
-            aluno.saldo_aulas = max((aluno.saldo_aulas or 0) - pagamento.quantidade_aulas, 0)
+        aluno.saldo_aulas = max((aluno.saldo_aulas or 0) - pagamento.quantidade_aulas, 0)
 
+    if pagamento.periodo is not None:
+        await _contabilizar_pagamento(
+            db, aluno.trainer_id, pagamento.aluno_id, pagamento.periodo, pagamento.valor, -1, ignorar_id=pagamento.id
+        )
     await db.delete(pagamento)
     await db.commit()
     return {"message": f"Pagamento {pagamento_id} deletado com sucesso"}
 
+async def _incrementar_versao_plano(db: AsyncSession, plano_id: int | None = None, treino_id: int | None = None) -> None:
+    """Avança a versão do plano (por id ou pelo treino) na mesma transação da alteração."""
+    if plano_id is None:
+        plano_id = select(models.Treino.plano_id).where(models.Treino.id == treino_id).scalar_subquery()
+    res = await db.execute(
+        update(models.PlanoTreino)
+        .where(models.PlanoTreino.id == plano_id)
+        .values(versao=models.PlanoTreino.versao + 1)
+        .returning(models.PlanoTreino.aluno_id)
+        .execution_options(synchronize_session=False)
+    )
+    if res.first() == (None,):
+        await incrementar_versao_cache(db, CHAVE_TEMPLATES)
+
+
 async def desativar_plano(db: AsyncSession, plano_id: int) -> models.PlanoTreino:
     plano = await db.scalar(
         select(models.PlanoTreino)
@@ -420,17 +1200,30 @@ async def desativar_plano(db: AsyncSession, plano_id: int) -> models.PlanoTreino
         raise exceptions.ResourceNotFoundError(f"Plano {plano_id} não encontrado")
     
     plano.esta_ativo = False
+    plano.versao = models.PlanoTreino.versao + 1
     await db.commit()
     await db.refresh(plano)
     return plano
 
-async def deletar_prescricao(db: AsyncSession, prescricao_id: int) -> None:
-    prescricao = await db.scalar(
-        select(models.Prescricao).where(models.Prescricao.id == prescricao_id)
-    )
-    if not prescricao:
+async def _assert_owns_prescricao(db: AsyncSession, prescricao_id: int, trainer_id: int | None) -> models.Prescricao:
+    """Busca a prescrição e verifica ownership pelo plano, com as mesmas regras de _assert_owns_plano."""
+    linha = (await db.execute(
+        select(models.Prescricao, models.Aluno.trainer_id)
+        .join(models.Treino, models.Treino.id == models.Prescricao.treino_id)
+        .join(models.PlanoTreino, models.PlanoTreino.id == models.Treino.plano_id)
+        .outerjoin(models.Aluno, models.Aluno.id == models.PlanoTreino.aluno_id)
+        .where(models.Prescricao.id == prescricao_id)
+    )).first()
+    # Template (sem aluno) vem com trainer None e é acessível a todos
+    if not linha or (trainer_id is not None and linha.trainer_id not in (None, trainer_id)):
         raise exceptions.ResourceNotFoundError(f"Prescrição {prescricao_id} não encontrada")
+    return linha.Prescricao
+
+
+async def deletar_prescricao(db: AsyncSession, prescricao_id: int, trainer_id: int | None = None) -> None:
+    prescricao = await _assert_owns_prescricao(db, prescricao_id, trainer_id)
 
+    await _incrementar_versao_plano(db, treino_id=prescricao.treino_id)
     await db.delete(prescricao)
     await db.commit()
 
@@ -441,7 +1234,8 @@ async def atualizar_carga_prescricao(
     prescricao = await db.scalar(
         select(models.Prescricao)
         .options(
-            selectinload(models.Prescricao.treino).selectinload(models.Treino.plano)
+            selectinload(models.Prescricao.treino).selectinload(models.Treino.plano),
+            selectinload(models.Prescricao.exercicio),
         )
         .where(models.Prescricao.id == prescricao_id)
     )
@@ -452,21 +1246,24 @@ async def atualizar_carga_prescricao(
         raise exceptions.BusinessRuleError("Sem permissão para editar esta prescrição")
 
     prescricao.carga = nova_carga
+    prescricao.treino.plano.versao = models.PlanoTreino.versao + 1
     await db.commit()
-    await db.refresh(prescricao)
     return prescricao
 
 
-async def atualizar_prescricao(db: AsyncSession, prescricao_id: int, payload: schemas.PrescricaoUpdate) -> models.Prescricao:
-    prescricao = await db.scalar(select(models.Prescricao).where(models.Prescricao.id == prescricao_id))
-    if not prescricao:
-        raise exceptions.ResourceNotFoundError(f"Prescrição {prescricao_id} não encontrada")
-    
+async def atualizar_prescricao(
+    db: AsyncSession, prescricao_id: int, payload: schemas.PrescricaoParcial, trainer_id: int | None = None
+) -> models.Prescricao:
+    prescricao = await _assert_owns_prescricao(db, prescricao_id, trainer_id)
+    if payload.exercicio_id is not None:
+        await _carregar_exercicios(db, {payload.exercicio_id})
+
     for key, value in payload.model_dump(exclude_unset=True).items():
         setattr(prescricao, key, value)
-    
+
+    await _incrementar_versao_plano(db, treino_id=prescricao.treino_id)
     await db.commit()
-    await db.refresh(prescricao)
+    await db.refresh(prescricao, ["exercicio"])
     return prescricao
 
 # --- CONTROLLERS DE SESSAO DE TREINO ---
@@ -483,6 +1280,16 @@ def _parse_referencia_mes(referencia_mes: str) -> tuple[int, int]:
         raise exceptions.BusinessRuleError("referencia_mes inválida (use MM/YYYY)")
 
 
+def _periodo_de_referencia(referencia_mes: str) -> date:
+    """Converte "MM/YYYY" no 1º dia do mês (coluna Pagamento.periodo, indexada e ordenável)."""
+    mes, ano = _parse_referencia_mes(referencia_mes)
+    return date(ano, mes, 1)
+
+
+def _referencia_do_periodo(periodo: date) -> str:
+    return f"{periodo.month:02d}/{periodo.year}"
+
+
 def _inicio_fim_mes(ano: int, mes: int) -> tuple[datetime, datetime]:
     ultimo_dia = calendar.monthrange(ano, mes)[1]
     inicio = datetime(ano, mes, 1, 0, 0, 0)
@@ -490,13 +1297,16 @@ def _inicio_fim_mes(ano: int, mes: int) -> tuple[datetime, datetime]:
     return inicio, fim
 
 
+AVISO_SEM_SALDO = "Aluno de pacote sem saldo de aulas: sessão registrada sem débito."
+
+
 async def registrar_sessao(
     db: AsyncSession,
     payload: schemas.SessaoTreinoCreate,
     trainer_id: int | None = None,
     registrado_por_staff: bool = False,
 ) -> models.SessaoTreino:
-    aluno = await get_aluno(db, payload.aluno_id, trainer_id)
+    aluno = await _get_aluno_do_trainer(db, payload.aluno_id, trainer_id)
     
     if payload.plano_treino_id is not None:
         plano = await db.scalar(
@@ -536,7 +1346,7 @@ async def registrar_sessao(
             .values(saldo_aulas=models.Aluno.saldo_aulas - 1)
         )
         if res_debito.rowcount == 0:
-            aviso = "Aluno de pacote sem saldo de aulas: sessão registrada sem débito."
+            aviso = AVISO_SEM_SALDO
 
     db.add(sessao)
     await db.commit()
@@ -544,6 +1354,57 @@ async def registrar_sessao(
     sessao.aviso = aviso
     return sessao
 
+async def registrar_sessoes_em_lote(
+    db: AsyncSession, dados: schemas.CheckinLoteCreate, trainer_id: int | None = None
+) -> list[schemas.SessaoTreinoPublic]:
+    """
+    Check-in de turma registrado pelo staff: ownership numa query, débito de pacote num
+    UPDATE condicional único e todas as sessões num INSERT multi-linha, com um só commit.
+    """
+    aluno_ids = list(dict.fromkeys(dados.aluno_ids))
+    data_hora = dados.data_hora.replace(tzinfo=None)
+
+    stmt = select(models.Aluno.id, models.Aluno.tipo_pagamento).where(models.Aluno.id.in_(aluno_ids))
+    if trainer_id is not None:
+        stmt = stmt.where(models.Aluno.trainer_id == trainer_id)
+    tipos = dict((await db.execute(stmt)).all())
+    faltando = [aluno_id for aluno_id in aluno_ids if aluno_id not in tipos]
+    if faltando:
+        raise exceptions.ResourceNotFoundError(f"Alunos não encontrados: {', '.join(map(str, faltando))}")
+
+    # Mesmo UPDATE condicional do check-in individual, aplicado a todos os pacotes de uma vez
+    pacotes = [aluno_id for aluno_id in aluno_ids if tipos[aluno_id] == "pacote"]
+    debitados: set[int] = set()
+    if pacotes:
+        debitados = set((await db.execute(
+            update(models.Aluno)
+            .where(models.Aluno.id.in_(pacotes), models.Aluno.saldo_aulas > 0)
+            .values(saldo_aulas=models.Aluno.saldo_aulas - 1)
+            .returning(models.Aluno.id)
+            .execution_options(synchronize_session=False)
+        )).scalars().all())
+
+    ids_sessoes = (await db.execute(
+        insert(models.SessaoTreino).returning(models.SessaoTreino.id, sort_by_parameter_order=True),
+        [
+            {"aluno_id": aluno_id, "data_hora": data_hora, "realizada": True, "tipo_atividade": dados.tipo_atividade}
+            for aluno_id in aluno_ids
+        ],
+    )).scalars().all()
+    await db.commit()
+
+    return [
+        schemas.SessaoTreinoPublic(
+            id=sessao_id,
+            aluno_id=aluno_id,
+            data_hora=data_hora,
+            realizada=True,
+            tipo_atividade=dados.tipo_atividade,
+            aviso=AVISO_SEM_SALDO if aluno_id in pacotes and aluno_id not in debitados else None,
+        )
+        for sessao_id, aluno_id in zip(ids_sessoes, aluno_ids)
+    ]
+
 async def listar_sessoes(
     db: AsyncSession,
     aluno_id: int | None = None,
@@ -554,8 +1415,90 @@ async def listar_sessoes(
     limit: int = 100,
     offset: int = 0,
 ) -> list[models.SessaoTreino]:
-    stmt = select(models.SessaoTreino)
+    stmt = _filtrar_sessoes(
+        select(models.SessaoTreino), aluno_id=aluno_id, trainer_id=trainer_id, de=de, ate=ate, realizada=realizada
+    )
+    stmt = stmt.order_by(models.SessaoTreino.data_hora.desc(), models.SessaoTreino.id.desc()).limit(limit).offset(offset)
 
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def paginar_sessoes(
+    db: AsyncSession,
+    aluno_id: int | None = None,
+    trainer_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    realizada: bool | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> dict[str, Any]:
+    """Página por chave (data_hora, id) decrescente; next_cursor é None na última página."""
+    stmt = _filtrar_sessoes(
+        select(models.SessaoTreino), aluno_id=aluno_id, trainer_id=trainer_id, de=de, ate=ate, realizada=realizada
+    )
+    if cursor is not None:
+        ultima_data_hora, ultimo_id = decodificar_cursor(cursor, datetime, int)
+        stmt = stmt.where(
+            tuple_(models.SessaoTreino.data_hora, models.SessaoTreino.id) < tuple_(ultima_data_hora, ultimo_id)
+        )
+    stmt = stmt.order_by(models.SessaoTreino.data_hora.desc(), models.SessaoTreino.id.desc()).limit(limit + 1)
+
+    sessoes = list((await db.execute(stmt)).scalars().all())
+    next_cursor = None
+    if len(sessoes) > limit:
+        sessoes = sessoes[:limit]
+        next_cursor = codificar_cursor(sessoes[-1].data_hora, sessoes[-1].id)
+    return {"items": sessoes, "next_cursor": next_cursor}
+
+
+COLUNAS_EXPORTACAO_SESSOES = [
+    "id", "aluno_id", "aluno_nome", "data_hora", "realizada", "precisa_reposicao", "tipo_atividade",
+    "motivo_ausencia", "observacoes_performance", "plano_treino_id",
+]
+
+
+async def stream_sessoes(
+    db: AsyncSession,
+    trainer_id: int | None = None,
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    lote: int = 500,
+) -> AsyncIterator[dict[str, Any]]:
+    """Sessões (colunas, sem objetos ORM) por cursor no servidor, `lote` linhas por vez."""
+    stmt = _filtrar_sessoes(
+        select(
+            models.SessaoTreino.id,
+            models.SessaoTreino.aluno_id,
+            models.Aluno.nome.label("aluno_nome"),
+            models.SessaoTreino.data_hora,
+            models.SessaoTreino.realizada,
+            models.SessaoTreino.precisa_reposicao,
+            models.SessaoTreino.tipo_atividade,
+            models.SessaoTreino.motivo_ausencia,
+            models.SessaoTreino.observacoes_performance,
+            models.SessaoTreino.plano_treino_id,
+        ).join(models.Aluno, models.SessaoTreino.aluno_id == models.Aluno.id),
+        aluno_id=aluno_id, trainer_id=None, de=de, ate=ate, realizada=None,
+    )
+    if trainer_id is not None:
+        stmt = stmt.where(models.Aluno.trainer_id == trainer_id)
+    stmt = stmt.order_by(models.SessaoTreino.data_hora.desc(), models.SessaoTreino.id.desc())
+    result = await db.stream(stmt.execution_options(yield_per=lote))
+    async for row in result:
+        yield dict(row._mapping)
+
+
+def _filtrar_sessoes(
+    stmt,
+    aluno_id: int | None,
+    trainer_id: int | None,
+    de: date | None,
+    ate: date | None,
+    realizada: bool | None,
+):
     if trainer_id is not None:
         stmt = stmt.join(models.Aluno, models.SessaoTreino.aluno_id == models.Aluno.id).where(
             models.Aluno.trainer_id == trainer_id
@@ -569,11 +1512,39 @@ async def listar_sessoes(
         stmt = stmt.where(models.SessaoTreino.data_hora >= datetime.combine(de, datetime.min.time()))
     if ate is not None:
         stmt = stmt.where(models.SessaoTreino.data_hora <= datetime.combine(ate, datetime.max.time()))
+    return stmt
 
-    stmt = stmt.order_by(models.SessaoTreino.data_hora.desc()).limit(limit).offset(offset)
 
-    result = await db.execute(stmt)
-    return list(result.scalars().all())
+def _meta_base_mensal(frequencia_semanal: int, ano: int, mes: int) -> int:
+    # Protótipo local: semanas ≈ ceil(dias/7)
+    dias_no_mes = calendar.monthrange(ano, mes)[1]
+    semanas_no_mes = (dias_no_mes + 6) // 7
+    return int(frequencia_semanal) * semanas_no_mes
+
+
+def _sessao_conta_na_frequencia():
+    """Realizada, ou falta que não gera reposição (conta como aula consumida)."""
+    return or_(
+        models.SessaoTreino.realizada.is_(True),
+        and_(
+            models.SessaoTreino.realizada.is_(False),
+            models.SessaoTreino.precisa_reposicao.is_(False)
+        )
+    )
+
+
+def _frequencia_public(
+    aluno_id: int, referencia_mes: str, meta_base: int, aulas_extras: int, sessoes_realizadas: int
+) -> schemas.FrequenciaMensalPublic:
+    sessoes_previstas = meta_base + aulas_extras
+    taxa_adesao = (sessoes_realizadas / sessoes_previstas) if sessoes_previstas > 0 else 0.0
+    return schemas.FrequenciaMensalPublic(
+        aluno_id=aluno_id,
+        referencia_mes=referencia_mes,
+        sessoes_previstas=sessoes_previstas,
+        sessoes_realizadas=sessoes_realizadas,
+        taxa_adesao=round(taxa_adesao, 4),
+    )
 
 
 async def calcular_frequencia_mensal(
@@ -584,53 +1555,143 @@ async def calcular_frequencia_mensal(
 ) -> schemas.FrequenciaMensalPublic:
     mes, ano = _parse_referencia_mes(referencia_mes)
     inicio, fim = _inicio_fim_mes(ano, mes)
+    periodo = date(ano, mes, 1)
 
     aluno = await db.scalar(select(models.Aluno).where(models.Aluno.id == aluno_id))
     if not aluno or (trainer_id is not None and aluno.trainer_id != trainer_id):
         raise exceptions.ResourceNotFoundError(f"Aluno {aluno_id} não encontrado")
 
-    # Protótipo local: semanas ≈ ceil(dias/7)
-    dias_no_mes = calendar.monthrange(ano, mes)[1]
-    semanas_no_mes = (dias_no_mes + 6) // 7
-    meta_base = int(aluno.frequencia_semanal_plano) * semanas_no_mes
-
     aulas_extras = await db.scalar(
         select(func.sum(models.Pagamento.quantidade_aulas))
         .where(
             models.Pagamento.aluno_id == aluno_id,
-            models.Pagamento.referencia_mes == referencia_mes
+            models.Pagamento.periodo == periodo
         )
     )
-    aulas_extras = int(aulas_extras or 0)
-
-    sessoes_previstas = meta_base + aulas_extras
 
     sessoes_realizadas = await db.scalar(
         select(func.count(models.SessaoTreino.id)).where(
             models.SessaoTreino.aluno_id == aluno_id,
             models.SessaoTreino.data_hora >= inicio,
             models.SessaoTreino.data_hora <= fim,
-            or_(
-                models.SessaoTreino.realizada.is_(True),
-                and_(
-                    models.SessaoTreino.realizada.is_(False),
-                    models.SessaoTreino.precisa_reposicao.is_(False)
-                )
-            )
+            _sessao_conta_na_frequencia(),
         )
     )
 
-    sessoes_realizadas = int(sessoes_realizadas or 0)
-    taxa_adesao = (sessoes_realizadas / sessoes_previstas) if sessoes_previstas > 0 else 0.0
-
-    return schemas.FrequenciaMensalPublic(
-        aluno_id=aluno_id,
-        referencia_mes=referencia_mes,
-        sessoes_previstas=sessoes_previstas,
-        sessoes_realizadas=sessoes_realizadas,
-        taxa_adesao=round(taxa_adesao, 4),
+    return _frequencia_public(
+        aluno_id, referencia_mes,
+        _meta_base_mensal(aluno.frequencia_semanal_plano, ano, mes),
+        int(aulas_extras or 0), int(sessoes_realizadas or 0),
     )
 
+
+async def calcular_frequencia_mensal_lote(
+    db: AsyncSession,
+    referencia_mes: str,
+    trainer_id: int | None = None,
+    aluno_ids: list[int] | None = None,
+) -> list[schemas.FrequenciaMensalPublic]:
+    """
+    Frequência do mês para o roster inteiro (ou para aluno_ids) com as mesmas regras de
+    calcular_frequencia_mensal, em três queries agrupadas independente do tamanho da lista.
+    Ids de outros trainers são ignorados.
+    """
+    mes, ano = _parse_referencia_mes(referencia_mes)
+    inicio, fim = _inicio_fim_mes(ano, mes)
+    periodo = date(ano, mes, 1)
+
+    stmt = select(models.Aluno.id, models.Aluno.frequencia_semanal_plano).order_by(models.Aluno.nome, models.Aluno.id)
+    if trainer_id is not None:
+        stmt = stmt.where(models.Aluno.trainer_id == trainer_id)
+    if aluno_ids is not None:
+        stmt = stmt.where(models.Aluno.id.in_(aluno_ids))
+    alunos = (await db.execute(stmt)).all()
+    if not alunos:
+        return []
+    ids = [aluno_id for aluno_id, _ in alunos]
+
+    extras = dict((await db.execute(
+        select(models.Pagamento.aluno_id, func.sum(models.Pagamento.quantidade_aulas))
+        .where(models.Pagamento.aluno_id.in_(ids), models.Pagamento.periodo == periodo)
+        .group_by(models.Pagamento.aluno_id)
+    )).all())
+
+    realizadas = dict((await db.execute(
+        select(models.SessaoTreino.aluno_id, func.count(models.SessaoTreino.id))
+        .where(
+            models.SessaoTreino.aluno_id.in_(ids),
+            models.SessaoTreino.data_hora >= inicio,
+            models.SessaoTreino.data_hora <= fim,
+            _sessao_conta_na_frequencia(),
+        )
+        .group_by(models.SessaoTreino.aluno_id)
+    )).all())
+
+    return [
+        _frequencia_public(
+            aluno_id, referencia_mes,
+            _meta_base_mensal(frequencia_semanal, ano, mes),
+            int(extras.get(aluno_id) or 0), int(realizadas.get(aluno_id) or 0),
+        )
+        for aluno_id, frequencia_semanal in alunos
+    ]
+
+async def calcular_serie_frequencia(
+    db: AsyncSession,
+    aluno_id: int,
+    ate_referencia: str,
+    meses: int = 12,
+    trainer_id: int | None = None,
+) -> list[schemas.FrequenciaMensalPublic]:
+    """
+    Frequência dos últimos `meses` até ate_referencia (ordem crescente), com as regras de
+    calcular_frequencia_mensal: uma query agrupada por mês em sessões e outra em pagamentos.
+    """
+    mes, ano = _parse_referencia_mes(ate_referencia)
+    periodos = _month_starts(date(ano, mes, 1), n=meses)
+    janelas = [_inicio_fim_mes(p.year, p.month) for p in periodos]
+
+    aluno = await db.scalar(select(models.Aluno).where(models.Aluno.id == aluno_id))
+    if not aluno or (trainer_id is not None and aluno.trainer_id != trainer_id):
+        raise exceptions.ResourceNotFoundError(f"Aluno {aluno_id} não encontrado")
+
+    extras = dict((await db.execute(
+        select(models.Pagamento.periodo, func.sum(models.Pagamento.quantidade_aulas))
+        .where(
+            models.Pagamento.aluno_id == aluno_id,
+            models.Pagamento.periodo >= periodos[0],
+            models.Pagamento.periodo <= periodos[-1],
+        )
+        .group_by(models.Pagamento.periodo)
+    )).all())
+
+    # Índice do mês de cada sessão, com as mesmas fronteiras usadas no cálculo mensal
+    mes_da_sessao = case(
+        *[
+            (and_(models.SessaoTreino.data_hora >= inicio, models.SessaoTreino.data_hora <= fim), i)
+            for i, (inicio, fim) in enumerate(janelas)
+        ]
+    ).label("mes")
+    realizadas = dict((await db.execute(
+        select(mes_da_sessao, func.count(models.SessaoTreino.id))
+        .where(
+            models.SessaoTreino.aluno_id == aluno_id,
+            models.SessaoTreino.data_hora >= janelas[0][0],
+            models.SessaoTreino.data_hora <= janelas[-1][1],
+            _sessao_conta_na_frequencia(),
+        )
+        .group_by(mes_da_sessao)
+    )).all())
+
+    return [
+        _frequencia_public(
+            aluno_id, _referencia_do_periodo(periodo),
+            _meta_base_mensal(aluno.frequencia_semanal_plano, periodo.year, periodo.month),
+            int(extras.get(periodo) or 0), int(realizadas.get(i) or 0),
+        )
+        for i, periodo in enumerate(periodos)
+    ]
+
 async def get_sessao(db: AsyncSession, sessao_id: int, trainer_id: int | None = None) -> models.SessaoTreino:
     stmt = select(models.SessaoTreino).where(models.SessaoTreino.id == sessao_id)
     if trainer_id is not None:
@@ -663,21 +1724,34 @@ def _month_starts(ate_mes_atual: date, n: int = 12) -> list[date]:
 
 async def calcular_estatisticas_financeiras(db: AsyncSession, trainer_id: int | None = None) -> dict[str, Any]:
     hoje = date.today()
-    ref_mes = f"{hoje.month:02d}/{hoje.year}"
     mes_atual_inicio = date(hoje.year, hoje.month, 1)
+    ref_mes = _referencia_do_periodo(mes_atual_inicio)
 
     # Filtro de alunos do trainer (ou todos para admin)
     aluno_trainer_filter = (models.Aluno.trainer_id == trainer_id) if trainer_id is not None else True
 
-    # === QUERY 1: KPIs do mês atual ===
-    receita_mes_sq = (
-        select(func.coalesce(func.sum(models.Pagamento.valor), 0))
-        .join(models.Aluno, models.Pagamento.aluno_id == models.Aluno.id)
-        .where(models.Pagamento.referencia_mes == ref_mes)
-        .where(aluno_trainer_filter)
-        .scalar_subquery()
+    # === QUERY 1: Receita e pagantes dos últimos 12 meses, lidos do resumo mensal ===
+    meses = _month_starts(mes_atual_inicio, n=12)
+    resumo = models.ResumoFinanceiroMensal
+    serie_stmt = (
+        select(resumo.periodo, func.sum(resumo.receita), func.sum(resumo.n_alunos_pagantes))
+        .where(resumo.periodo >= meses[0], resumo.periodo <= mes_atual_inicio)
+        .group_by(resumo.periodo)
     )
+    if trainer_id is not None:
+        serie_stmt = serie_stmt.where(resumo.trainer_id == trainer_id)
+    por_mes = {periodo: (float(receita or 0), int(pagantes or 0)) for periodo, receita, pagantes in (await db.execute(serie_stmt)).all()}
+
+    receita_total_mes, alunos_que_pagaram_este_mes = por_mes.get(mes_atual_inicio, (0.0, 0))
+    ticket_medio = (receita_total_mes / alunos_que_pagaram_este_mes) if alunos_que_pagaram_este_mes > 0 else 0.0
+
+    # Preenche meses sem receita com 0
+    receita_mensal_12m = [
+        {"referencia_mes": f"{m.month:02d}/{m.year}", "receita": round(por_mes.get(m, (0.0, 0))[0], 2)}
+        for m in meses
+    ]
 
+    # === QUERY 2: Situação dos alunos ativos (depende do aluno, não do agregado) ===
     alunos_em_dia_sq = (
         select(func.count(models.Aluno.id))
         .where(aluno_trainer_filter)
@@ -687,7 +1761,7 @@ async def calcular_estatisticas_financeiras(db: AsyncSession, trainer_id: int |
                 and_(
                     models.Aluno.tipo_pagamento == "mensal",
                     models.Aluno.id.in_(
-                        select(models.Pagamento.aluno_id).where(models.Pagamento.referencia_mes == ref_mes)
+                        select(models.Pagamento.aluno_id).where(models.Pagamento.periodo == mes_atual_inicio)
                     )
                 ),
                 and_(
@@ -707,64 +1781,19 @@ async def calcular_estatisticas_financeiras(db: AsyncSession, trainer_id: int |
         .scalar_subquery()
     )
 
-    kpi_stmt = select(
-        receita_mes_sq.label("receita_total_mes"),
+    kpi_row = (await db.execute(select(
         alunos_em_dia_sq.label("alunos_em_dia"),
         total_alunos_sq.label("total_alunos"),
-    )
-
-    kpi_row = (await db.execute(kpi_stmt)).one()
-    receita_total_mes = float(kpi_row.receita_total_mes or 0)
+    ))).one()
     alunos_em_dia = int(kpi_row.alunos_em_dia or 0)
     total_alunos = int(kpi_row.total_alunos or 0)
 
     alunos_inadimplentes = max(total_alunos - alunos_em_dia, 0)
     inadimplencia = (alunos_inadimplentes / total_alunos) if total_alunos > 0 else 0.0
 
-    alunos_que_pagaram_stmt = (
-        select(func.count(func.distinct(models.Pagamento.aluno_id)))
-        .join(models.Aluno, models.Pagamento.aluno_id == models.Aluno.id)
-        .where(models.Pagamento.referencia_mes == ref_mes)
-        .where(aluno_trainer_filter)
-    )
-    alunos_que_pagaram_este_mes = await db.scalar(alunos_que_pagaram_stmt)
-    ticket_medio = (receita_total_mes / alunos_que_pagaram_este_mes) if alunos_que_pagaram_este_mes and alunos_que_pagaram_este_mes > 0 else 0.0
-
-    # === QUERY 2: Série histórica 12 meses ===
-    meses = _month_starts(mes_atual_inicio, n=12)
-    inicio_janela = meses[0]
-
-    # extract() é portável (PostgreSQL e SQLite), ao contrário de date_trunc
-    ano_col = func.extract("year", models.Pagamento.data_pagamento).label("ano")
-    mes_col = func.extract("month", models.Pagamento.data_pagamento).label("mes")
-    serie_stmt = (
-        select(
-            ano_col,
-            mes_col,
-            func.coalesce(func.sum(models.Pagamento.valor), 0).label("receita"),
-        )
-        .join(models.Aluno, models.Pagamento.aluno_id == models.Aluno.id)
-        .where(models.Pagamento.data_pagamento >= inicio_janela)
-        .where(aluno_trainer_filter)
-        .group_by(ano_col, mes_col)
-        .order_by(ano_col, mes_col)
-    )
-
-    serie_rows = (await db.execute(serie_stmt)).all()
-
-    # Preenche meses sem receita com 0
-    receita_por_mes: dict[date, float] = {}
-    for ano, mes, receita in serie_rows:
-        receita_por_mes[date(int(ano), int(mes), 1)] = float(receita or 0)
-
-    receita_mensal_12m = [
-        {"referencia_mes": f"{m.month:02d}/{m.year}", "receita": receita_por_mes.get(m, 0.0)}
-        for m in meses
-    ]
-
     resultado = {
         "referencia_mes": ref_mes,
-        "receita_total": receita_total_mes,
+        "receita_total": round(receita_total_mes, 2),
         "ticket_medio": round(ticket_medio, 2),
         "inadimplencia": round(inadimplencia, 4),
         "receita_mensal_12m": receita_mensal_12m,
@@ -775,6 +1804,47 @@ async def calcular_estatisticas_financeiras(db: AsyncSession, trainer_id: int |
 
     return resultado
 
+async def get_plano_ativo(db: AsyncSession, aluno_id: int) -> models.PlanoTreino:
+    """Árvore do plano ativo do aluno (o mais recente, se houver mais de um)."""
+    stmt = (
+        select(models.PlanoTreino)
+        .where(models.PlanoTreino.aluno_id == aluno_id, models.PlanoTreino.esta_ativo)
+        .order_by(models.PlanoTreino.id.desc())
+        .limit(1)
+        .options(_ARVORE_PLANO)
+    )
+    plano = (await db.execute(stmt.execution_options(populate_existing=True))).scalar_one_or_none()
+    if not plano:
+        raise exceptions.ResourceNotFoundError("Nenhum plano de treino ativo")
+    return plano
+
+
+async def versao_plano_ativo(db: AsyncSession, aluno_id: int) -> tuple[int, int, int]:
+    """
+    (id, versao, versão dos exercícios) do plano ativo: basta para conferir o ETag sem
+    montar a árvore. O plano embute nome e vídeo dos exercícios, então a biblioteca entra na chave.
+    """
+    versao_exercicios = (
+        select(models.CacheVersao.versao).where(models.CacheVersao.chave == CHAVE_EXERCICIOS).scalar_subquery()
+    )
+    linha = (await db.execute(
+        select(models.PlanoTreino.id, models.PlanoTreino.versao, func.coalesce(versao_exercicios, 0).label("exercicios"))
+        .where(models.PlanoTreino.aluno_id == aluno_id, models.PlanoTreino.esta_ativo)
+        .order_by(models.PlanoTreino.id.desc())
+        .limit(1)
+    )).first()
+    if not linha:
+        raise exceptions.ResourceNotFoundError("Nenhum plano de treino ativo")
+    return linha.id, linha.versao, linha.exercicios
+
+
+async def get_plano_treino(db: AsyncSession, plano_id: int, trainer_id: int | None = None) -> models.PlanoTreino:
+    """Árvore completa de um plano (usado para abrir planos inativos fora do detalhe do aluno)."""
+    await _assert_owns_plano(db, plano_id, trainer_id)
+    stmt = select(models.PlanoTreino).where(models.PlanoTreino.id == plano_id).options(_ARVORE_PLANO)
+    return (await db.execute(stmt.execution_options(populate_existing=True))).scalar_one()
+
+
 async def _assert_owns_plano(db: AsyncSession, plano_id: int, trainer_id: int | None) -> models.PlanoTreino:
     """Busca plano e verifica ownership. Templates (aluno_id=None) são acessíveis a todos."""
     plano = await db.scalar(select(models.PlanoTreino).where(models.PlanoTreino.id == plano_id))
@@ -789,95 +1859,178 @@ async def _assert_owns_plano(db: AsyncSession, plano_id: int, trainer_id: int |
     return plano
 
 
+async def _carregar_exercicios(db: AsyncSession, ids: set[int]) -> dict[int, models.Exercicio]:
+    """Busca os exercícios referenciados por um payload; id inexistente vira 409 antes de qualquer escrita."""
+    if not ids:
+        return {}
+    res = await db.execute(select(models.Exercicio).where(models.Exercicio.id.in_(ids)))
+    exercicios = {e.id: e for e in res.scalars()}
+    faltando = sorted(ids - exercicios.keys())
+    if faltando:
+        raise exceptions.BusinessRuleError(f"Exercício(s) não encontrado(s): {', '.join(map(str, faltando))}")
+    return exercicios
+
+
 async def criar_plano_treino(db: AsyncSession, aluno_id: int | None, plano_in: schemas.PlanoTreinoCreate, trainer_id: int | None = None):
+    """
+    Grava a árvore inteira em um número fixo de comandos (plano, treinos e prescrições
+    em INSERTs de várias linhas com RETURNING) e devolve o plano montado em memória,
+    sem recarregá-lo do banco.
+    """
     if aluno_id is not None and trainer_id is not None:
-        await get_aluno(db, aluno_id, trainer_id)  # valida ownership
-
-    # 1. Se for para um aluno específico, desativa os planos anteriores
-    if aluno_id is not None:
-        stmt_desativa = (
-            update(models.PlanoTreino)
-            .where(models.PlanoTreino.aluno_id == aluno_id, models.PlanoTreino.esta_ativo)
-            .values(esta_ativo=False)
-        )
-        await db.execute(stmt_desativa)
+        await _get_aluno_do_trainer(db, aluno_id, trainer_id)  # valida ownership
 
-    # 2. Cria o Plano
-    novo_plano = models.PlanoTreino(
-        aluno_id=aluno_id,
-        titulo=plano_in.titulo,
-        objetivo_estrategico=plano_in.objetivo_estrategico,
-        detalhes=plano_in.detalhes,
-        duracao_semanas=plano_in.duracao_semanas,
-        esta_ativo=True if aluno_id is not None else False  # Templates não ficam ativos por padrão
-    )
-    db.add(novo_plano)
-    await db.flush() # Garante que temos o ID do plano
-
-    # 2. Cria os Treinos (A, B, C...) preservando a ordem do payload
-    for t_idx, treino_data in enumerate(plano_in.treinos):
-        novo_treino = models.Treino(
-            plano_id=novo_plano.id,
-            nome=treino_data.nome,
-            ordem=t_idx
-        )
-        db.add(novo_treino)
-        await db.flush()
-
-        # 3. Cria as Prescrições para cada treino
-        for p_idx, pres_data in enumerate(treino_data.prescricoes):
-            nova_pres = models.Prescricao(
-                treino_id=novo_treino.id,
-                ordem=p_idx,
-                **pres_data.model_dump()
-            )
-            db.add(nova_pres)
+    # Uma consulta valida os exercícios do payload e já traz os dados embutidos na resposta
+    exercicios = await _carregar_exercicios(db, {p.exercicio_id for t in plano_in.treinos for p in t.prescricoes})
 
     try:
-        await db.commit()
-        
-        # Re-busca com selectinload para evitar erro de lazy loading no schema
-        stmt = (
-            select(models.PlanoTreino)
-            .options(
-                selectinload(models.PlanoTreino.treinos)
-                .selectinload(models.Treino.prescricoes)
-                .selectinload(models.Prescricao.exercicio)
+        # 1. Se for para um aluno específico, desativa os planos anteriores
+        if aluno_id is not None:
+            stmt_desativa = (
+                update(models.PlanoTreino)
+                .where(models.PlanoTreino.aluno_id == aluno_id, models.PlanoTreino.esta_ativo)
+                .values(esta_ativo=False)
             )
-            .where(models.PlanoTreino.id == novo_plano.id)
+            await db.execute(stmt_desativa)
+
+        # 2. Cria o Plano
+        novo_plano = await db.scalar(
+            insert(models.PlanoTreino).returning(models.PlanoTreino),
+            [{
+                "aluno_id": aluno_id,
+                "titulo": plano_in.titulo,
+                "objetivo_estrategico": plano_in.objetivo_estrategico,
+                "detalhes": plano_in.detalhes,
+                "duracao_semanas": plano_in.duracao_semanas,
+                "esta_ativo": aluno_id is not None,  # Templates não ficam ativos por padrão
+            }],
         )
-        res = await db.execute(stmt)
-        return res.scalar()
-    except Exception as e:
+
+        # 3. Cria os Treinos (A, B, C...) preservando a ordem do payload
+        treinos = []
+        if plano_in.treinos:
+            res = await db.scalars(
+                insert(models.Treino).returning(models.Treino, sort_by_parameter_order=True),
+                [{"plano_id": novo_plano.id, "nome": t.nome, "ordem": t_idx} for t_idx, t in enumerate(plano_in.treinos)],
+            )
+            treinos = res.all()
+
+        # 4. Cria as Prescrições de todos os treinos de uma vez
+        linhas = [
+            {"treino_id": treino.id, "ordem": p_idx, **pres_data.model_dump()}
+            for treino, treino_data in zip(treinos, plano_in.treinos)
+            for p_idx, pres_data in enumerate(treino_data.prescricoes)
+        ]
+        prescricoes = []
+        if linhas:
+            res = await db.scalars(insert(models.Prescricao).returning(models.Prescricao), linhas)
+            prescricoes = res.all()
+
+        if aluno_id is None:
+            await incrementar_versao_cache(db, CHAVE_TEMPLATES)
+        await db.commit()
+    except Exception:
         await db.rollback()
-        raise e
+        raise
+
+    # Monta as relações já conhecidas para a serialização não disparar lazy loading
+    por_treino: dict[int, list[models.Prescricao]] = {t.id: [] for t in treinos}
+    for pres in sorted(prescricoes, key=lambda p: p.ordem):
+        set_committed_value(pres, "exercicio", exercicios[pres.exercicio_id])
+        por_treino[pres.treino_id].append(pres)
+    for treino in treinos:
+        set_committed_value(treino, "prescricoes", por_treino[treino.id])
+    set_committed_value(novo_plano, "treinos", treinos)
+    return novo_plano
 
 async def deletar_plano_treino(db: AsyncSession, plano_id: int, trainer_id: int | None = None) -> None:
     plano = await _assert_owns_plano(db, plano_id, trainer_id)
+    if plano.aluno_id is None:
+        await incrementar_versao_cache(db, CHAVE_TEMPLATES)
     await db.delete(plano)
     await db.commit()
 
-async def clonar_plano_treino(db: AsyncSession, plano_origem_id: int, novo_aluno_id: int | None, trainer_id: int | None = None) -> models.PlanoTreino:
+async def _copiar_arvore_do_plano(db: AsyncSession, plano_origem_id: int, novos_planos_ids: list[int]) -> None:
     """
-    Clona um plano existente para um novo aluno (ou como template se novo_aluno_id for None).
+    Copia treinos e prescrições do plano de origem para cada plano novo, no banco, com
+    dois INSERT ... SELECT. A `ordem` dos treinos copiados é renumerada (0..n-1, mesma
+    sequência da origem) para servir de chave entre o treino original e suas cópias.
     """
-    # 1. Valida ownership e carrega o plano original
-    await _assert_owns_plano(db, plano_origem_id, trainer_id)
+    if not novos_planos_ids:
+        return
+    origem = (
+        select(
+            models.Treino.id,
+            models.Treino.nome,
+            (func.row_number().over(order_by=(models.Treino.ordem, models.Treino.id)) - 1).label("posicao"),
+        )
+        .where(models.Treino.plano_id == plano_origem_id)
+        .subquery()
+    )
+    novos = select(models.PlanoTreino.id).where(models.PlanoTreino.id.in_(novos_planos_ids)).subquery()
+
+    await db.execute(
+        insert(models.Treino).from_select(
+            ["plano_id", "nome", "ordem"],
+            select(novos.c.id, origem.c.nome, origem.c.posicao).select_from(novos).join(origem, true()),
+        )
+    )
+
+    copia = models.Treino.__table__.alias("copia")
+    colunas = ["series", "repeticoes", "descanso", "carga", "metodo", "observacoes"]
+    await db.execute(
+        insert(models.Prescricao).from_select(
+            ["treino_id", "exercicio_id", "ordem", *colunas],
+            select(
+                copia.c.id, models.Prescricao.exercicio_id, models.Prescricao.ordem,
+                *(getattr(models.Prescricao, c) for c in colunas),
+            )
+            .join(origem, origem.c.id == models.Prescricao.treino_id)
+            .join(copia, and_(copia.c.ordem == origem.c.posicao, copia.c.plano_id.in_(novos_planos_ids))),
+        )
+    )
+
+
+async def _carregar_plano_completo(db: AsyncSession, plano_id: int) -> models.PlanoTreino | None:
     stmt = (
         select(models.PlanoTreino)
         .options(
             selectinload(models.PlanoTreino.treinos)
             .selectinload(models.Treino.prescricoes)
+            .selectinload(models.Prescricao.exercicio)
         )
-        .where(models.PlanoTreino.id == plano_origem_id)
+        .where(models.PlanoTreino.id == plano_id)
+        .execution_options(populate_existing=True)  # a sessão pode ter cópias anteriores às escritas em lote
     )
-    result = await db.execute(stmt)
-    plano_origem = result.scalar_one_or_none()
+    return await db.scalar(stmt)
+
 
-    if not plano_origem:
-        raise exceptions.ResourceNotFoundError(f"Plano de origem {plano_origem_id} não encontrado")
+def _select_copia_do_plano(plano_origem_id: int, aluno_id_expr, titulo_expr, esta_ativo: bool):
+    """SELECT das colunas de planos_treino para o INSERT ... SELECT da clonagem."""
+    return select(
+        aluno_id_expr,
+        titulo_expr,
+        models.PlanoTreino.objetivo_estrategico,
+        models.PlanoTreino.detalhes,
+        models.PlanoTreino.duracao_semanas,
+        literal(date.today(), Date),
+        literal(esta_ativo),
+    ).where(models.PlanoTreino.id == plano_origem_id)
+
+
+_COLUNAS_COPIA_PLANO = ["aluno_id", "titulo", "objetivo_estrategico", "detalhes", "duracao_semanas", "data_inicio", "esta_ativo"]
+
+
+async def clonar_plano_treino(db: AsyncSession, plano_origem_id: int, novo_aluno_id: int | None, trainer_id: int | None = None) -> models.PlanoTreino:
+    """
+    Clona um plano existente para um novo aluno (ou como template se novo_aluno_id for None).
+    A cópia é feita no banco (INSERT ... SELECT), sem trazer a árvore de origem para o Python.
+    """
+    await _assert_owns_plano(db, plano_origem_id, trainer_id)
+    if novo_aluno_id is not None and trainer_id is not None:
+        await _get_aluno_do_trainer(db, novo_aluno_id, trainer_id)  # valida ownership do destino
 
-    # 2. Se for para um aluno, desativa os planos atuais dele
+    # Se for para um aluno, desativa os planos atuais dele
     if novo_aluno_id:
         await db.execute(
             update(models.PlanoTreino)
@@ -885,147 +2038,306 @@ async def clonar_plano_treino(db: AsyncSession, plano_origem_id: int, novo_aluno
             .values(esta_ativo=False)
         )
 
-    # 3. Cria o novo plano (Cópia profunda)
     # Templates mantêm o título original; cópias para aluno ganham sufixo
-    novo_plano = models.PlanoTreino(
-        aluno_id=novo_aluno_id,
-        titulo=f"{plano_origem.titulo} (Cópia)" if novo_aluno_id else plano_origem.titulo,
-        objetivo_estrategico=plano_origem.objetivo_estrategico,
-        detalhes=plano_origem.detalhes,
-        duracao_semanas=plano_origem.duracao_semanas,
-        esta_ativo=True if novo_aluno_id else False # Templates começam inativos ou neutros
-    )
-    db.add(novo_plano)
-    await db.flush()
-
-    for treino_origem in plano_origem.treinos:
-        novo_treino = models.Treino(
-            plano_id=novo_plano.id,
-            nome=treino_origem.nome,
-            ordem=treino_origem.ordem
+    titulo = models.PlanoTreino.titulo + " (Cópia)" if novo_aluno_id else models.PlanoTreino.titulo
+    novo_plano_id = await db.scalar(
+        insert(models.PlanoTreino)
+        .from_select(
+            _COLUNAS_COPIA_PLANO,
+            _select_copia_do_plano(plano_origem_id, literal(novo_aluno_id, Integer), titulo, novo_aluno_id is not None),
         )
-        db.add(novo_treino)
-        await db.flush()
-
-        for pres_origem in treino_origem.prescricoes:
-            nova_pres = models.Prescricao(
-                treino_id=novo_treino.id,
-                ordem=pres_origem.ordem,
-                exercicio_id=pres_origem.exercicio_id,
-                series=pres_origem.series,
-                repeticoes=pres_origem.repeticoes,
-                descanso=pres_origem.descanso,
-                carga=pres_origem.carga,
-                metodo=pres_origem.metodo,
-                observacoes=pres_origem.observacoes
-            )
-            db.add(nova_pres)
+        .returning(models.PlanoTreino.id)
+    )
+    await _copiar_arvore_do_plano(db, plano_origem_id, [novo_plano_id])
 
+    if novo_aluno_id is None:
+        await incrementar_versao_cache(db, CHAVE_TEMPLATES)
     await db.commit()
-    
-    # Retorna o plano clonado com os dados carregados
-    stmt_final = (
-        select(models.PlanoTreino)
-        .options(
-            selectinload(models.PlanoTreino.treinos)
-            .selectinload(models.Treino.prescricoes)
-            .selectinload(models.Prescricao.exercicio)
-        )
-        .where(models.PlanoTreino.id == novo_plano.id)
+
+    return await _carregar_plano_completo(db, novo_plano_id)
+
+
+async def clonar_plano_para_alunos(
+    db: AsyncSession, plano_origem_id: int, aluno_ids: list[int], trainer_id: int | None = None
+) -> list[schemas.PlanoClonadoPublic]:
+    """
+    Aplica um plano a vários alunos numa transação: ownership numa query, um UPDATE
+    desativa os planos vigentes de todos e a árvore é copiada com três INSERT ... SELECT.
+    """
+    await _assert_owns_plano(db, plano_origem_id, trainer_id)
+    aluno_ids = list(dict.fromkeys(aluno_ids))
+
+    stmt = select(models.Aluno.id).where(models.Aluno.id.in_(aluno_ids))
+    if trainer_id is not None:
+        stmt = stmt.where(models.Aluno.trainer_id == trainer_id)
+    encontrados = set((await db.scalars(stmt)).all())
+    faltando = [aluno_id for aluno_id in aluno_ids if aluno_id not in encontrados]
+    if faltando:
+        raise exceptions.ResourceNotFoundError(f"Alunos não encontrados: {', '.join(map(str, faltando))}")
+
+    await db.execute(
+        update(models.PlanoTreino)
+        .where(models.PlanoTreino.aluno_id.in_(aluno_ids), models.PlanoTreino.esta_ativo)
+        .values(esta_ativo=False)
     )
-    res_final = await db.execute(stmt_final)
-    return res_final.scalar()
+
+    # Produto do plano de origem com os alunos de destino: uma linha de plano por aluno
+    copia = (
+        _select_copia_do_plano(plano_origem_id, models.Aluno.id, models.PlanoTreino.titulo + " (Cópia)", True)
+        .join(models.Aluno, models.Aluno.id.in_(aluno_ids))
+    )
+    novos = (await db.execute(
+        insert(models.PlanoTreino)
+        .from_select(_COLUNAS_COPIA_PLANO, copia)
+        .returning(models.PlanoTreino.id, models.PlanoTreino.aluno_id)
+    )).all()
+    await _copiar_arvore_do_plano(db, plano_origem_id, [plano_id for plano_id, _ in novos])
+    await db.commit()
+
+    plano_por_aluno = {aluno_id: plano_id for plano_id, aluno_id in novos}
+    return [schemas.PlanoClonadoPublic(aluno_id=aluno_id, plano_id=plano_por_aluno[aluno_id]) for aluno_id in aluno_ids]
+
+_CAMPOS_PRESCRICAO = ("exercicio_id", "series", "repeticoes", "carga", "descanso", "metodo", "observacoes")
+
 
 async def atualizar_plano_treino(db: AsyncSession, plano_id: int, payload: schemas.PlanoTreinoUpdate, trainer_id: int | None = None) -> models.PlanoTreino:
     """
     Atualiza um plano de treino e toda sua hierarquia (treinos e prescrições).
     Implementa lógica de sincronização: o que não vier no payload é removido.
+
+    A árvore atual é comparada com o payload e só as linhas que mudaram são escritas,
+    em lote (um DELETE, um UPDATE por tabela e INSERTs de várias linhas). Se o payload
+    trouxer `versao`, a escrita só acontece se o plano ainda estiver nessa versão.
     """
-    await _assert_owns_plano(db, plano_id, trainer_id)
+    plano = await _assert_owns_plano(db, plano_id, trainer_id)
+
+    # 1. Campos básicos + versão
+    dados_plano = payload.model_dump(exclude={"treinos", "versao"}, exclude_unset=True)
+    await _avancar_versao_condicional(db, plano_id, payload.versao, **dados_plano)
+
+    # 2. Sincroniza Treinos se fornecido
+    try:
+        if payload.treinos is not None:
+            await _sincronizar_treinos(db, plano_id, payload.treinos, await _ler_arvore(db, plano_id))
 
+        if plano.aluno_id is None:
+            await incrementar_versao_cache(db, CHAVE_TEMPLATES)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    # Retorna o plano atualizado com relações novas
+    return await _carregar_plano_completo(db, plano_id)
+
+
+async def _avancar_versao_condicional(db: AsyncSession, plano_id: int, versao_esperada: int | None, **valores) -> None:
+    """
+    Avança a versão do plano (e grava `valores`) num UPDATE condicional: a checagem é
+    atômica e a trava da linha serializa editores concorrentes até o commit.
+    """
     stmt = (
-        select(models.PlanoTreino)
-        .options(
-            selectinload(models.PlanoTreino.treinos)
-            .selectinload(models.Treino.prescricoes)
-        )
+        update(models.PlanoTreino)
         .where(models.PlanoTreino.id == plano_id)
+        .values(**valores, versao=models.PlanoTreino.versao + 1)
+        .returning(models.PlanoTreino.id)
+        .execution_options(synchronize_session=False)
     )
-    result = await db.execute(stmt)
-    plano = result.scalar_one_or_none()
+    if versao_esperada is not None:
+        stmt = stmt.where(models.PlanoTreino.versao == versao_esperada)
+    if await db.scalar(stmt) is None:
+        await db.rollback()
+        raise exceptions.BusinessRuleError(
+            "O plano foi alterado por outra pessoa desde que foi aberto. Recarregue antes de salvar."
+        )
 
-    if not plano:
-        raise exceptions.ResourceNotFoundError(f"Plano {plano_id} não encontrado")
 
-    # 2. Atualiza campos básicos do plano
-    dados_plano = payload.model_dump(exclude={"treinos"}, exclude_unset=True)
-    for key, value in dados_plano.items():
-        setattr(plano, key, value)
-
-    # 3. Sincroniza Treinos se fornecido
-    if payload.treinos is not None:
-        # Forçamos o carregamento/acesso para garantir que o SQLAlchemy não se perca
-        treinos_atuais_map = {t.id: t for t in plano.treinos}
-        ids_no_payload = {t.id for t in payload.treinos if t.id is not None}
-
-        # 3a. Remover treinos que não estão no payload
-        # Usamos uma lista auxiliar para iterar e deletar com segurança
-        for t_id, t_obj in list(treinos_atuais_map.items()):
-            if t_id not in ids_no_payload:
-                # Remove da coleção da relação também
-                plano.treinos.remove(t_obj)
-                await db.delete(t_obj)
-
-        # 3b. Atualizar ou Criar
-        for i, t_data in enumerate(payload.treinos):
-            if t_data.id and t_data.id in treinos_atuais_map:
-                # Atualizar existente
-                treino = treinos_atuais_map[t_data.id]
-                treino.nome = t_data.nome
-                treino.ordem = i
-
-                # Sincronizar Prescrições
-                pres_atuais_map = {p.id: p for p in treino.prescricoes}
-                p_ids_no_payload = {p.id for p in t_data.prescricoes if p.id is not None}
-
-                for p_id, p_obj in list(pres_atuais_map.items()):
-                    if p_id not in p_ids_no_payload:
-                        treino.prescricoes.remove(p_obj)
-                        await db.delete(p_obj)
-
-                for p_idx, p_data in enumerate(t_data.prescricoes):
-                    if p_data.id and p_data.id in pres_atuais_map:
-                        pres = pres_atuais_map[p_data.id]
-                        for k, v in p_data.model_dump(exclude={"id"}).items():
-                            setattr(pres, k, v)
-                        pres.ordem = p_idx
-                    else:
-                        nova_p = models.Prescricao(treino_id=treino.id, ordem=p_idx, **p_data.model_dump(exclude={"id"}))
-                        db.add(nova_p)
-            else:
-                # Criar novo treino
-                novo_treino = models.Treino(plano_id=plano.id, nome=t_data.nome, ordem=i)
-                plano.treinos.append(novo_treino)
-                db.add(novo_treino)
-                await db.flush() # Para ganhar o ID do novo treino
-                for p_idx, p_data in enumerate(t_data.prescricoes):
-                    nova_p = models.Prescricao(treino_id=novo_treino.id, ordem=p_idx, **p_data.model_dump(exclude={"id"}))
-                    db.add(nova_p)
+async def _ler_arvore(db: AsyncSession, plano_id: int) -> tuple[dict[int, Any], dict[int, dict[int, Any]]]:
+    """Treinos e prescrições atuais do plano como linhas simples: ({treino_id: treino}, {treino_id: {id: prescrição}})."""
+    treinos = {
+        t.id: t for t in (await db.execute(
+            select(models.Treino.id, models.Treino.nome, models.Treino.ordem)
+            .where(models.Treino.plano_id == plano_id)
+            .order_by(models.Treino.ordem, models.Treino.id)
+        )).all()
+    }
+    prescricoes: dict[int, dict[int, Any]] = {t_id: {} for t_id in treinos}
+    if treinos:
+        res = await db.execute(
+            select(models.Prescricao.id, models.Prescricao.treino_id, models.Prescricao.ordem,
+                   *(getattr(models.Prescricao, c) for c in _CAMPOS_PRESCRICAO))
+            .where(models.Prescricao.treino_id.in_(treinos))
+            .order_by(models.Prescricao.ordem, models.Prescricao.id)
+        )
+        for linha in res.all():
+            prescricoes[linha.treino_id][linha.id] = linha
+    return treinos, prescricoes
+
+
+async def _sincronizar_treinos(
+    db: AsyncSession, plano_id: int, treinos_in: list[schemas.TreinoUpdate],
+    arvore: tuple[dict[int, Any], dict[int, dict[int, Any]]],
+) -> None:
+    """Aplica a diferença entre a árvore lida do banco (`_ler_arvore`) e os treinos desejados."""
+    treinos_atuais, prescricoes_atuais = arvore
+
+    treinos_mudados, treinos_novos = [], []
+    pres_mudadas, pres_novas, pres_mantidas = [], [], set()
+    for ordem, t_data in enumerate(treinos_in):
+        atual = treinos_atuais.get(t_data.id) if t_data.id is not None else None
+        if atual is None:
+            treinos_novos.append((ordem, t_data))
+            continue
+        if (atual.nome, atual.ordem) != (t_data.nome, ordem):
+            treinos_mudados.append({"id": atual.id, "nome": t_data.nome, "ordem": ordem})
+
+        # Prescrições só contam como existentes dentro do mesmo treino
+        existentes = prescricoes_atuais[atual.id]
+        for p_ordem, p_data in enumerate(t_data.prescricoes):
+            valores = {"ordem": p_ordem, **p_data.model_dump(exclude={"id"})}
+            p_atual = existentes.get(p_data.id) if p_data.id is not None else None
+            if p_atual is None:
+                pres_novas.append({"treino_id": atual.id, **valores})
+                continue
+            pres_mantidas.add(p_atual.id)
+            if any(getattr(p_atual, campo) != valor for campo, valor in valores.items()):
+                pres_mudadas.append({"id": p_atual.id, **valores})
+
+    ids_treinos_mantidos = {t.id for t in treinos_in if t.id in treinos_atuais}
+    treinos_removidos = [t_id for t_id in treinos_atuais if t_id not in ids_treinos_mantidos]
+    pres_removidas = [
+        p_id for t_id in ids_treinos_mantidos for p_id in prescricoes_atuais[t_id] if p_id not in pres_mantidas
+    ]
 
-    await db.commit()
+    # Só o que será gravado precisa ser conferido: linhas intactas já passaram pela FK
+    await _carregar_exercicios(
+        db,
+        {p["exercicio_id"] for p in pres_novas + pres_mudadas}
+        | {p.exercicio_id for _, t in treinos_novos for p in t.prescricoes},
+    )
 
-    # Retorna o plano atualizado com relações novas
-    stmt_final = (
-        select(models.PlanoTreino)
-        .options(
-            selectinload(models.PlanoTreino.treinos)
-            .selectinload(models.Treino.prescricoes)
-            .selectinload(models.Prescricao.exercicio)
+    # 3a. Remoções: prescrições avulsas e as dos treinos removidos num DELETE, depois os treinos
+    if pres_removidas or treinos_removidos:
+        await db.execute(
+            delete(models.Prescricao)
+            .where(or_(models.Prescricao.id.in_(pres_removidas), models.Prescricao.treino_id.in_(treinos_removidos)))
+            .execution_options(synchronize_session=False)
         )
-        .where(models.PlanoTreino.id == plano.id)
-    )
-    res_final = await db.execute(stmt_final)
-    return res_final.scalar()
+    if treinos_removidos:
+        await db.execute(
+            delete(models.Treino).where(models.Treino.id.in_(treinos_removidos)).execution_options(synchronize_session=False)
+        )
+
+    # 3b. Atualizações em lote por chave primária, só das linhas que mudaram
+    if treinos_mudados:
+        await db.execute(update(models.Treino), treinos_mudados)
+    if pres_mudadas:
+        await db.execute(update(models.Prescricao), pres_mudadas)
+
+    # 3c. Treinos novos num INSERT multi-linha; as prescrições deles entram junto com as demais
+    if treinos_novos:
+        ids_novos = (await db.execute(
+            insert(models.Treino).returning(models.Treino.id, sort_by_parameter_order=True),
+            [{"plano_id": plano_id, "nome": t.nome, "ordem": ordem} for ordem, t in treinos_novos],
+        )).scalars().all()
+        for treino_id, (_, t_data) in zip(ids_novos, treinos_novos):
+            pres_novas.extend(
+                {"treino_id": treino_id, "ordem": p_ordem, **p_data.model_dump(exclude={"id"})}
+                for p_ordem, p_data in enumerate(t_data.prescricoes)
+            )
+    if pres_novas:
+        await db.execute(insert(models.Prescricao), pres_novas)
+
+
+def _aplicar_operacoes_em_memoria(treinos: list[dict], operacoes: list, plano_id: int) -> list[dict]:
+    """Aplica as operações, em ordem, sobre a árvore em dicts; itens criados no lote têm id None."""
+
+    def _treino(treino_id: int) -> dict:
+        treino = next((t for t in treinos if t["id"] == treino_id), None)
+        if treino is None:
+            raise exceptions.ResourceNotFoundError(f"Treino {treino_id} não encontrado no plano {plano_id}")
+        return treino
+
+    def _prescricao(prescricao_id: int) -> tuple[list[dict], dict]:
+        for t in treinos:
+            for p in t["prescricoes"]:
+                if p["id"] == prescricao_id:
+                    return t["prescricoes"], p
+        raise exceptions.ResourceNotFoundError(f"Prescrição {prescricao_id} não encontrada no plano {plano_id}")
+
+    def _reordenar(itens: list[dict], ids: list[int], rotulo: str) -> list[dict]:
+        # Itens criados no mesmo lote ainda não têm id: ficam depois dos reordenados
+        existentes = {i["id"]: i for i in itens if i["id"] is not None}
+        if len(ids) != len(existentes) or set(ids) != existentes.keys():
+            raise exceptions.BusinessRuleError(f"A nova ordem de {rotulo} deve listar exatamente os ids atuais")
+        return [existentes[i] for i in ids] + [i for i in itens if i["id"] is None]
+
+    def _inserir(lista: list, item: dict, posicao: int | None) -> None:
+        lista.insert(len(lista) if posicao is None else posicao, item)
+
+    for op in operacoes:
+        if isinstance(op, schemas.OpAdicionarTreino):
+            _inserir(treinos, {"id": None, "nome": op.nome, "prescricoes": [
+                {"id": None, **p.model_dump()} for p in op.prescricoes
+            ]}, op.posicao)
+        elif isinstance(op, schemas.OpAtualizarTreino):
+            _treino(op.treino_id)["nome"] = op.nome
+        elif isinstance(op, schemas.OpRemoverTreino):
+            treinos.remove(_treino(op.treino_id))
+        elif isinstance(op, schemas.OpReordenarTreinos):
+            treinos = _reordenar(treinos, op.treino_ids, "treinos")
+        elif isinstance(op, schemas.OpAdicionarPrescricao):
+            _inserir(_treino(op.treino_id)["prescricoes"], {"id": None, **op.prescricao.model_dump()}, op.posicao)
+        elif isinstance(op, schemas.OpAtualizarPrescricao):
+            _, prescricao = _prescricao(op.prescricao_id)
+            prescricao.update(op.model_dump(exclude={"op", "prescricao_id"}, exclude_unset=True))
+        elif isinstance(op, schemas.OpRemoverPrescricao):
+            lista, prescricao = _prescricao(op.prescricao_id)
+            lista.remove(prescricao)
+        elif isinstance(op, schemas.OpReordenarPrescricoes):
+            treino = _treino(op.treino_id)
+            treino["prescricoes"] = _reordenar(treino["prescricoes"], op.prescricao_ids, "prescrições")
+    return treinos
+
+
+async def aplicar_operacoes_plano(
+    db: AsyncSession, plano_id: int, dados: schemas.OperacoesPlanoRequest, trainer_id: int | None = None
+) -> models.PlanoTreino:
+    """
+    Aplica um lote de operações granulares (adicionar, editar, remover e reordenar treinos
+    e prescrições) numa transação: ownership e versão conferidos uma vez, operações
+    aplicadas em memória sobre a árvore atual e só a diferença gravada no banco.
+    """
+    plano = await _assert_owns_plano(db, plano_id, trainer_id)
+    await _avancar_versao_condicional(db, plano_id, dados.versao)  # trava o plano antes de ler a árvore
+    arvore = await _ler_arvore(db, plano_id)
+    treinos_atuais, prescricoes_atuais = arvore
+
+    try:
+        treinos = _aplicar_operacoes_em_memoria([
+            {"id": t.id, "nome": t.nome, "prescricoes": [
+                {"id": p.id, **{c: getattr(p, c) for c in _CAMPOS_PRESCRICAO}} for p in prescricoes_atuais[t.id].values()
+            ]}
+            for t in treinos_atuais.values()
+        ], dados.operacoes, plano_id)
+
+        # O estado final passa pela mesma validação do PATCH do plano inteiro
+        try:
+            treinos_finais = [schemas.TreinoUpdate.model_validate(t) for t in treinos]
+        except ValidationError as e:
+            erro = e.errors()[0]
+            raise exceptions.BusinessRuleError(
+                f"Operações deixariam o plano inválido: {'.'.join(map(str, erro['loc']))} ({erro['msg']})"
+            )
+        await _sincronizar_treinos(db, plano_id, treinos_finais, arvore)
+
+        if plano.aluno_id is None:
+            await incrementar_versao_cache(db, CHAVE_TEMPLATES)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return await _carregar_plano_completo(db, plano_id)
 
 # --- CONTROLLERS DE ADMIN ---
 
@@ -1041,7 +2353,7 @@ async def criar_trainer(db: AsyncSession, trainer_in: schemas.TrainerCreate) ->
     novo_trainer = models.Usuario(
         username=trainer_in.username,
         email=trainer_in.email,
-        hashed_password=get_password_hash(trainer_in.password),
+        hashed_password=await get_password_hash_async(trainer_in.password),
         role="trainer",
         is_active=True,
     )
@@ -1066,17 +2378,18 @@ async def verificar_senha_usuario(db: AsyncSession, usuario_id: int, senha: str)
     usuario = await db.scalar(select(models.Usuario).where(models.Usuario.id == usuario_id))
     if not usuario:
         raise exceptions.ResourceNotFoundError(f"Usuário {usuario_id} não encontrado")
-    from src.security import verify_password
-    return verify_password(senha, usuario.hashed_password)
+    return await verify_password_async(senha, usuario.hashed_password)
 
 
 async def resetar_senha_usuario(db: AsyncSession, usuario_id: int, nova_senha: str) -> models.Usuario:
     usuario = await db.scalar(select(models.Usuario).where(models.Usuario.id == usuario_id))
     if not usuario:
         raise exceptions.ResourceNotFoundError(f"Usuário {usuario_id} não encontrado")
-    usuario.hashed_password = get_password_hash(nova_senha)
+    usuario.hashed_password = await get_password_hash_async(nova_senha)
+    revogar_tokens(usuario)
     try:
         await db.commit()
+        invalidar_principal(usuario)
         await db.refresh(usuario)
         return usuario
     except Exception as e:
@@ -1088,6 +2401,16 @@ async def listar_exercicios(db: AsyncSession):
     result = await db.execute(select(models.Exercicio).order_by(models.Exercicio.grupo_muscular))
     return result.scalars().all()
 
+
+async def exercicios_json(db: AsyncSession, versao: int) -> bytes:
+    """Biblioteca serializada, reaproveitada enquanto a versão "exercicios" não mudar."""
+    corpo = _cache_respostas.get(CHAVE_EXERCICIOS, versao)
+    if corpo is None:
+        exercicios = await listar_exercicios(db)
+        corpo = _lista_exercicios.dump_json(_lista_exercicios.validate_python(exercicios, from_attributes=True))
+        _cache_respostas.set(CHAVE_EXERCICIOS, versao, corpo)
+    return corpo
+
 async def criar_exercicio(db: AsyncSession, exercicio_in: schemas.ExercicioCreate):
     stmt = select(models.Exercicio).where(models.Exercicio.nome == exercicio_in.nome)
     result = await db.execute(stmt)
@@ -1097,6 +2420,7 @@ async def criar_exercicio(db: AsyncSession, exercicio_in: schemas.ExercicioCreat
     novo_exercicio = models.Exercicio(**exercicio_in.model_dump())
     db.add(novo_exercicio)
     try:
+        await incrementar_versao_cache(db, CHAVE_EXERCICIOS)
         await db.commit()
         await db.refresh(novo_exercicio)
         return novo_exercicio
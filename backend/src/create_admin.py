@@ -2,7 +2,7 @@ import asyncio
 from sqlalchemy import select
 from src.database import SessionLocal
 from src.models import Usuario
-from src.security import get_password_hash
+from src.security import get_password_hash, revogar_tokens
 
 async def create_initial_admin():
     async with SessionLocal() as db:
@@ -14,6 +14,7 @@ async def create_initial_admin():
         if existing:
             if existing.role != "admin":
                 existing.role = "admin"
+                revogar_tokens(existing)  # tokens antigos carregam o papel anterior nas claims
                 await db.commit()
                 print("✅ Usuário 'admin' promovido para role=admin.")
             else:
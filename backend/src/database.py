@@ -1,14 +1,76 @@
+import threading
+import time
+from typing import Any
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from src.config import settings
 
 
+class _EsperaPool:
+    """Contadores de espera por conexão (o QueuePool só expõe o estado instantâneo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.aguardando = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def registrar(self, espera: float, timeout: bool = False) -> None:
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+
+
+_espera_pool = _EsperaPool()
+
+
+class PoolComMetricas(AsyncAdaptedQueuePool):
+    """QueuePool que mede quanto tempo cada checkout esperou por uma conexão livre."""
+
+    def _do_get(self):
+        with _espera_pool._lock:
+            _espera_pool.aguardando += 1
+        inicio = time.perf_counter()
+        try:
+            conexao = super()._do_get()
+        except PoolTimeoutError:
+            _espera_pool.registrar(time.perf_counter() - inicio, timeout=True)
+            raise
+        else:
+            _espera_pool.registrar(time.perf_counter() - inicio)
+            return conexao
+        finally:
+            with _espera_pool._lock:
+                _espera_pool.aguardando -= 1
+
+
+# Cache de prepared statements: o do asyncpg (connect_args) e o do dialeto (parâmetro da URL)
+url_banco = make_url(settings.DATABASE_URL).update_query_dict(
+    {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+)
+
 # Configuração do engine
 # echo=False em produção para evitar vazar dados sensíveis (PII) nos logs do Render
 engine = create_async_engine(
-    settings.DATABASE_URL,
+    url_banco,
     echo=False,
-    connect_args={"ssl": "prefer"} 
+    poolclass=PoolComMetricas,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={"ssl": "prefer", "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
 )
 
 SessionLocal = async_sessionmaker(
@@ -21,9 +83,28 @@ class Base(DeclarativeBase):
     pass
 
 
+def estatisticas_pool() -> dict[str, Any]:
+    """Estado atual do pool e histórico de espera por conexão (por processo)."""
+    pool = engine.pool
+    with _espera_pool._lock:
+        checkouts = _espera_pool.checkouts
+        return {
+            "tamanho": pool.size(),
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "em_uso": pool.checkedout(),
+            "ociosas": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "aguardando": _espera_pool.aguardando,
+            "checkouts": checkouts,
+            "timeouts": _espera_pool.timeouts,
+            "espera_media_ms": round(_espera_pool.espera_total / checkouts * 1000, 2) if checkouts else 0.0,
+            "espera_max_ms": round(_espera_pool.espera_max * 1000, 2),
+        }
+
+
 async def get_db():
     async with SessionLocal() as db:
         try:
             yield db
         finally:
-            await db.close()
\ No newline at end of file
+            await db.close()
@@ -14,6 +14,10 @@ class BusinessRuleError(PTRosterError):
     """Exceção levantada quando uma regra de negócio é violada(e.g., Treino sem descanso)."""
     pass
 
+class ServiceUnavailableError(PTRosterError):
+    """Exceção levantada quando um recurso interno está saturado (e.g., fila de hash de senhas cheia)."""
+    pass
+
 class AlunoNotFoundError(ResourceNotFoundError):
     """Exceção levantada quando um aluno não é encontrado."""
     def __init__(self, aluno_id: int | None = None, message: str | None = None):
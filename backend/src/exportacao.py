@@ -0,0 +1,52 @@
+"""
+Serialização incremental para exportações: as linhas chegam de um cursor no servidor
+(db.stream + yield_per) e saem em blocos de texto, então a memória não cresce com o
+volume de histórico do tenant.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator
+
+LINHAS_POR_BLOCO = 500
+# Planilhas interpretam a célula como fórmula quando o texto começa com estes caracteres
+_INICIO_DE_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _texto(valor: Any) -> Any:
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return "" if valor is None else valor
+
+
+def celula_csv(valor: Any) -> Any:
+    """Valor pronto para CSV; texto que seria lido como fórmula ganha um apóstrofo na frente."""
+    valor = _texto(valor)
+    if isinstance(valor, str) and valor.startswith(_INICIO_DE_FORMULA):
+        return "'" + valor
+    return valor
+
+
+async def em_csv(colunas: list[str], linhas: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    """CSV com BOM (o Excel reconhece UTF-8), enviado a cada LINHAS_POR_BLOCO linhas."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write("\ufeff")
+    escritor.writerow(colunas)
+    pendentes = 0
+    async for linha in linhas:
+        escritor.writerow([celula_csv(linha.get(c)) for c in colunas])
+        pendentes += 1
+        if pendentes >= LINHAS_POR_BLOCO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendentes = 0
+    yield buffer.getvalue()
+
+
+async def em_ndjson(linhas: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    """Um objeto JSON por linha."""
+    async for linha in linhas:
+        yield json.dumps(linha, default=_texto, ensure_ascii=False) + "\n"
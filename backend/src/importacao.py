@@ -0,0 +1,109 @@
+"""
+Leitura de planilhas exportadas em CSV para importações em massa. O arquivo é lido
+em lotes de linhas (o upload já fica em disco acima de 1 MB), então a memória usada
+depende do tamanho do lote e não do tamanho do arquivo.
+"""
+import csv
+import io
+import re
+from datetime import date, datetime
+from typing import BinaryIO, Iterator
+
+from src.exportacao import celula_csv
+
+TAMANHO_LOTE = 1000
+MAX_ERROS_REPORTADOS = 1000
+
+
+def ler_csv_em_lotes(arquivo: BinaryIO, tamanho_lote: int = TAMANHO_LOTE) -> Iterator[list[tuple[int, dict[str, str]]]]:
+    """
+    Gera lotes de (número da linha no arquivo, linha) com cabeçalhos normalizados
+    (minúsculas, sem espaços nas bordas). Aceita ',' ou ';' como separador.
+    """
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+    try:
+        cabecalho = texto.readline()
+        separador = ";" if cabecalho.count(";") > cabecalho.count(",") else ","
+        colunas = [c.strip().lower() for c in next(csv.reader([cabecalho], delimiter=separador), [])]
+        leitor = csv.DictReader(texto, fieldnames=colunas, delimiter=separador)
+        lote: list[tuple[int, dict[str, str]]] = []
+        for linha in leitor:
+            valores = {k: (v or "").strip() for k, v in linha.items() if k is not None}
+            if not any(valores.values()):
+                continue  # linha só com separadores
+            lote.append((leitor.line_num + 1, valores))  # +1: o cabeçalho foi lido à parte
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+    finally:
+        texto.detach()
+
+
+def texto_opcional(linha: dict[str, str], coluna: str) -> str | None:
+    return linha.get(coluna) or None
+
+
+def inteiro(valor: str | None, padrao: int | None = None) -> int | None:
+    if not valor:
+        return padrao
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValueError(f"número inteiro inválido: {valor!r}")
+
+
+def decimal(valor: str | None) -> float | None:
+    """Aceita '150.00', '150,00' e '1.500,00' (formato brasileiro)."""
+    if not valor:
+        return None
+    normalizado = valor.replace("R$", "").strip()
+    if "," in normalizado:
+        normalizado = normalizado.replace(".", "").replace(",", ".")
+    try:
+        return float(normalizado)
+    except ValueError:
+        raise ValueError(f"valor numérico inválido: {valor!r}")
+
+
+def data(valor: str | None) -> date | None:
+    """Aceita AAAA-MM-DD e DD/MM/AAAA."""
+    if not valor:
+        return None
+    for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"data inválida: {valor!r} (use AAAA-MM-DD ou DD/MM/AAAA)")
+
+
+def so_digitos(valor: str) -> str:
+    return re.sub(r"\D", "", valor)
+
+
+def escrever_csv(colunas: list[str], linhas: list[dict]) -> str:
+    saida = io.StringIO()
+    escritor = csv.DictWriter(saida, fieldnames=colunas, extrasaction="ignore")
+    escritor.writeheader()
+    escritor.writerows({k: celula_csv(v) for k, v in linha.items()} for linha in linhas)
+    return saida.getvalue()
+
+
+class RelatorioImportacao:
+    """Contadores e erros por linha; guarda no máximo MAX_ERROS_REPORTADOS mensagens."""
+
+    def __init__(self):
+        self.importados = 0
+        self.total_erros = 0
+        self.erros: list[dict] = []
+
+    def erro(self, linha: int, mensagem: str) -> None:
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS_REPORTADOS:
+            self.erros.append({"linha": linha, "erro": mensagem})
+
+    def como_dict(self) -> dict:
+        erros = sorted(self.erros, key=lambda e: e["linha"])  # validação e resolução de alunos rodam em etapas
+        return {"importados": self.importados, "total_erros": self.total_erros, "erros": erros}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Text, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Text, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from src.database import Base
 from datetime import date, datetime
@@ -14,6 +14,7 @@ class Usuario(Base):
     role = Column(String, default="aluno")  # "trainer" ou "aluno"
     is_active = Column(Boolean, default=True)
     data_criacao = Column(DateTime, default=datetime.now)
+    token_epoch = Column(Integer, nullable=False, default=0, server_default="0")  # incrementa para revogar tokens
 
     # Vínculo com o Aluno (opcional para trainers, obrigatório para alunos)
     aluno_id = Column(Integer, ForeignKey('alunos.id', ondelete='SET NULL'), nullable=True)
@@ -50,6 +51,26 @@ class Aluno(Base):
     # Propriedades auxiliares para a View
     aulas_feitas_mes = 0
     status_financeiro = "em_dia"
+    historico = None  # totais e cursores do histórico (preenchido por get_aluno)
+
+    __table_args__ = (
+        # Busca por prefixo no CPF (LIKE 'digitos%'), independente da collation do banco
+        Index("ix_alunos_cpf_prefixo", "cpf", postgresql_ops={"cpf": "text_pattern_ops"}),
+    )
+
+
+class AlunoTermoBusca(Base):
+    """
+    Palavras do nome do aluno em minúsculas, uma por linha: a busca do roster casa o início
+    de qualquer palavra (LIKE 'termo%') pelo índice, sem depender de pg_trgm.
+    """
+    __tablename__ = 'alunos_termos_busca'
+    aluno_id = Column(Integer, ForeignKey('alunos.id', ondelete='CASCADE'), primary_key=True)
+    termo = Column(String, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_alunos_termos_busca_termo", "termo", postgresql_ops={"termo": "text_pattern_ops"}),
+    )
 
 
 class Pagamento(Base):
@@ -62,11 +83,18 @@ class Pagamento(Base):
     valor = Column(Float)
     quantidade_aulas = Column(Integer, default=0)
     referencia_mes = Column(String(7))  # Ex: "01/2026"
+    periodo = Column(Date, nullable=True)  # 1º dia do mês de referência (mesma informação, indexável)
     forma_pagamento = Column(String(50))  # PIX, Dinheiro, Cartão
     observacao = Column(Text, nullable=True)
 
     aluno = relationship("Aluno", back_populates="pagamentos")
 
+    __table_args__ = (
+        Index("ix_pagamentos_aluno_periodo", "aluno_id", "periodo"),
+        Index("ix_pagamentos_periodo", "periodo"),
+        Index("ix_pagamentos_data_pagamento_id", "data_pagamento", "id"),
+    )
+
 
 class SessaoTreino(Base):
     __tablename__ = 'sessoes_treino'
@@ -86,6 +114,10 @@ class SessaoTreino(Base):
     aluno = relationship("Aluno", back_populates="sessoes_treino")
     plano_treino = relationship("PlanoTreino", back_populates="sessoes_executadas")
 
+    __table_args__ = (
+        Index("ix_sessoes_treino_aluno_data_hora", "aluno_id", "data_hora"),
+    )
+
 
 class PlanoTreino(Base):
     __tablename__ = 'planos_treino'
@@ -99,6 +131,7 @@ class PlanoTreino(Base):
     duracao_semanas = Column(Integer, default=4)
     data_inicio = Column(Date, default=date.today)
     esta_ativo = Column(Boolean, default=True)
+    versao = Column(Integer, nullable=False, default=1, server_default="1")  # incrementa a cada alteração na árvore (ETag)
 
     # Relacionamentos
     aluno = relationship("Aluno", back_populates="planos_treino")
@@ -108,11 +141,15 @@ class PlanoTreino(Base):
     )
     sessoes_executadas = relationship("SessaoTreino", back_populates="plano_treino")
 
+    __table_args__ = (
+        Index("ix_planos_treino_aluno_ativo", "aluno_id", "esta_ativo"),
+    )
+
 class Treino(Base):
     """Um grupo de exercícios, ex: 'Treino A - Superiores'"""
     __tablename__ = 'treinos'
     id = Column(Integer, primary_key=True)
-    plano_id = Column(Integer, ForeignKey('planos_treino.id', ondelete='CASCADE'))
+    plano_id = Column(Integer, ForeignKey('planos_treino.id', ondelete='CASCADE'), index=True)
     nome = Column(String) 
     ordem = Column(Integer, default=0)
 
@@ -134,7 +171,7 @@ class Prescricao(Base):
     """A ligação entre um Treino e um Exercício com as cargas/séries"""
     __tablename__ = 'prescricoes'
     id = Column(Integer, primary_key=True)
-    treino_id = Column(Integer, ForeignKey('treinos.id', ondelete='CASCADE'))
+    treino_id = Column(Integer, ForeignKey('treinos.id', ondelete='CASCADE'), index=True)
     exercicio_id = Column(Integer, ForeignKey('exercicios.id'))
     
     ordem = Column(Integer, default=0)
@@ -151,3 +188,23 @@ class Prescricao(Base):
     @property
     def nome_exercicio(self):
         return self.exercicio.nome if self.exercicio else "Exercício Removido"
+
+
+class CacheVersao(Base):
+    """Versão por chave de cache compartilhada entre workers: quem escreve incrementa, quem lê compara."""
+    __tablename__ = 'cache_versoes'
+    chave = Column(String(50), primary_key=True)
+    versao = Column(Integer, nullable=False, default=1, server_default="1")
+
+
+class ResumoFinanceiroMensal(Base):
+    """
+    Agregado mensal de pagamentos por trainer, mantido pelos controllers de pagamento na
+    mesma transação da escrita. trainer_id = 0 agrupa alunos sem trainer.
+    """
+    __tablename__ = 'resumo_financeiro_mensal'
+    trainer_id = Column(Integer, primary_key=True)
+    periodo = Column(Date, primary_key=True)
+    receita = Column(Float, nullable=False, default=0, server_default="0")
+    n_pagamentos = Column(Integer, nullable=False, default=0, server_default="0")
+    n_alunos_pagantes = Column(Integer, nullable=False, default=0, server_default="0")
@@ -0,0 +1,40 @@
+"""
+Cursores opacos para paginação por chave (keyset): o cliente recebe a chave de
+ordenação da última linha e a devolve para pedir a próxima página. Diferente de
+OFFSET, o custo não cresce com a profundidade e inserções novas não deslocam páginas.
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Any
+
+from src import exceptions
+
+
+def codificar_cursor(*valores: Any) -> str:
+    """Serializa a chave (ex: data_hora, id) em base64url, sem padding."""
+    normalizados = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in valores]
+    bruto = json.dumps(normalizados, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(bruto).rstrip(b"=").decode("ascii")
+
+
+def decodificar_cursor(cursor: str, *tipos: type) -> tuple:
+    """Desfaz codificar_cursor, convertendo cada posição para o tipo esperado."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = json.loads(bruto)
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            raise ValueError
+        return tuple(_converter(v, t) for v, t in zip(valores, tipos))
+    except (ValueError, TypeError):
+        raise exceptions.BusinessRuleError("Cursor de paginação inválido")
+
+
+def _converter(valor: Any, tipo: type) -> Any:
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    if tipo is int and (isinstance(valor, bool) or not isinstance(valor, int)):
+        raise ValueError
+    return tipo(valor)
@@ -0,0 +1,15 @@
+import asyncio
+
+from src.database import SessionLocal
+from src.controllers import reconstruir_resumo_financeiro
+
+
+async def reconstruir():
+    """Refaz o resumo financeiro mensal a partir dos pagamentos (uso: python -m src.reconstruir_resumo)."""
+    async with SessionLocal() as db:
+        linhas = await reconstruir_resumo_financeiro(db)
+    print(f"✅ Resumo financeiro reconstruído: {linhas} linhas (trainer × mês).")
+    return linhas
+
+if __name__ == "__main__":
+    asyncio.run(reconstruir())
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from src import controllers, schemas, database
-from src.security import get_current_admin
+from src.security import get_current_admin, servico_senhas
 
 router = APIRouter(
     prefix="/admin",
@@ -40,3 +40,18 @@ async def resetar_senha(
     db: AsyncSession = Depends(database.get_db),
 ):
     return await controllers.resetar_senha_usuario(db, usuario_id, payload.nova_senha)
+
+
+@router.get("/metricas", response_model=schemas.MetricasPublic)
+async def obter_metricas():
+    return schemas.MetricasPublic(
+        senhas=servico_senhas.metricas(),
+        pool=database.estatisticas_pool(),
+    )
+
+
+@router.post("/resumo-financeiro/reconstruir")
+async def reconstruir_resumo_financeiro(db: AsyncSession = Depends(database.get_db)):
+    """Refaz o resumo mensal do dashboard a partir dos pagamentos (corrige desvios)."""
+    linhas = await controllers.reconstruir_resumo_financeiro(db)
+    return {"message": f"Resumo financeiro reconstruído: {linhas} linhas.", "linhas": linhas}
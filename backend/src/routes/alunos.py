@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, File, Query, Response, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 from src import controllers, schemas, database
-from src.schemas import StatusAluno
+from src.importacao import escrever_csv
+from src.schemas import StatusAluno, StatusFinanceiro, TipoPagamento
 from src.models import Usuario
 from src.security import get_current_trainer, resolve_tenant_filter
 
@@ -23,21 +24,71 @@ async def criar_aluno(
     return await controllers.criar_aluno(db=db, aluno_in=aluno, trainer_id=trainer_id)
 
 
+@router.post(
+    "/importar",
+    response_class=Response,
+    responses={200: {"content": {"text/csv": {}}, "description": "Credenciais geradas e erros por linha"}},
+)
+async def importar_alunos(
+    arquivo: UploadFile = File(..., description="CSV (',' ou ';') com as colunas do cadastro de aluno; nome é obrigatório"),
+    trainer_id: int | None = None,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    Cadastro em massa. Devolve um CSV para download com uma linha por aluno do arquivo:
+    credenciais (senha só quando gerada) ou o erro que impediu o cadastro.
+    """
+    # Admin pode escolher o trainer de destino; trainer usa o próprio id
+    destino = trainer_id if (current_user.role == "admin" and trainer_id) else current_user.id
+    relatorio, credenciais = await controllers.importar_alunos(db, arquivo.file, trainer_id=destino)
+    linhas = sorted(credenciais + relatorio["erros"], key=lambda linha: linha["linha"])
+    return Response(
+        content=escrever_csv(["linha", "aluno_id", "nome", "username", "senha", "erro"], linhas),
+        media_type="text/csv",
+        headers={
+            "Content-Disposition": 'attachment; filename="credenciais_alunos.csv"',
+            "Cache-Control": "no-store",  # contém senhas em texto puro
+            "X-Importados": str(relatorio["importados"]),
+            "X-Total-Erros": str(relatorio["total_erros"]),
+        },
+    )
+
+
 @router.get("/", response_model=list[schemas.AlunoResumo])
 async def listar_alunos(
+    response: Response,
     current_user: Usuario = Depends(get_current_trainer),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_db),
+    busca: str | None = Query(default=None, max_length=100, description="Início de palavras do nome ou do CPF"),
+    status: list[StatusAluno] | None = Query(default=None, description="Um ou mais status (repita o parâmetro)"),
+    tipo_pagamento: TipoPagamento | None = None,
+    status_financeiro: StatusFinanceiro | None = None,
+    limit: int | None = Query(default=None, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
 ):
-    return await controllers.listar_alunos_ativos(db=db, trainer_id=resolve_tenant_filter(current_user))
+    """Roster filtrado. Sem `limit` devolve tudo; com `limit`, o total vai no header X-Total-Count."""
+    filtros = dict(busca=busca, status=status, tipo_pagamento=tipo_pagamento, status_financeiro=status_financeiro)
+    trainer_id = resolve_tenant_filter(current_user)
+    if limit is not None:
+        total = await controllers.contar_alunos(db=db, trainer_id=trainer_id, **filtros)
+        response.headers["X-Total-Count"] = str(total)
+    return await controllers.listar_alunos_ativos(
+        db=db, trainer_id=trainer_id, limit=limit, offset=offset, **filtros
+    )
 
 
 @router.get("/{aluno_id}", response_model=schemas.AlunoPublic)
 async def obter_aluno(
     aluno_id: int,
     current_user: Usuario = Depends(get_current_trainer),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_db),
+    include: str | None = Query(default=None, description="Coleções a carregar: planos,sessoes,pagamentos (padrão: todas)"),
 ):
-    return await controllers.get_aluno(db=db, aluno_id=aluno_id, trainer_id=resolve_tenant_filter(current_user))
+    return await controllers.get_aluno(
+        db=db, aluno_id=aluno_id, trainer_id=resolve_tenant_filter(current_user),
+        include=controllers.resolver_include(include),
+    )
 
 
 @router.patch("/{aluno_id}", response_model=schemas.AlunoPublic)
@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from src.database import get_db
 from src.models import Usuario
-from src.security import verify_password, create_access_token
+from src.security import verify_password_async, create_access_token, claims_do_usuario
 from src import schemas
 
 router = APIRouter(prefix="/auth", tags=["Autenticação"])
@@ -18,16 +18,12 @@ async def login_for_access_token(
     result = await db.execute(select(Usuario).where(Usuario.username == form_data.username))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuário ou senha incorretos",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    token_data = {"sub": user.username, "role": user.role}
-    if user.aluno_id:
-        token_data["aluno_id"] = user.aluno_id
-
-    access_token = create_access_token(data=token_data)
+    access_token = create_access_token(data=claims_do_usuario(user))
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from src import controllers, schemas, database
+from src.cache import etag_confere, etag_forte
 from src.seed_exercicios import seed
 from src.security import get_current_trainer
 
@@ -19,9 +20,19 @@ async def seed_exercicios(db: AsyncSession = Depends(database.get_db)):
     count = await seed(db)
     return {"message": f"Biblioteca atualizada com sucesso! {count} exercícios adicionados ou com vídeo preenchido."}
 
-@router.get("/", response_model=list[schemas.ExercicioPublic])
-async def listar_exercicios(db: AsyncSession = Depends(database.get_db)):
-    return await controllers.listar_exercicios(db=db)
+@router.get(
+    "/",
+    response_model=list[schemas.ExercicioPublic],
+    responses={304: {"description": "Biblioteca inalterada desde o ETag informado"}},
+)
+async def listar_exercicios(request: Request, db: AsyncSession = Depends(database.get_db)):
+    """Biblioteca completa, servida do cache do worker enquanto a versão no banco não mudar."""
+    versao = await controllers.versao_cache(db, controllers.CHAVE_EXERCICIOS)
+    cabecalhos = {"ETag": etag_forte("exercicios", versao), "Cache-Control": "private, no-cache"}
+    if etag_confere(request.headers.get("if-none-match"), cabecalhos["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+    corpo = await controllers.exercicios_json(db, versao)
+    return Response(content=corpo, media_type="application/json", headers=cabecalhos)
 
 @router.post("/", response_model=schemas.ExercicioPublic, status_code=status.HTTP_201_CREATED)
 async def criar_exercicio(
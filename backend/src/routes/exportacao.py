@@ -0,0 +1,76 @@
+from datetime import date
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src import controllers
+from src.database import get_db
+from src.exportacao import em_csv, em_ndjson
+from src.models import Usuario
+from src.schemas import StatusAluno, TipoPagamento
+from src.security import get_current_trainer, resolve_tenant_filter
+
+router = APIRouter(
+    prefix="/exportar",
+    tags=["Exportação"],
+    dependencies=[Depends(get_current_trainer)]
+)
+
+Formato = Literal["csv", "ndjson"]
+
+
+def _resposta(nome: str, formato: Formato, colunas: list[str], linhas) -> StreamingResponse:
+    """Transmite as linhas enquanto o cursor do banco avança (a sessão fica aberta até o fim)."""
+    if formato == "ndjson":
+        return StreamingResponse(em_ndjson(linhas), media_type="application/x-ndjson")
+    return StreamingResponse(
+        em_csv(colunas, linhas),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{nome}.csv"'},
+    )
+
+
+@router.get("/sessoes")
+async def exportar_sessoes(
+    formato: Formato = "csv",
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db),
+):
+    linhas = controllers.stream_sessoes(
+        db, trainer_id=resolve_tenant_filter(current_user), aluno_id=aluno_id, de=de, ate=ate
+    )
+    return _resposta("sessoes", formato, controllers.COLUNAS_EXPORTACAO_SESSOES, linhas)
+
+
+@router.get("/pagamentos")
+async def exportar_pagamentos(
+    formato: Formato = "csv",
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db),
+):
+    linhas = controllers.stream_pagamentos(
+        db, trainer_id=resolve_tenant_filter(current_user), aluno_id=aluno_id, de=de, ate=ate
+    )
+    return _resposta("pagamentos", formato, controllers.COLUNAS_EXPORTACAO_PAGAMENTOS, linhas)
+
+
+@router.get("/alunos")
+async def exportar_alunos(
+    formato: Formato = "csv",
+    status: list[StatusAluno] | None = Query(default=None),
+    tipo_pagamento: TipoPagamento | None = None,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db),
+):
+    linhas = controllers.stream_alunos(
+        db, trainer_id=resolve_tenant_filter(current_user), status=status, tipo_pagamento=tipo_pagamento
+    )
+    return _resposta("alunos", formato, controllers.COLUNAS_EXPORTACAO_ALUNOS, linhas)
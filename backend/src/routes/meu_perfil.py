@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src import controllers, schemas, database
+from src.cache import etag_confere, etag_forte
 from src.models import Usuario
 from src.security import get_current_user
 
@@ -12,10 +13,41 @@ router = APIRouter(tags=["Meu Perfil"])
 async def meu_perfil(
     current_user: Usuario = Depends(get_current_user),
     db: AsyncSession = Depends(database.get_db),
+    include: str | None = Query(default=None, description="Coleções a carregar: planos,sessoes,pagamentos (padrão: todas)"),
 ):
     if not current_user.aluno_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Usuário não vinculado a um aluno.",
         )
-    return await controllers.get_aluno(db, current_user.aluno_id)
+    return await controllers.get_aluno(db, current_user.aluno_id, include=controllers.resolver_include(include))
+
+
+@router.get(
+    "/alunos/me/plano-ativo",
+    response_model=schemas.PlanoTreinoPublic,
+    responses={304: {"description": "Plano inalterado desde o ETag informado"}},
+)
+async def meu_plano_ativo(
+    request: Request,
+    response: Response,
+    current_user: Usuario = Depends(get_current_user),
+    db: AsyncSession = Depends(database.get_db),
+):
+    """Só a árvore do plano ativo, com ETag: If-None-Match igual responde 304 sem montar o plano."""
+    if not current_user.aluno_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Usuário não vinculado a um aluno.",
+        )
+    # Navegador/app revalida a cada abertura; o 304 custa uma única consulta indexada
+    cabecalhos = {"Cache-Control": "private, no-cache"}
+
+    plano_id, versao, versao_exercicios = await controllers.versao_plano_ativo(db, current_user.aluno_id)
+    etag = etag_forte("plano", plano_id, versao, versao_exercicios)
+    if etag_confere(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, **cabecalhos})
+
+    plano = await controllers.get_plano_ativo(db, current_user.aluno_id)
+    response.headers.update({"ETag": etag_forte("plano", plano.id, plano.versao, versao_exercicios), **cabecalhos})
+    return plano
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, status
+from datetime import date
+
+from fastapi import APIRouter, Depends, File, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database import get_db
 from src import controllers
-from src.schemas import PagamentoCreate, PagamentoPublic, EstatisticasFinanceirasPublic
+from src.schemas import (
+    PagamentoCreate, PagamentoPublic, PaginaPagamentosPublic, EstatisticasFinanceirasPublic, ImportacaoPublic,
+)
 from src.models import Usuario
 from src.security import get_current_trainer, resolve_tenant_filter
 
@@ -16,9 +21,51 @@ router = APIRouter(
 @router.get("/", response_model=list[PagamentoPublic])
 async def listar_pagamentos(
     current_user: Usuario = Depends(get_current_trainer),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+):
+    return await controllers.listar_pagamentos(
+        db, trainer_id=resolve_tenant_filter(current_user), aluno_id=aluno_id, de=de, ate=ate
+    )
+
+
+@router.get("/pagina", response_model=PaginaPagamentosPublic)
+async def paginar_pagamentos(
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db),
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    limit: int = Query(default=100, ge=1, le=500),
+    cursor: str | None = None,
+):
+    """Pagamentos paginados por cursor: envie o next_cursor recebido para obter a próxima página."""
+    return await controllers.paginar_pagamentos(
+        db, trainer_id=resolve_tenant_filter(current_user), aluno_id=aluno_id, de=de, ate=ate,
+        limit=limit, cursor=cursor,
+    )
+
+
+@router.get("/stream")
+async def stream_pagamentos(
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db),
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
 ):
-    return await controllers.listar_pagamentos(db, trainer_id=resolve_tenant_filter(current_user))
+    """Todos os pagamentos filtrados em NDJSON (um PagamentoPublic por linha), sem montar a lista inteira."""
+    linhas = controllers.stream_pagamentos(
+        db, trainer_id=resolve_tenant_filter(current_user), aluno_id=aluno_id, de=de, ate=ate
+    )
+
+    async def _ndjson():
+        async for pagamento in linhas:
+            yield PagamentoPublic.model_validate(pagamento).model_dump_json() + "\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
 
 
 @router.get("/estatisticas", response_model=EstatisticasFinanceirasPublic)
@@ -38,6 +85,19 @@ async def criar_pagamento(
     return await controllers.registrar_pagamento(db, dados, trainer_id=resolve_tenant_filter(current_user))
 
 
+@router.post("/importar", response_model=ImportacaoPublic)
+async def importar_pagamentos(
+    arquivo: UploadFile = File(..., description="CSV (',' ou ';') com aluno_id, cpf ou email, valor, referencia_mes, forma_pagamento"),
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Importa histórico de pagamentos de uma planilha. Colunas opcionais: quantidade_aulas,
+    data_pagamento (AAAA-MM-DD ou DD/MM/AAAA) e observacao. Linhas com erro são listadas no relatório.
+    """
+    return await controllers.importar_pagamentos(db, arquivo.file, trainer_id=resolve_tenant_filter(current_user))
+
+
 @router.get("/{pagamento_id}", response_model=PagamentoPublic)
 async def buscar_pagamento(
     pagamento_id: int,
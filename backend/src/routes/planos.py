@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src import schemas, controllers
+from src.cache import etag_confere, etag_forte
 from src.database import get_db
 from src.models import Usuario
 from src.security import get_current_trainer, resolve_tenant_filter
@@ -25,9 +26,19 @@ async def criar_plano_para_aluno(
     )
 
 
-@router.get("/planos/templates", response_model=list[schemas.PlanoTreinoPublic])
-async def listar_templates(db: AsyncSession = Depends(get_db)):
-    return await controllers.listar_templates_globais(db=db)
+@router.get(
+    "/planos/templates",
+    response_model=list[schemas.PlanoTreinoPublic],
+    responses={304: {"description": "Templates inalterados desde o ETag informado"}},
+)
+async def listar_templates(request: Request, db: AsyncSession = Depends(get_db)):
+    """Templates globais servidos já serializados, sem percorrer o ORM enquanto nada mudar."""
+    versao = await controllers.versao_templates(db)
+    cabecalhos = {"ETag": etag_forte("templates", *versao), "Cache-Control": "private, no-cache"}
+    if etag_confere(request.headers.get("if-none-match"), cabecalhos["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+    corpo = await controllers.templates_json(db, versao)
+    return Response(content=corpo, media_type="application/json", headers=cabecalhos)
 
 
 @router.post("/planos/templates", response_model=schemas.PlanoTreinoPublic, status_code=status.HTTP_201_CREATED)
@@ -38,6 +49,15 @@ async def criar_template_global(
     return await controllers.criar_plano_treino(db=db, aluno_id=None, plano_in=plano_in)
 
 
+@router.get("/planos/{plano_id}", response_model=schemas.PlanoTreinoPublic)
+async def obter_plano(
+    plano_id: int,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db)
+):
+    return await controllers.get_plano_treino(db=db, plano_id=plano_id, trainer_id=resolve_tenant_filter(current_user))
+
+
 @router.delete("/planos/{plano_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def deletar_plano(
     plano_id: int,
@@ -63,6 +83,32 @@ async def clonar_plano(
     )
 
 
+@router.post("/planos/{plano_id}/clonar-lote", response_model=list[schemas.PlanoClonadoPublic], status_code=status.HTTP_201_CREATED)
+async def clonar_plano_em_lote(
+    plano_id: int,
+    payload: schemas.ClonagemLoteCreate,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db)
+):
+    return await controllers.clonar_plano_para_alunos(
+        db=db, plano_origem_id=plano_id, aluno_ids=payload.aluno_ids,
+        trainer_id=resolve_tenant_filter(current_user)
+    )
+
+
+@router.post("/planos/{plano_id}/operacoes", response_model=schemas.PlanoTreinoPublic)
+async def aplicar_operacoes(
+    plano_id: int,
+    payload: schemas.OperacoesPlanoRequest,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db)
+):
+    return await controllers.aplicar_operacoes_plano(
+        db=db, plano_id=plano_id, dados=payload,
+        trainer_id=resolve_tenant_filter(current_user)
+    )
+
+
 @router.patch("/planos/{plano_id}", response_model=schemas.PlanoTreinoPublic)
 async def atualizar_plano(
     plano_id: int,
@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src import schemas, controllers
 from src.database import get_db
 from src.models import Usuario
-from src.security import get_current_user
+from src.security import get_current_user, get_current_trainer, resolve_tenant_filter
 
 router = APIRouter(tags=["Prescrições"])
 
@@ -27,3 +27,27 @@ async def atualizar_carga(
         nova_carga=carga_in.carga or None,
         aluno_id=current_user.aluno_id,
     )
+
+
+@router.patch("/prescricoes/{prescricao_id}", response_model=schemas.PrescricaoPublic)
+async def atualizar_prescricao(
+    prescricao_id: int,
+    payload: schemas.PrescricaoParcial,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db),
+):
+    return await controllers.atualizar_prescricao(
+        db=db, prescricao_id=prescricao_id, payload=payload,
+        trainer_id=resolve_tenant_filter(current_user),
+    )
+
+
+@router.delete("/prescricoes/{prescricao_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def deletar_prescricao(
+    prescricao_id: int,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db),
+):
+    await controllers.deletar_prescricao(
+        db=db, prescricao_id=prescricao_id, trainer_id=resolve_tenant_filter(current_user)
+    )
@@ -34,6 +34,27 @@ async def criar_sessao(
     return await controllers.registrar_sessao(db, payload, trainer_id=trainer_id, registrado_por_staff=is_staff)
 
 
+@router.post("/lote", response_model=list[schemas.SessaoTreinoPublic], status_code=201)
+async def criar_sessoes_em_lote(
+    payload: schemas.CheckinLoteCreate,
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db),
+):
+    """Check-in de turma: uma sessão por aluno; o campo aviso sinaliza pacote sem saldo."""
+    return await controllers.registrar_sessoes_em_lote(db, payload, trainer_id=resolve_tenant_filter(current_user))
+
+
+def _escopo_listagem(current_user: Usuario, aluno_id: int | None) -> tuple[int | None, int | None]:
+    """Resolve (aluno_id, trainer_id) da listagem: alunos só veem suas próprias sessões."""
+    if current_user.role not in ("trainer", "admin"):
+        if not current_user.aluno_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuário não vinculado a um aluno.")
+        if aluno_id is not None and aluno_id != current_user.aluno_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado.")
+        return current_user.aluno_id, None
+    return aluno_id, resolve_tenant_filter(current_user)
+
+
 @router.get("/", response_model=list[schemas.SessaoTreinoPublic])
 async def listar_sessoes(
     db: AsyncSession = Depends(get_db),
@@ -45,15 +66,7 @@ async def listar_sessoes(
     limit: int = Query(default=100, ge=1, le=500),
     offset: int = Query(default=0, ge=0),
 ):
-    # Alunos só veem suas próprias sessões
-    if current_user.role not in ("trainer", "admin"):
-        if not current_user.aluno_id:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuário não vinculado a um aluno.")
-        if aluno_id is not None and aluno_id != current_user.aluno_id:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado.")
-        aluno_id = current_user.aluno_id
-
-    trainer_id = resolve_tenant_filter(current_user) if current_user.role in ("trainer", "admin") else None
+    aluno_id, trainer_id = _escopo_listagem(current_user, aluno_id)
     return await controllers.listar_sessoes(
         db=db,
         aluno_id=aluno_id,
@@ -66,6 +79,54 @@ async def listar_sessoes(
     )
 
 
+@router.get("/pagina", response_model=schemas.PaginaSessoesPublic)
+async def paginar_sessoes(
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user),
+    aluno_id: int | None = None,
+    de: date | None = None,
+    ate: date | None = None,
+    realizada: bool | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: str | None = None,
+):
+    """Histórico paginado por cursor: envie o next_cursor recebido para obter a próxima página."""
+    aluno_id, trainer_id = _escopo_listagem(current_user, aluno_id)
+    return await controllers.paginar_sessoes(
+        db=db,
+        aluno_id=aluno_id,
+        trainer_id=trainer_id,
+        de=de,
+        ate=ate,
+        realizada=realizada,
+        limit=limit,
+        cursor=cursor,
+    )
+
+
+def _referencia_ou_mes_atual(referencia_mes: str | None) -> str:
+    if referencia_mes is None:
+        agora = datetime.now()
+        referencia_mes = f"{agora.month:02d}/{agora.year}"
+    return referencia_mes
+
+
+@router.get("/frequencia", response_model=list[schemas.FrequenciaMensalPublic])
+async def frequencia_mensal_lote(
+    referencia_mes: str | None = None,
+    aluno_ids: list[int] | None = Query(default=None, max_length=500, description="Padrão: todos os alunos do trainer"),
+    current_user: Usuario = Depends(get_current_trainer),
+    db: AsyncSession = Depends(get_db),
+):
+    """Frequência do mês para o roster inteiro numa só chamada (em vez de uma por aluno)."""
+    return await controllers.calcular_frequencia_mensal_lote(
+        db,
+        referencia_mes=_referencia_ou_mes_atual(referencia_mes),
+        trainer_id=resolve_tenant_filter(current_user),
+        aluno_ids=aluno_ids,
+    )
+
+
 @router.get("/frequencia/{aluno_id}", response_model=schemas.FrequenciaMensalPublic)
 async def frequencia_mensal(
     aluno_id: int,
@@ -74,12 +135,25 @@ async def frequencia_mensal(
     db: AsyncSession = Depends(get_db),
 ):
     _validar_acesso_aluno(current_user, aluno_id)
-    if referencia_mes is None:
-        agora = datetime.now()
-        referencia_mes = f"{agora.month:02d}/{agora.year}"
     trainer_id = resolve_tenant_filter(current_user) if current_user.role in ("trainer", "admin") else None
     return await controllers.calcular_frequencia_mensal(
-        db, aluno_id=aluno_id, referencia_mes=referencia_mes, trainer_id=trainer_id
+        db, aluno_id=aluno_id, referencia_mes=_referencia_ou_mes_atual(referencia_mes), trainer_id=trainer_id
+    )
+
+
+@router.get("/frequencia/{aluno_id}/serie", response_model=list[schemas.FrequenciaMensalPublic])
+async def serie_frequencia(
+    aluno_id: int,
+    meses: int = Query(default=12, ge=6, le=24),
+    ate: str | None = Query(default=None, description="Último mês da série (MM/YYYY); padrão: mês atual"),
+    current_user: Usuario = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Tendência de adesão mês a mês, do mais antigo ao mais recente."""
+    _validar_acesso_aluno(current_user, aluno_id)
+    trainer_id = resolve_tenant_filter(current_user) if current_user.role in ("trainer", "admin") else None
+    return await controllers.calcular_serie_frequencia(
+        db, aluno_id=aluno_id, ate_referencia=_referencia_ou_mes_atual(ate), meses=meses, trainer_id=trainer_id
     )
 
 
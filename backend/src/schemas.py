@@ -1,9 +1,10 @@
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from datetime import date, datetime
-from typing import Optional, List, Literal
+from typing import Annotated, Optional, List, Literal, Union
 
 StatusAluno = Literal["ativo", "suspenso", "cancelado"]
 TipoPagamento = Literal["mensal", "pacote"]
+StatusFinanceiro = Literal["em_dia", "atrasado"]
 
 # --- SCHEMAS DE AUTENTICAÇÃO ---
 class Token(BaseModel):
@@ -12,6 +13,10 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    usuario_id: Optional[int] = None
+    role: Optional[str] = None
+    aluno_id: Optional[int] = None
+    token_epoch: Optional[int] = None
 
 # --- SCHEMAS DE EXERCÍCIO ---
 class ExercicioBase(BaseModel):
@@ -90,6 +95,8 @@ class PlanoTreinoUpdate(BaseModel):
     detalhes: Optional[str] = None
     duracao_semanas: Optional[int] = None
     treinos: Optional[List[TreinoUpdate]] = None
+    # Versão lida pelo editor: se vier e o plano já tiver mudado, a edição é recusada (409)
+    versao: Optional[int] = None
 
 class PlanoTreinoPublic(BaseModel):
     id: int
@@ -100,9 +107,88 @@ class PlanoTreinoPublic(BaseModel):
     duracao_semanas: Optional[int] = 4
     data_inicio: date
     esta_ativo: bool
+    versao: int = 1
     treinos: List[TreinoPublic]
     model_config = ConfigDict(from_attributes=True)
 
+# --- OPERAÇÕES GRANULARES NO PLANO ---
+class PrescricaoParcial(BaseModel):
+    """Edição granular: só os campos enviados são alterados."""
+    exercicio_id: Optional[int] = None
+    series: Optional[int] = None
+    repeticoes: Optional[str] = None
+    carga: Optional[str] = None
+    descanso: Optional[int] = None
+    metodo: Optional[str] = None
+    observacoes: Optional[str] = None
+
+    @field_validator("exercicio_id", "series", "repeticoes", "descanso", "metodo")
+    @classmethod
+    def _nao_nulo(cls, valor):
+        # Omitir o campo mantém o valor atual; null só é aceito em carga e observacoes
+        if valor is None:
+            raise ValueError("não pode ser nulo")
+        return valor
+
+class OpAdicionarTreino(BaseModel):
+    op: Literal["adicionar_treino"]
+    nome: str
+    posicao: Optional[int] = Field(None, ge=0)  # sem posição: vai para o fim
+    prescricoes: List[PrescricaoCreate] = []
+
+class OpAtualizarTreino(BaseModel):
+    op: Literal["atualizar_treino"]
+    treino_id: int
+    nome: str
+
+class OpRemoverTreino(BaseModel):
+    op: Literal["remover_treino"]
+    treino_id: int
+
+class OpReordenarTreinos(BaseModel):
+    op: Literal["reordenar_treinos"]
+    treino_ids: List[int]
+
+class OpAdicionarPrescricao(BaseModel):
+    op: Literal["adicionar_prescricao"]
+    treino_id: int
+    posicao: Optional[int] = Field(None, ge=0)
+    prescricao: PrescricaoCreate
+
+class OpAtualizarPrescricao(PrescricaoParcial):
+    op: Literal["atualizar_prescricao"]
+    prescricao_id: int
+
+class OpRemoverPrescricao(BaseModel):
+    op: Literal["remover_prescricao"]
+    prescricao_id: int
+
+class OpReordenarPrescricoes(BaseModel):
+    op: Literal["reordenar_prescricoes"]
+    treino_id: int
+    prescricao_ids: List[int]
+
+OperacaoPlano = Annotated[
+    Union[
+        OpAdicionarTreino, OpAtualizarTreino, OpRemoverTreino, OpReordenarTreinos,
+        OpAdicionarPrescricao, OpAtualizarPrescricao, OpRemoverPrescricao, OpReordenarPrescricoes,
+    ],
+    Field(discriminator="op"),
+]
+
+class OperacoesPlanoRequest(BaseModel):
+    """Lote de operações aplicado em ordem, numa transação; `versao` como em PlanoTreinoUpdate."""
+    versao: Optional[int] = None
+    operacoes: List[OperacaoPlano] = Field(min_length=1, max_length=200)
+
+class ClonagemLoteCreate(BaseModel):
+    """Aplica o mesmo plano (normalmente um template) a vários alunos."""
+    aluno_ids: List[int] = Field(min_length=1, max_length=100)
+
+class PlanoClonadoPublic(BaseModel):
+    aluno_id: int
+    plano_id: int
+
 # --- SCHEMAS DE PAGAMENTO ---
 class PagamentoCreate(BaseModel):
     aluno_id: int
@@ -119,6 +205,19 @@ class PagamentoPublic(PagamentoCreate):
     aluno_nome: Optional[str] = None
     model_config = ConfigDict(from_attributes=True)
 
+class ErroImportacaoPublic(BaseModel):
+    linha: int  # número da linha no arquivo (cabeçalho = 1)
+    erro: str
+
+class ImportacaoPublic(BaseModel):
+    importados: int
+    total_erros: int
+    erros: List[ErroImportacaoPublic]  # limitado às primeiras 1000 linhas com erro
+
+class PaginaPagamentosPublic(BaseModel):
+    items: List[PagamentoPublic]
+    next_cursor: Optional[str] = None
+
 # --- SCHEMAS DE ESTATÍSTICAS FINANCEIRAS ---
 class ReceitaMensal(BaseModel):
     referencia_mes: str
@@ -150,6 +249,16 @@ class SessaoTreinoPublic(SessaoTreinoCreate):
     aviso: Optional[str] = None  # ex: pacote sem saldo no check-in
     model_config = ConfigDict(from_attributes=True)
 
+class CheckinLoteCreate(BaseModel):
+    """Check-in de turma: mesma data/hora e atividade para todos os alunos."""
+    aluno_ids: List[int] = Field(min_length=1, max_length=100)
+    data_hora: datetime = Field(default_factory=datetime.now)
+    tipo_atividade: Optional[str] = None
+
+class PaginaSessoesPublic(BaseModel):
+    items: List[SessaoTreinoPublic]
+    next_cursor: Optional[str] = None
+
 class FrequenciaMensalPublic(BaseModel):
     aluno_id: int
     referencia_mes: str
@@ -199,6 +308,32 @@ class UsuarioAdminPublic(BaseModel):
     aluno_id: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
+class MetricasSenhasPublic(BaseModel):
+    max_workers: int
+    max_fila: int
+    na_fila: int
+    em_execucao: int
+    concluidas: int
+    rejeitadas: int
+    espera_media_ms: float
+    espera_max_ms: float
+
+class MetricasPoolPublic(BaseModel):
+    tamanho: int
+    max_overflow: int
+    em_uso: int
+    ociosas: int
+    overflow: int
+    aguardando: int
+    checkouts: int
+    timeouts: int
+    espera_media_ms: float
+    espera_max_ms: float
+
+class MetricasPublic(BaseModel):
+    senhas: MetricasSenhasPublic
+    pool: MetricasPoolPublic
+
 class VerificarSenhaRequest(BaseModel):
     senha: str
 
@@ -243,6 +378,16 @@ class AlunoResumo(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class HistoricoAlunoPublic(BaseModel):
+    """Totais do histórico e onde continuar além das janelas embutidas no detalhe."""
+    total_sessoes: int
+    total_pagamentos: int
+    total_planos: int
+    sessoes_next_cursor: Optional[str] = None
+    pagamentos_next_cursor: Optional[str] = None
+    sessoes_url: str
+    pagamentos_url: str
+
 class AlunoPublic(BaseModel):
     id: int
     nome: str
@@ -264,6 +409,7 @@ class AlunoPublic(BaseModel):
     planos_treino: List[PlanoTreinoPublic] = []
     pagamentos: List[PagamentoPublic] = []
     sessoes: List[SessaoTreinoPublic] = Field(default=[], validation_alias="sessoes_treino")
+    historico: Optional[HistoricoAlunoPublic] = None
     usuario: Optional[UsuarioPublic] = None
 
     model_config = ConfigDict(from_attributes=True)
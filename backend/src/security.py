@@ -1,4 +1,5 @@
-import bcrypt
+import asyncio
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Union
 import jwt
@@ -7,26 +8,112 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from src.cache import TTLCache
+from src.senhas import PoolDeHashes, ServicoSenhas, gerar_hash, verificar_hash
 from src.database import get_db
 from src.models import Usuario
 from src.schemas import TokenData
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifica se a senha em texto puro corresponde ao hash."""
-    try:
-        return bcrypt.checkpw(
-            plain_password.encode("utf-8"), 
-            hashed_password.encode("utf-8")
+# Snapshot das colunas do usuário autenticado, indexado pelo "sub" do token.
+# Guardamos apenas valores simples (nunca a instância ORM, presa à sessão que a carregou).
+_PRINCIPAL_CAMPOS = ("id", "username", "email", "role", "is_active", "aluno_id", "data_criacao", "token_epoch")
+_principal_cache = TTLCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+class _TabelaEpocas:
+    """
+    Cópia em memória de usuarios.token_epoch (id -> época), recarregada a cada intervalo.
+    Usada no modo AUTH_STATELESS_CLAIMS para revogar tokens sem consultar o banco por requisição.
+    Uma única recarga por intervalo: quem chega durante ela segue com a tabela anterior.
+    """
+
+    def __init__(self, intervalo_segundos: float):
+        self.intervalo_segundos = intervalo_segundos
+        self._epocas: dict[int, int] = {}
+        self._carregada_em = float("-inf")
+        self._recarga = asyncio.Lock()
+
+    def _vencida(self) -> bool:
+        return time.monotonic() - self._carregada_em > self.intervalo_segundos
+
+    async def epoca(self, db: AsyncSession, usuario_id: int) -> int | None:
+        if self._vencida():
+            # Sem tabela anterior (primeira carga) não há o que servir: espera quem está carregando
+            if self._recarga.locked() and self._carregada_em != float("-inf"):
+                return self._epocas.get(usuario_id)
+            async with self._recarga:
+                if self._vencida():
+                    await self.recarregar(db)
+        return self._epocas.get(usuario_id)
+
+    async def recarregar(self, db: AsyncSession) -> None:
+        result = await db.execute(
+            select(Usuario.id, Usuario.token_epoch).where(Usuario.is_active.is_not(False))
         )
-    except Exception:
-        return False
+        self._epocas = {usuario_id: epoca or 0 for usuario_id, epoca in result.all()}
+        self._carregada_em = time.monotonic()
+
+    def registrar(self, usuario_id: int, epoca: int | None) -> None:
+        self._epocas[usuario_id] = epoca or 0
+
+    def remover(self, usuario_id: int) -> None:
+        self._epocas.pop(usuario_id, None)
+
+    def limpar(self) -> None:
+        self._epocas = {}
+        self._carregada_em = float("-inf")
+        self._recarga = asyncio.Lock()
+
+
+_tabela_epocas = _TabelaEpocas(intervalo_segundos=settings.AUTH_EPOCH_REFRESH_SECONDS)
+
+
+def revogar_tokens(usuario: Usuario) -> None:
+    """Incrementa a época do usuário: tokens emitidos antes deixam de valer após o commit."""
+    usuario.token_epoch = (usuario.token_epoch or 0) + 1
+
+
+def invalidar_principal(usuario: Usuario | None, removido: bool = False) -> None:
+    """
+    Propaga, após o commit, uma mudança no usuário (senha, papel, vínculo ou exclusão)
+    para o cache de autenticação e para a tabela de épocas deste processo.
+    """
+    if usuario is None:
+        return
+    _principal_cache.invalidate(usuario.username)
+    if removido:
+        _tabela_epocas.remover(usuario.id)
+    else:
+        _tabela_epocas.registrar(usuario.id, usuario.token_epoch)
+
+servico_senhas = ServicoSenhas(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_fila=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+pool_hashes_importacao = PoolDeHashes(processos=settings.IMPORT_HASH_PROCESSES)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verifica se a senha em texto puro corresponde ao hash (bloqueante: use fora de handlers async)."""
+    return verificar_hash(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Gera um hash bcrypt a partir de uma senha em texto puro."""
-    pwd_bytes = password.encode("utf-8")
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(pwd_bytes, salt)
-    return hashed.decode("utf-8")
+    """Gera um hash bcrypt a partir de uma senha em texto puro (bloqueante: use fora de handlers async)."""
+    return gerar_hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Versão para handlers async: roda no pool do bcrypt sem bloquear o event loop."""
+    return await servico_senhas.verificar(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Versão para handlers async: roda no pool do bcrypt sem bloquear o event loop."""
+    return await servico_senhas.gerar_hash(password)
+
+async def get_password_hashes_em_lote(passwords: list[str]) -> list[str]:
+    """Hashes para importações em massa, em processos dedicados (IMPORT_HASH_PROCESSES)."""
+    return await pool_hashes_importacao.gerar(passwords)
 
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None) -> str:
     to_encode = data.copy()
@@ -43,6 +130,18 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
     )
     return encoded_jwt
 
+def claims_do_usuario(user: Usuario) -> dict:
+    """Claims assinadas no token de acesso: bastam para autorizar no modo AUTH_STATELESS_CLAIMS."""
+    claims = {
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role,
+        "epoch": user.token_epoch or 0,
+    }
+    if user.aluno_id:
+        claims["aluno_id"] = user.aluno_id
+    return claims
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 async def get_current_user(
@@ -59,16 +158,53 @@ async def get_current_user(
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(
+            username=username,
+            usuario_id=payload.get("uid"),
+            role=payload.get("role"),
+            aluno_id=payload.get("aluno_id"),
+            token_epoch=payload.get("epoch"),
+        )
     except jwt.PyJWTError:
         raise credentials_exception
-    
-    result = await db.execute(select(Usuario).where(Usuario.username == token_data.username))
-    user = result.scalar_one_or_none()
-    
-    if user is None:
+
+    # Caminho rápido: autoriza só pelas claims; o banco só é tocado ao recarregar a tabela de épocas
+    if (
+        settings.AUTH_STATELESS_CLAIMS
+        and token_data.usuario_id is not None
+        and token_data.role is not None
+        and token_data.token_epoch is not None
+    ):
+        epoca_atual = await _tabela_epocas.epoca(db, token_data.usuario_id)
+        if epoca_atual is not None:
+            if epoca_atual != token_data.token_epoch:
+                raise credentials_exception
+            return Usuario(
+                id=token_data.usuario_id,
+                username=token_data.username,
+                role=token_data.role,
+                aluno_id=token_data.aluno_id,
+                is_active=True,
+                token_epoch=epoca_atual,
+            )
+        # Usuário fora da tabela (recém-criado ou removido): segue pelo caminho com banco
+
+    snapshot = _principal_cache.get(token_data.username)
+    if snapshot is not None:
+        user = Usuario(**snapshot)
+    else:
+        result = await db.execute(select(Usuario).where(Usuario.username == token_data.username))
+        user = result.scalar_one_or_none()
+
+        if user is None:
+            raise credentials_exception
+
+        _principal_cache.set(user.username, {campo: getattr(user, campo) for campo in _PRINCIPAL_CAMPOS})
+
+    # Tokens antigos (sem "epoch") continuam válidos; os demais caem quando a época avança
+    if token_data.token_epoch is not None and token_data.token_epoch != (user.token_epoch or 0):
         raise credentials_exception
-        
+
     return user
 
 async def get_current_trainer(
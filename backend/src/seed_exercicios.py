@@ -3,6 +3,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database import SessionLocal
 from src.models import Exercicio
+from src.controllers import CHAVE_EXERCICIOS, incrementar_versao_cache
 
 exercicios_base = [
     # PEITO
@@ -96,6 +97,8 @@ async def _run_seed(db: AsyncSession):
             existente.video_url = ex_data["video_url"]
             videos_atualizados += 1
 
+    if novos or videos_atualizados:
+        await incrementar_versao_cache(db, CHAVE_EXERCICIOS)
     await db.commit()
     print(f"✅ Sucesso! {novos} novos exercícios adicionados, {videos_atualizados} vídeos preenchidos.")
     return novos + videos_atualizados
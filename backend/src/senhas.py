@@ -0,0 +1,156 @@
+"""
+Hash e verificação de senhas (bcrypt) fora do event loop, num pool de threads limitado.
+O bcrypt libera o GIL, então as threads rodam em paralelo; a fila tem teto para que um
+pico de logins falhe rápido (503) em vez de acumular latência para o resto da API.
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+import bcrypt
+
+from src import exceptions
+
+
+def gerar_hash(senha: str) -> str:
+    """Gera um hash bcrypt a partir de uma senha em texto puro (bloqueante)."""
+    return bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+def verificar_hash(senha: str, hashed: str) -> bool:
+    """Verifica se a senha em texto puro corresponde ao hash (bloqueante)."""
+    try:
+        return bcrypt.checkpw(senha.encode("utf-8"), hashed.encode("utf-8"))
+    except Exception:
+        return False
+
+
+def _gerar_hashes(senhas: list[str]) -> list[str]:
+    """Executado nos processos filhos (precisa ser função de módulo para ser serializável)."""
+    return [gerar_hash(senha) for senha in senhas]
+
+
+class PoolDeHashes:
+    """
+    Pool de processos para hashes em lote (importações), criado no primeiro uso e reaproveitado
+    entre lotes: não disputa as threads do ServicoSenhas com os logins e não paga a criação
+    dos processos a cada lote. Usa "spawn" porque fork com threads ativas (event loop, pool
+    do bcrypt) pode travar o filho.
+    """
+
+    def __init__(self, processos: int):
+        self.processos = max(1, processos)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    async def gerar(self, senhas: list[str]) -> list[str]:
+        if not senhas:
+            return []
+        tamanho = -(-len(senhas) // min(self.processos, len(senhas)))
+        partes = [senhas[i:i + tamanho] for i in range(0, len(senhas), tamanho)]
+        executor = self._obter_executor()
+        loop = asyncio.get_running_loop()
+        try:
+            resultados = await asyncio.gather(*(loop.run_in_executor(executor, _gerar_hashes, parte) for parte in partes))
+        except BrokenProcessPool:
+            # Um filho morreu (ex: OOM): descarta o pool para o próximo lote criar outro
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+        return [hashed for parte in resultados for hashed in parte]
+
+    def encerrar(self) -> None:
+        """Bloqueante (espera os filhos): no shutdown da aplicação, chamar fora do event loop."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+class ServicoSenhas:
+    """Executor limitado para bcrypt, com métricas de fila e de tempo de espera."""
+
+    def __init__(self, max_workers: int, max_fila: int):
+        self.max_workers = max_workers
+        self.max_fila = max_fila
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._na_fila = 0
+        self._em_execucao = 0
+        self._concluidas = 0
+        self._rejeitadas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    async def gerar_hash(self, senha: str) -> str:
+        return await self._executar(gerar_hash, senha)
+
+    async def verificar(self, senha: str, hashed: str) -> bool:
+        return await self._executar(verificar_hash, senha, hashed)
+
+    async def _executar(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._na_fila >= self.max_fila:
+                self._rejeitadas += 1
+                raise exceptions.ServiceUnavailableError(
+                    "Servidor ocupado processando autenticações. Tente novamente em instantes."
+                )
+            self._na_fila += 1
+        enfileirada_em = time.perf_counter()
+        # Quem sai da fila primeiro (worker ao iniciar ou o await cancelado) desconta _na_fila
+        estado = {"iniciada": False, "abandonada": False}
+
+        def _tarefa():
+            espera = time.perf_counter() - enfileirada_em
+            with self._lock:
+                if estado["abandonada"]:
+                    return None
+                estado["iniciada"] = True
+                self._na_fila -= 1
+                self._em_execucao += 1
+                self._espera_total += espera
+                self._espera_max = max(self._espera_max, espera)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._em_execucao -= 1
+                    self._concluidas += 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, _tarefa)
+        finally:
+            # Cancelado antes de o worker pegar a tarefa (ex: cliente desconectou no login)
+            with self._lock:
+                if not estado["iniciada"]:
+                    estado["abandonada"] = True
+                    self._na_fila -= 1
+
+    def metricas(self) -> dict[str, Any]:
+        with self._lock:
+            iniciadas = self._concluidas + self._em_execucao
+            return {
+                "max_workers": self.max_workers,
+                "max_fila": self.max_fila,
+                "na_fila": self._na_fila,
+                "em_execucao": self._em_execucao,
+                "concluidas": self._concluidas,
+                "rejeitadas": self._rejeitadas,
+                "espera_media_ms": round(self._espera_total / iniciadas * 1000, 2) if iniciadas else 0.0,
+                "espera_max_ms": round(self._espera_max * 1000, 2),
+            }
@@ -4,7 +4,7 @@ from sqlalchemy.pool import StaticPool
 
 from src.api import app
 from src.database import Base, get_db
-from src import models  # noqa: F401 — registra os models no metadata
+from src import controllers, models  # noqa: F401 — registra os models no metadata
 
 # Banco de teste isolado: SQLite em memória compartilhado entre conexões
 engine_teste = create_async_engine(
@@ -27,6 +27,8 @@ app.dependency_overrides[get_db] = _get_db_teste
 @pytest.fixture(autouse=True)
 async def _banco_limpo():
     """Cria o schema antes de cada teste e derruba depois — testes independentes."""
+    # Versões de cache recomeçam junto com o banco: o cache em memória não pode sobreviver
+    controllers._cache_respostas.clear()
     async with engine_teste.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     yield
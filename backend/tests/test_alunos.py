@@ -103,3 +103,104 @@ async def test_cpf_duplicado_bloqueio(ac: AsyncClient):
     
     assert response.status_code == 409
     assert response.json()["type"] == "BusinessRuleViolation"
+
+@pytest.mark.anyio
+async def test_roster_com_busca_filtros_e_paginacao(ac: AsyncClient):
+    cpf = gerar_cpf_valido()
+    for payload in (
+        {"nome": "Mariana Souza", "cpf": cpf},
+        {"nome": "Marcos 100%", "tipo_pagamento": "pacote", "saldo_aulas": 4},
+        {"nome": "Paulo Lima", "tipo_pagamento": "pacote", "saldo_aulas": 0},
+        {"nome": "Ana Mar", "status": "suspenso"},
+    ):
+        res = await ac.post("/alunos/", json=payload)
+        assert res.status_code == 201, res.text
+
+    async def nomes(**params):
+        res = await ac.get("/alunos/", params=params)
+        assert res.status_code == 200, res.text
+        return [a["nome"] for a in res.json()]
+
+    # Início de qualquer palavra do nome, em qualquer ordem
+    assert await nomes(busca="mar") == ["Ana Mar", "Marcos 100%", "Mariana Souza"]
+    assert await nomes(busca="sou") == ["Mariana Souza"]
+    assert await nomes(busca="souza mari") == ["Mariana Souza"]
+    assert await nomes(busca="ana") == ["Ana Mar"]
+    assert await nomes(busca="marcos 100%") == ["Marcos 100%"]
+    assert await nomes(busca="_ar") == []
+    assert await nomes(busca=cpf[:5]) == ["Mariana Souza"]
+    assert await nomes(status="suspenso") == ["Ana Mar"]
+    assert await nomes(status=["suspenso", "cancelado"], busca="mar") == ["Ana Mar"]
+    assert await nomes(tipo_pagamento="pacote", status_financeiro="em_dia") == ["Marcos 100%"]
+    assert await nomes(status_financeiro="atrasado") == ["Ana Mar", "Mariana Souza", "Paulo Lima"]
+
+    res = await ac.get("/alunos/", params={"limit": 2, "offset": 2})
+    assert res.headers["X-Total-Count"] == "4"
+    assert [a["nome"] for a in res.json()] == ["Mariana Souza", "Paulo Lima"]
+
+    # Renomear reescreve os termos de busca
+    paulo = next(a for a in (await ac.get("/alunos/")).json() if a["nome"] == "Paulo Lima")
+    assert (await ac.patch(f"/alunos/{paulo['id']}", json={"nome": "Paulo Andrade"})).status_code == 200
+    assert await nomes(busca="lima") == []
+    assert await nomes(busca="andr") == ["Paulo Andrade"]
+
+
+@pytest.mark.anyio
+async def test_importacao_em_massa_de_alunos_devolve_credenciais(ac: AsyncClient):
+    import csv
+    import io
+    from src import security
+
+    cpf_existente, cpf_novo = gerar_cpf_valido(), gerar_cpf_valido()
+    await ac.post("/alunos/", json={"nome": "Já Cadastrado", "cpf": cpf_existente})
+
+    planilha = (
+        "nome;cpf;email;tipo_pagamento;saldo_aulas;valor_mensalidade;username;password\n"
+        f"Ana Souza;{cpf_novo};ana@teste.com;pacote;10;250,00;;\n"
+        "Bruno Lima;;;mensal;;;bruno.lima;senha-escolhida\n"
+        f"Duplicado;{cpf_existente};;;;;;\n"
+        ";;sem-nome@teste.com;;;;;\n"
+        "Ana Repetida;;ana@teste.com;;;;;\n"
+        "Carla;;;quinzenal;;;;\n"
+    )
+    res = await ac.post("/alunos/importar", files={"arquivo": ("alunos.csv", planilha.encode(), "text/csv")})
+    assert res.status_code == 200, res.text
+    assert res.headers["content-type"].startswith("text/csv")
+    assert (res.headers["X-Importados"], res.headers["X-Total-Erros"]) == ("2", "4")
+
+    linhas = {int(l["linha"]): l for l in csv.DictReader(io.StringIO(res.text))}
+    assert sorted(linhas) == [2, 3, 4, 5, 6, 7]
+    assert "CPF" in linhas[4]["erro"] and "nome" in linhas[5]["erro"]
+    assert "ana@teste.com" in linhas[6]["erro"] and "tipo_pagamento" in linhas[7]["erro"]
+
+    ana, bruno = linhas[2], linhas[3]
+    assert ana["username"] == f"ana.{ana['aluno_id']}" and len(ana["senha"]) >= 12
+    assert (bruno["username"], bruno["senha"]) == ("bruno.lima", "")
+
+    detalhe = (await ac.get(f"/alunos/{ana['aluno_id']}")).json()
+    assert (detalhe["tipo_pagamento"], detalhe["saldo_aulas"], detalhe["valor_mensalidade"]) == ("pacote", 10, 250.0)
+    assert [a["nome"] for a in (await ac.get("/alunos/", params={"busca": "lima"})).json()] == ["Bruno Lima"]
+
+    async for db in app.dependency_overrides[get_db]():
+        usuarios = {u.username: u for u in (await db.scalars(select(models.Usuario))).all()}
+    assert security.verify_password(ana["senha"], usuarios[ana["username"]].hashed_password)
+    assert security.verify_password("senha-escolhida", usuarios["bruno.lima"].hashed_password)
+    assert usuarios["bruno.lima"].aluno_id == int(bruno["aluno_id"])
+
+
+@pytest.mark.anyio
+async def test_importacao_nao_gera_username_igual_a_outro_do_mesmo_lote(ac: AsyncClient):
+    import csv
+    import io
+
+    anterior = (await ac.post("/alunos/", json={"nome": "Primeiro", "cpf": gerar_cpf_valido()})).json()["id"]
+    # Dora recebe o próximo id; Eva pede explicitamente o username que seria gerado para ela
+    planilha = f"nome;username\nDora;\nEva;dora.{anterior + 1}\n"
+    res = await ac.post("/alunos/importar", files={"arquivo": ("alunos.csv", planilha.encode(), "text/csv")})
+    assert res.status_code == 200, res.text
+    assert (res.headers["X-Importados"], res.headers["X-Total-Erros"]) == ("2", "0")
+
+    dora, eva = list(csv.DictReader(io.StringIO(res.text)))
+    assert int(dora["aluno_id"]) == anterior + 1
+    assert eva["username"] == f"dora.{anterior + 1}"
+    assert dora["username"].startswith(f"dora.{anterior + 1}.")
@@ -0,0 +1,192 @@
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import delete
+
+from src.api import app
+from src.database import get_db
+from src.senhas import ServicoSenhas, verificar_hash
+from src import controllers, exceptions, models, security
+
+
+@pytest.fixture
+async def db():
+    """Sessão do banco de teste (mesmo override usado pelas rotas)."""
+    security._principal_cache.clear()
+    async for session in app.dependency_overrides[get_db]():
+        yield session
+    security._principal_cache.clear()
+
+
+async def _criar_usuario(db, username: str = "trainer_cache", role: str = "trainer") -> models.Usuario:
+    usuario = models.Usuario(
+        username=username,
+        email=f"{username}@teste.com",
+        hashed_password=security.get_password_hash("segredo123"),
+        role=role,
+    )
+    db.add(usuario)
+    await db.commit()
+    return usuario
+
+
+@pytest.mark.anyio
+async def test_usuario_autenticado_vem_do_cache_na_segunda_requisicao(db):
+    usuario = await _criar_usuario(db)
+    token = security.create_access_token({"sub": usuario.username})
+
+    primeiro = await security.get_current_user(db=db, token=token)
+    assert primeiro.id == usuario.id
+
+    # Remove a linha por fora do fluxo normal: o cache ainda responde sem ir ao banco
+    await db.execute(delete(models.Usuario).where(models.Usuario.id == usuario.id))
+    await db.commit()
+
+    segundo = await security.get_current_user(db=db, token=token)
+    assert (segundo.id, segundo.role) == (usuario.id, "trainer")
+
+    security.invalidar_principal(usuario, removido=True)
+    with pytest.raises(HTTPException) as exc:
+        await security.get_current_user(db=db, token=token)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_reset_de_senha_invalida_cache_do_usuario(db):
+    usuario = await _criar_usuario(db)
+    token = security.create_access_token({"sub": usuario.username})
+    await security.get_current_user(db=db, token=token)
+    assert security._principal_cache.get(usuario.username) is not None
+
+    await controllers.resetar_senha_usuario(db, usuario.id, "nova-senha-123")
+    assert security._principal_cache.get(usuario.username) is None
+
+
+@pytest.mark.anyio
+async def test_modo_stateless_autoriza_pelas_claims_e_respeita_revogacao(db, monkeypatch):
+    monkeypatch.setattr(security.settings, "AUTH_STATELESS_CLAIMS", True)
+    security._tabela_epocas.limpar()
+    usuario = await _criar_usuario(db)
+    token = security.create_access_token(security.claims_do_usuario(usuario))
+
+    primeiro = await security.get_current_user(db=db, token=token)
+    assert (primeiro.id, primeiro.role) == (usuario.id, "trainer")
+
+    # Reset de senha avança a época: o token antigo deixa de valer, o novo funciona
+    await controllers.resetar_senha_usuario(db, usuario.id, "nova-senha-123")
+    with pytest.raises(HTTPException) as exc:
+        await security.get_current_user(db=db, token=token)
+    assert exc.value.status_code == 401
+
+    novo_token = security.create_access_token(security.claims_do_usuario(usuario))
+    atual = await security.get_current_user(db=db, token=novo_token)
+    assert atual.id == usuario.id
+    security._tabela_epocas.limpar()
+
+
+@pytest.mark.anyio
+async def test_tabela_de_epocas_recarrega_uma_vez_por_intervalo(db, monkeypatch):
+    import asyncio
+
+    usuario = await _criar_usuario(db)
+    tabela = security._TabelaEpocas(intervalo_segundos=60)
+    consultas = []
+    execute = db.execute
+
+    async def execute_lento(*args, **kwargs):
+        consultas.append(args[0])
+        await asyncio.sleep(0.05)
+        return await execute(*args, **kwargs)
+
+    monkeypatch.setattr(db, "execute", execute_lento)
+
+    # Primeira carga: sem tabela anterior, todos esperam a mesma consulta
+    assert await asyncio.gather(*(tabela.epoca(db, usuario.id) for _ in range(5))) == [0] * 5
+    assert len(consultas) == 1
+
+    # Intervalo vencido: uma requisição recarrega, as que chegam durante a recarga usam a tabela anterior
+    tabela.registrar(usuario.id, 7)
+    tabela._carregada_em -= 61
+    assert await asyncio.gather(*(tabela.epoca(db, usuario.id) for _ in range(5))) == [0, 7, 7, 7, 7]
+    assert len(consultas) == 2
+    assert await tabela.epoca(db, usuario.id) == 0 and len(consultas) == 2
+
+
+@pytest.mark.anyio
+async def test_servico_de_senhas_roda_bcrypt_no_pool_e_rejeita_fila_cheia():
+    servico = ServicoSenhas(max_workers=1, max_fila=1)
+    hashed = await servico.gerar_hash("segredo123")
+    assert await servico.verificar("segredo123", hashed) is True
+    assert await servico.verificar("errada", hashed) is False
+    assert servico.metricas()["concluidas"] == 3
+
+    lotado = ServicoSenhas(max_workers=1, max_fila=0)
+    with pytest.raises(exceptions.ServiceUnavailableError):
+        await lotado.gerar_hash("segredo123")
+    assert lotado.metricas()["rejeitadas"] == 1
+
+
+@pytest.mark.anyio
+async def test_metricas_do_admin_expoem_fila_de_senhas():
+    anterior = app.dependency_overrides.get(security.get_current_user)
+
+    async def _admin():
+        return models.Usuario(id=99, username="admin", role="admin")
+
+    app.dependency_overrides[security.get_current_user] = _admin
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            res = await ac.get("/admin/metricas")
+    finally:
+        if anterior is not None:
+            app.dependency_overrides[security.get_current_user] = anterior
+        else:
+            app.dependency_overrides.pop(security.get_current_user, None)
+
+    assert res.status_code == 200, res.text
+    corpo = res.json()
+    assert corpo["senhas"]["max_workers"] == security.servico_senhas.max_workers
+    assert corpo["pool"]["tamanho"] == security.settings.DB_POOL_SIZE
+
+
+@pytest.mark.anyio
+async def test_espera_cancelada_libera_a_fila_de_senhas():
+    import asyncio
+    import threading
+
+    servico = ServicoSenhas(max_workers=1, max_fila=2)
+    liberar = threading.Event()
+    ocupando = asyncio.ensure_future(servico._executar(liberar.wait, 5))
+    while servico.metricas()["em_execucao"] == 0:
+        await asyncio.sleep(0.01)
+
+    # Dois logins aguardando o único worker são abandonados (cliente desconectou)
+    esperas = [asyncio.ensure_future(servico.verificar("x", "y")) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    assert servico.metricas()["na_fila"] == 2
+    for espera in esperas:
+        espera.cancel()
+    await asyncio.gather(*esperas, return_exceptions=True)
+    assert servico.metricas()["na_fila"] == 0
+
+    liberar.set()
+    await ocupando
+    hashed = await servico.gerar_hash("segredo123")
+    assert await servico.verificar("segredo123", hashed) is True
+    assert servico.metricas()["na_fila"] == 0
+
+
+@pytest.mark.anyio
+async def test_pool_de_hashes_em_lote_e_reaproveitado_entre_lotes():
+    from src.senhas import PoolDeHashes
+
+    pool = PoolDeHashes(processos=2)
+    try:
+        primeiro = await pool.gerar(["a", "b", "c"])
+        executor = pool._executor
+        segundo = await pool.gerar(["d"])
+        assert pool._executor is executor  # mesmo pool: os processos não são recriados por lote
+        assert [verificar_hash(s, h) for s, h in zip("abcd", primeiro + segundo)] == [True] * 4
+    finally:
+        pool.encerrar()
+    assert pool._executor is None
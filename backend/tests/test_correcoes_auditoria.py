@@ -206,3 +206,328 @@ async def test_inadimplencia_ignora_alunos_cancelados(ac: AsyncClient):
     assert corpo["alunos_em_dia"] == 1
     assert corpo["alunos_inadimplentes"] == 0
     assert corpo["inadimplencia"] == 0.0
+
+
+@pytest.mark.anyio
+async def test_estatisticas_usam_mes_de_referencia_e_nao_data_do_pagamento(ac: AsyncClient):
+    from datetime import date
+    hoje = date.today()
+    aluno_id = await _criar_aluno(ac, nome="Referência")
+
+    # Pago hoje, mas referente a outro mês: não conta como em dia no mês atual
+    ano_passado = f"{hoje.month:02d}/{hoje.year - 1}"
+    pagamento = await _registrar_pagamento(ac, aluno_id, referencia_mes=ano_passado)
+    assert pagamento["referencia_mes"] == ano_passado
+
+    corpo = (await ac.get("/pagamentos/estatisticas")).json()
+    assert corpo["alunos_em_dia"] == 0
+    assert corpo["receita_total"] == 0
+
+    # Referência sem zero à esquerda é normalizada e passa a valer para o mês atual
+    await _registrar_pagamento(ac, aluno_id, referencia_mes=f"{hoje.month}/{hoje.year}", valor=80.0)
+    corpo = (await ac.get("/pagamentos/estatisticas")).json()
+    assert corpo["alunos_em_dia"] == 1
+    assert corpo["receita_total"] == 80.0
+    assert corpo["receita_mensal_12m"][-1]["receita"] == 80.0
+
+
+@pytest.mark.anyio
+async def test_pagamentos_paginados_filtrados_e_em_stream(ac: AsyncClient, como_usuario):
+    import json
+    aluno_a = await _criar_aluno(ac, nome="Aluno A")
+    aluno_b = await _criar_aluno(ac, nome="Aluno B")
+    for dia in ("2026-07-01", "2026-07-10", "2026-07-10", "2026-07-20"):
+        await _registrar_pagamento(ac, aluno_a, data_pagamento=dia)
+    await _registrar_pagamento(ac, aluno_b, data_pagamento="2026-07-15")
+
+    # Outro trainer não aparece em nenhum dos modos
+    como_usuario(TRAINER_B)
+    aluno_outro = await _criar_aluno(ac, nome="Outro")
+    await _registrar_pagamento(ac, aluno_outro, data_pagamento="2026-07-11")
+    como_usuario(TRAINER_A)
+
+    vistos, cursor = [], None
+    while True:
+        params = {"aluno_id": aluno_a, "limit": 3, **({"cursor": cursor} if cursor else {})}
+        corpo = (await ac.get("/pagamentos/pagina", params=params)).json()
+        vistos += corpo["items"]
+        cursor = corpo["next_cursor"]
+        if cursor is None:
+            break
+    assert [p["data_pagamento"] for p in vistos] == ["2026-07-20", "2026-07-10", "2026-07-10", "2026-07-01"]
+    assert len({p["id"] for p in vistos}) == 4
+    assert all(p["aluno_nome"] == "Aluno A" for p in vistos)
+
+    res = await ac.get("/pagamentos/", params={"de": "2026-07-10", "ate": "2026-07-15"})
+    assert [p["data_pagamento"] for p in res.json()] == ["2026-07-15", "2026-07-10", "2026-07-10"]
+
+    res = await ac.get("/pagamentos/stream")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    linhas = [json.loads(linha) for linha in res.text.splitlines()]
+    assert len(linhas) == 5
+    assert {p["aluno_id"] for p in linhas} == {aluno_a, aluno_b}
+
+
+@pytest.mark.anyio
+async def test_plano_ativo_do_aluno_responde_304_enquanto_nao_muda(ac: AsyncClient, como_usuario):
+    aluno_id = await _criar_aluno(ac, nome="Aluno App")
+    ex_id = (await ac.post("/exercicios/", json={"nome": "Supino", "grupo_muscular": "Peito"})).json()["id"]
+    plano = (await ac.post(f"/alunos/{aluno_id}/planos", json={
+        "titulo": "Plano App",
+        "treinos": [{"nome": "A", "prescricoes": [{"exercicio_id": ex_id, "series": 3, "repeticoes": "10"}]}],
+    })).json()
+    prescricao_id = plano["treinos"][0]["prescricoes"][0]["id"]
+
+    como_usuario(models.Usuario(id=50, username="aluno_app", role="aluno", aluno_id=aluno_id))
+    res = await ac.get("/alunos/me/plano-ativo")
+    assert res.status_code == 200, res.text
+    assert res.json()["id"] == plano["id"]
+    etag = res.headers["ETag"]
+
+    res = await ac.get("/alunos/me/plano-ativo", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["ETag"] == etag and res.content == b""
+
+    # Aluno registra a carga: o conteúdo muda e o ETag antigo deixa de valer
+    res = await ac.patch(f"/prescricoes/{prescricao_id}/carga", json={"carga": "40kg"})
+    assert res.status_code == 200, res.text
+    res = await ac.get("/alunos/me/plano-ativo", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.json()["treinos"][0]["prescricoes"][0]["carga_kg"] == "40kg"
+    etag_carga = res.headers["ETag"]
+    assert etag_carga != etag
+
+    como_usuario(TRAINER_A)
+    await ac.patch(f"/planos/{plano['id']}", json={"titulo": "Plano App v2"})
+    como_usuario(models.Usuario(id=50, username="aluno_app", role="aluno", aluno_id=aluno_id))
+    res = await ac.get("/alunos/me/plano-ativo", headers={"If-None-Match": etag_carga})
+    assert res.status_code == 200
+    assert res.json()["titulo"] == "Plano App v2"
+    etag_titulo = res.headers["ETag"]
+
+    # Mudança na biblioteca de exercícios (nome/vídeo embutidos no plano) também invalida
+    como_usuario(TRAINER_A)
+    assert (await ac.post("/exercicios/seed")).status_code == 201
+    como_usuario(models.Usuario(id=50, username="aluno_app", role="aluno", aluno_id=aluno_id))
+    res = await ac.get("/alunos/me/plano-ativo", headers={"If-None-Match": etag_titulo})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag_titulo
+
+
+@pytest.mark.anyio
+async def test_resumo_financeiro_mantido_nas_escritas_bate_com_reconstrucao(ac: AsyncClient, como_usuario):
+    from datetime import date
+    from sqlalchemy import select
+    from src import controllers
+    from src.database import get_db
+
+    hoje = date.today()
+    ref_atual = f"{hoje.month:02d}/{hoje.year}"
+    aluno_1 = await _criar_aluno(ac, nome="Pagante 1")
+    aluno_2 = await _criar_aluno(ac, nome="Pagante 2")
+    p1 = await _registrar_pagamento(ac, aluno_1, referencia_mes=ref_atual, valor=100.0)
+    await _registrar_pagamento(ac, aluno_1, referencia_mes=ref_atual, valor=50.0)
+    p3 = await _registrar_pagamento(ac, aluno_2, referencia_mes=ref_atual, valor=200.0)
+
+    corpo = (await ac.get("/pagamentos/estatisticas")).json()
+    assert corpo["receita_total"] == 350.0
+    assert corpo["ticket_medio"] == 175.0  # 2 alunos pagantes, não 3 pagamentos
+
+    # Edição troca o mês, exclusão retira o aluno 2, troca de trainer move o aluno 1
+    res = await ac.put(f"/pagamentos/{p1['id']}", json={
+        "aluno_id": aluno_1, "valor": 120.0, "referencia_mes": "01/2020", "forma_pagamento": "PIX",
+    })
+    assert res.status_code == 200, res.text
+    assert (await ac.delete(f"/pagamentos/{p3['id']}")).status_code == 200
+    corpo = (await ac.get("/pagamentos/estatisticas")).json()
+    assert (corpo["receita_total"], corpo["ticket_medio"]) == (50.0, 50.0)
+
+    como_usuario(ADMIN)
+    assert (await ac.patch(f"/alunos/{aluno_1}", json={"trainer_id": TRAINER_B.id})).status_code == 200
+    como_usuario(TRAINER_A)
+    assert (await ac.get("/pagamentos/estatisticas")).json()["receita_total"] == 0
+
+    async for db in app.dependency_overrides[get_db]():
+        resumo = models.ResumoFinanceiroMensal
+        colunas = (resumo.trainer_id, resumo.periodo, resumo.receita, resumo.n_pagamentos, resumo.n_alunos_pagantes)
+        incremental = {r for r in (await db.execute(select(*colunas))).all() if r.n_pagamentos}
+        await controllers.reconstruir_resumo_financeiro(db)
+        reconstruido = set((await db.execute(select(*colunas))).all())
+    assert incremental == reconstruido
+    assert (TRAINER_B.id, date(2020, 1, 1), 120.0, 1, 1) in reconstruido
+
+
+@pytest.mark.anyio
+async def test_importacao_csv_de_pagamentos_em_lotes(ac: AsyncClient, como_usuario):
+    import io
+    from sqlalchemy import select
+    from src import controllers
+    from src.database import get_db
+
+    por_id = await _criar_aluno(ac, nome="Por Id", tipo_pagamento="pacote", saldo_aulas=1)
+    por_cpf = await _criar_aluno(ac, nome="Por CPF", cpf="52998224725")
+    await _criar_aluno(ac, nome="Por Email", email="aluna@teste.com")
+    como_usuario(TRAINER_B)
+    de_outro = await _criar_aluno(ac, nome="De outro trainer")
+    como_usuario(TRAINER_A)
+
+    csv = (
+        "aluno_id;cpf;email;valor;referencia_mes;forma_pagamento;quantidade_aulas;data_pagamento\n"
+        f"{por_id};;;150,00;1/2024;PIX;8;05/01/2024\n"
+        f"{por_id};;;150,00;02/2024;PIX;4;\n"
+        ";529.982.247-25;;1.200,50;01/2024;Dinheiro;;\n"
+        ";;ALUNA@teste.com;90;01/2024;Cartão;;2024-01-20\n"
+        "\n"
+        f"{por_id};;;abc;01/2024;PIX;;\n"
+        f"{de_outro};;;100;01/2024;PIX;;\n"
+        f"{por_id};;;100;13/2024;PIX;;\n"
+    )
+    res = await ac.post("/pagamentos/importar", files={"arquivo": ("historico.csv", csv.encode("utf-8"), "text/csv")})
+    assert res.status_code == 200, res.text
+    relatorio = res.json()
+    assert relatorio["importados"] == 4
+    assert [(e["linha"], e["erro"].split(":")[0]) for e in relatorio["erros"]] == [
+        (7, "valor numérico inválido"), (8, "aluno não encontrado"), (9, "referencia_mes inválida (use MM/YYYY)"),
+    ]
+
+    assert (await ac.get(f"/alunos/{por_id}")).json()["saldo_aulas"] == 13
+    pagamentos = (await ac.get("/pagamentos/", params={"aluno_id": por_id})).json()
+    assert [(p["referencia_mes"], p["data_pagamento"]) for p in pagamentos] == [
+        ("02/2024", "2024-02-01"), ("01/2024", "2024-01-05"),
+    ]
+    assert (await ac.get("/pagamentos/", params={"aluno_id": por_cpf})).json()[0]["valor"] == 1200.5
+
+    # Lotes de 1 linha: o aluno que paga duas vezes no mesmo mês conta uma vez como pagante
+    async for db in app.dependency_overrides[get_db]():
+        segundo = f"aluno_id,valor,referencia_mes,forma_pagamento\n{por_cpf},10,01/2024,PIX\n{por_cpf},10,03/2024,PIX\n"
+        relatorio = await controllers.importar_pagamentos(db, io.BytesIO(segundo.encode()), trainer_id=1, tamanho_lote=1)
+        assert relatorio["importados"] == 2
+
+        resumo = models.ResumoFinanceiroMensal
+        colunas = (resumo.trainer_id, resumo.periodo, resumo.receita, resumo.n_pagamentos, resumo.n_alunos_pagantes)
+        incremental = set((await db.execute(select(*colunas))).all())
+        await controllers.reconstruir_resumo_financeiro(db)
+        assert incremental == set((await db.execute(select(*colunas))).all())
+
+
+@pytest.mark.anyio
+async def test_exportacao_em_csv_e_ndjson_respeita_tenant_e_filtros(ac: AsyncClient, como_usuario, monkeypatch):
+    import csv
+    import io
+    import json
+    from src import exportacao
+    monkeypatch.setattr(exportacao, "LINHAS_POR_BLOCO", 1)
+
+    aluno_id = await _criar_aluno(ac, nome="Exportado, Silva", cpf="52998224725")
+    for data_hora in ("2026-03-10T08:00:00", "2026-04-10T08:00:00"):
+        await ac.post("/sessoes/", json={"aluno_id": aluno_id, "data_hora": data_hora, "tipo_atividade": "Musculação"})
+    await _registrar_pagamento(ac, aluno_id, referencia_mes="03/2026", data_pagamento="2026-03-05")
+    como_usuario(TRAINER_B)
+    outro = await _criar_aluno(ac, nome="Outro tenant")
+    await ac.post("/sessoes/", json={"aluno_id": outro, "data_hora": "2026-03-11T08:00:00"})
+    como_usuario(TRAINER_A)
+
+    res = await ac.get("/exportar/sessoes", params={"de": "2026-04-01"})
+    assert res.status_code == 200, res.text
+    assert res.headers["content-disposition"] == 'attachment; filename="sessoes.csv"'
+    assert res.text.startswith("\ufeff")
+    linhas = list(csv.DictReader(io.StringIO(res.text.lstrip("\ufeff"))))
+    assert [(l["aluno_nome"], l["data_hora"], l["tipo_atividade"]) for l in linhas] == [
+        ("Exportado, Silva", "2026-04-10T08:00:00", "Musculação"),
+    ]
+
+    res = await ac.get("/exportar/sessoes", params={"formato": "ndjson"})
+    sessoes = [json.loads(l) for l in res.text.splitlines()]
+    assert [s["aluno_id"] for s in sessoes] == [aluno_id, aluno_id]
+
+    res = await ac.get("/exportar/pagamentos", params={"formato": "ndjson", "aluno_id": aluno_id})
+    assert [(p["referencia_mes"], p["data_pagamento"]) for p in map(json.loads, res.text.splitlines())] == [
+        ("03/2026", "2026-03-05"),
+    ]
+
+    res = await ac.get("/exportar/alunos")
+    alunos = list(csv.DictReader(io.StringIO(res.text.lstrip("\ufeff"))))
+    assert [(a["nome"], a["cpf"], a["frequencia_semanal_plano"]) for a in alunos] == [("Exportado, Silva", "52998224725", "3")]
+    assert (await ac.get("/exportar/alunos", params={"status": "cancelado"})).text.lstrip("\ufeff").count("\n") == 1
+
+
+@pytest.mark.anyio
+async def test_exportacao_csv_neutraliza_formulas(ac: AsyncClient):
+    import csv
+    import io
+    await _criar_aluno(ac, nome="=HYPERLINK(\"http://x\")", objetivo="-2+3")
+    await _criar_aluno(ac, nome="Ana - Manhã", objetivo="@SUM(A1)")
+
+    res = await ac.get("/exportar/alunos")
+    alunos = list(csv.DictReader(io.StringIO(res.text.lstrip("\ufeff"))))
+    assert sorted((a["nome"], a["objetivo"]) for a in alunos) == [
+        ("'=HYPERLINK(\"http://x\")", "'-2+3"),
+        ("Ana - Manhã", "'@SUM(A1)"),
+    ]
+
+
+@pytest.mark.anyio
+async def test_operacoes_granulares_no_plano_e_ownership_das_prescricoes(ac: AsyncClient, como_usuario):
+    aluno_id = await _criar_aluno(ac)
+    ex = [(await ac.post("/exercicios/", json={"nome": n, "grupo_muscular": "Teste"})).json()["id"] for n in ("Remada", "Terra", "Prancha")]
+    plano = (await ac.post(f"/alunos/{aluno_id}/planos", json={"titulo": "Delta", "treinos": [
+        {"nome": "A", "prescricoes": [
+            {"exercicio_id": ex[0], "series": 3, "repeticoes": "10"},
+            {"exercicio_id": ex[1], "series": 3, "repeticoes": "8"},
+        ]},
+        {"nome": "B", "prescricoes": [{"exercicio_id": ex[2], "series": 2, "repeticoes": "30s"}]},
+    ]})).json()
+    treino_a, treino_b = plano["treinos"]
+    remada, terra = treino_a["prescricoes"]
+
+    res = await ac.post(f"/planos/{plano['id']}/operacoes", json={"versao": plano["versao"], "operacoes": [
+        {"op": "atualizar_prescricao", "prescricao_id": remada["id"], "series": 5},
+        {"op": "reordenar_prescricoes", "treino_id": treino_a["id"], "prescricao_ids": [terra["id"], remada["id"]]},
+        {"op": "adicionar_prescricao", "treino_id": treino_a["id"], "posicao": 0,
+         "prescricao": {"exercicio_id": ex[2], "series": 1, "repeticoes": "60s"}},
+        {"op": "remover_treino", "treino_id": treino_b["id"]},
+        {"op": "adicionar_treino", "nome": "C", "posicao": 0, "prescricoes": [{"exercicio_id": ex[0], "series": 4, "repeticoes": "12"}]},
+        {"op": "atualizar_treino", "treino_id": treino_a["id"], "nome": "A - Costas"},
+    ]})
+    assert res.status_code == 200, res.text
+    atualizado = res.json()
+    assert atualizado["versao"] == plano["versao"] + 1
+    assert [t["nome"] for t in atualizado["treinos"]] == ["C", "A - Costas"]
+    assert [(p["exercicio_id"], p["series"]) for p in atualizado["treinos"][1]["prescricoes"]] == [(ex[2], 1), (ex[1], 3), (ex[0], 5)]
+    # Prescrições que só mudaram de lugar mantêm o id
+    assert [p["id"] for p in atualizado["treinos"][1]["prescricoes"][1:]] == [terra["id"], remada["id"]]
+
+    # Versão antiga ou id de outro plano: 409/404 e nada é aplicado
+    res = await ac.post(f"/planos/{plano['id']}/operacoes", json={"versao": plano["versao"], "operacoes": [
+        {"op": "atualizar_treino", "treino_id": treino_a["id"], "nome": "Perdido"},
+    ]})
+    assert res.status_code == 409
+    res = await ac.post(f"/planos/{plano['id']}/operacoes", json={"operacoes": [
+        {"op": "atualizar_treino", "treino_id": treino_a["id"], "nome": "Perdido"},
+        {"op": "remover_prescricao", "prescricao_id": 10**6},
+    ]})
+    assert res.status_code == 404
+    atual = (await ac.get(f"/planos/{plano['id']}")).json()
+    assert (atual["treinos"][1]["nome"], atual["versao"]) == ("A - Costas", atualizado["versao"])
+
+    # null explícito em campo obrigatório é 422; exercício inexistente é 409 (não 500)
+    op_nula = {"op": "atualizar_prescricao", "prescricao_id": remada["id"], "exercicio_id": None}
+    assert (await ac.post(f"/planos/{plano['id']}/operacoes", json={"operacoes": [op_nula]})).status_code == 422
+    assert (await ac.patch(f"/prescricoes/{remada['id']}", json={"series": None})).status_code == 422
+    op_inexistente = {**op_nula, "exercicio_id": 10**6}
+    assert (await ac.post(f"/planos/{plano['id']}/operacoes", json={"operacoes": [op_inexistente]})).status_code == 409
+    assert (await ac.patch(f"/prescricoes/{remada['id']}", json={"exercicio_id": 10**6})).status_code == 409
+
+    # Rotas por prescrição: trainer de outro tenant não enxerga
+    como_usuario(TRAINER_B)
+    assert (await ac.patch(f"/prescricoes/{remada['id']}", json={"series": 9})).status_code == 404
+    assert (await ac.delete(f"/prescricoes/{remada['id']}")).status_code == 404
+    como_usuario(TRAINER_A)
+    res = await ac.patch(f"/prescricoes/{remada['id']}", json={"carga": "30kg"})
+    assert res.status_code == 200, res.text
+    assert (res.json()["carga_kg"], res.json()["series"], res.json()["nome_exercicio"]) == ("30kg", 5, "Remada")
+    assert (await ac.delete(f"/prescricoes/{terra['id']}")).status_code == 204
+    atual = (await ac.get(f"/planos/{plano['id']}")).json()
+    assert [p["id"] for p in atual["treinos"][1]["prescricoes"]][1:] == [remada["id"]]
+    assert atual["versao"] == atualizado["versao"] + 2
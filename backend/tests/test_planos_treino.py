@@ -194,3 +194,205 @@ async def test_criar_template_global(ac: AsyncClient):
     assert res_list.status_code == 200
     templates = res_list.json()
     assert any(t["titulo"] == "Template Iniciante" for t in templates)
+
+@pytest.mark.anyio
+async def test_biblioteca_de_exercicios_em_cache_com_etag(ac: AsyncClient):
+    from src.api import app as _app
+    from src.database import get_db
+    from src import controllers
+
+    await ac.post("/exercicios/", json={"nome": "Agachamento", "grupo_muscular": "Pernas"})
+    res = await ac.get("/exercicios/")
+    assert res.status_code == 200
+    assert [e["nome"] for e in res.json()] == ["Agachamento"]
+    etag = res.headers["ETag"]
+
+    assert (await ac.get("/exercicios/", headers={"If-None-Match": etag})).status_code == 304
+
+    # Escrita feita "por outro worker": só a versão no banco muda, o cache local fica como estava
+    async for db in _app.dependency_overrides[get_db]():
+        db.add(models.Exercicio(nome="Remada", grupo_muscular="Costas"))
+        await controllers.incrementar_versao_cache(db, controllers.CHAVE_EXERCICIOS)
+        controllers._cache_respostas.set(controllers.CHAVE_EXERCICIOS, 1, b"[]")  # cache local antigo
+        await db.commit()
+
+    res = await ac.get("/exercicios/", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    assert sorted(e["nome"] for e in res.json()) == ["Agachamento", "Remada"]
+
+    res = await ac.post("/exercicios/seed")
+    assert res.status_code == 201
+    assert len((await ac.get("/exercicios/")).json()) > 2
+
+@pytest.mark.anyio
+async def test_templates_servidos_do_cache_e_invalidados_nas_mutacoes(ac: AsyncClient):
+    res = await ac.post("/planos/templates", json={"titulo": "Template Força", "treinos": [{"nome": "A", "prescricoes": []}]})
+    assert res.status_code == 201
+    template_id = res.json()["id"]
+
+    res = await ac.get("/planos/templates")
+    assert [t["titulo"] for t in res.json()] == ["Template Força"]
+    etag = res.headers["ETag"]
+    assert (await ac.get("/planos/templates", headers={"If-None-Match": etag})).status_code == 304
+
+    # Cada mutação de template avança a versão e derruba o ETag anterior
+    res = await ac.patch(f"/planos/{template_id}", json={"titulo": "Template Força II"})
+    assert res.status_code == 200
+    res = await ac.get("/planos/templates", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert [t["titulo"] for t in res.json()] == ["Template Força II"]
+    etag = res.headers["ETag"]
+
+    assert (await ac.post(f"/planos/{template_id}/clonar")).status_code == 200
+    res = await ac.get("/planos/templates", headers={"If-None-Match": etag})
+    assert res.status_code == 200 and len(res.json()) == 2
+    etag = res.headers["ETag"]
+
+    # Novo exercício também invalida (templates embutem os dados do exercício)
+    await ac.post("/exercicios/", json={"nome": "Terra", "grupo_muscular": "Posterior"})
+    res = await ac.get("/planos/templates", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    etag = res.headers["ETag"]
+
+    assert (await ac.delete(f"/planos/{template_id}")).status_code == 204
+    res = await ac.get("/planos/templates", headers={"If-None-Match": etag})
+    assert res.status_code == 200 and len(res.json()) == 1
+
+@pytest.mark.anyio
+async def test_criacao_de_plano_sem_recarregar(ac: AsyncClient):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    res_aluno = await ac.post("/alunos/", json={"nome": "Aluno Lote", "cpf": gerar_cpf_valido(), "valor_mensalidade": 100.0})
+    aluno_id = res_aluno.json()["id"]
+    ids = [(await ac.post("/exercicios/", json={"nome": f"Ex {i}", "grupo_muscular": "Geral"})).json()["id"] for i in range(3)]
+
+    def _payload(n_treinos: int) -> dict:
+        return {"titulo": f"Split {n_treinos}", "treinos": [
+            {"nome": f"Treino {t}", "prescricoes": [
+                {"exercicio_id": ids[p % 3], "series": 3, "repeticoes": "10", "carga": f"{t}{p}kg"} for p in range(4)
+            ]} for t in range(n_treinos)
+        ]}
+
+    consultas: list[str] = []
+
+    def _capturar(conn, cursor, statement, *args):
+        consultas.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", _capturar)
+    try:
+        res = await ac.post(f"/alunos/{aluno_id}/planos", json=_payload(6))
+        assert res.status_code == 201, res.text
+    finally:
+        event.remove(Engine, "before_cursor_execute", _capturar)
+
+    # A resposta sai do que foi inserido: nada da árvore é re-selecionado
+    # (o número fixo de comandos é medido no PostgreSQL, em test_planos_de_consulta)
+    assert not any(c.lstrip().upper().startswith("SELECT") and "FROM treinos" in c for c in consultas)
+
+    plano = res.json()
+    assert [t["nome"] for t in plano["treinos"]] == [f"Treino {t}" for t in range(6)]
+    assert [p["carga_kg"] for p in plano["treinos"][5]["prescricoes"]] == [f"5{p}kg" for p in range(4)]
+    assert plano["treinos"][0]["prescricoes"][1]["exercicio"]["nome"] == "Ex 1"
+    assert plano["treinos"][0]["prescricoes"][1]["nome_exercicio"] == "Ex 1"
+
+    res = await ac.post(f"/alunos/{aluno_id}/planos", json={"titulo": "X", "treinos": [
+        {"nome": "A", "prescricoes": [{"exercicio_id": 10**6, "series": 3, "repeticoes": "10"}]}
+    ]})
+    assert res.status_code == 409
+    # Falha de validação não desativa o plano vigente
+    assert (await ac.get(f"/planos/{plano['id']}")).json()["esta_ativo"] is True
+
+@pytest.mark.anyio
+async def test_clonagem_em_lote_aplica_template_a_varios_alunos(ac: AsyncClient):
+    ex_ids = [(await ac.post("/exercicios/", json={"nome": f"Ex Lote {i}", "grupo_muscular": "Geral"})).json()["id"] for i in range(2)]
+    res = await ac.post("/planos/templates", json={"titulo": "Bloco Verão", "duracao_semanas": 6, "treinos": [
+        {"nome": "A", "prescricoes": [
+            {"exercicio_id": ex_ids[0], "series": 4, "repeticoes": "8", "carga": "40kg", "metodo": "Drop-set"},
+            {"exercicio_id": ex_ids[1], "series": 3, "repeticoes": "12"},
+        ]},
+        {"nome": "B", "prescricoes": [{"exercicio_id": ex_ids[1], "series": 5, "repeticoes": "5", "descanso": 120}]},
+    ]})
+    template = res.json()
+
+    alunos = [(await ac.post("/alunos/", json={"nome": f"Turma {i}", "cpf": gerar_cpf_valido()})).json()["id"] for i in range(3)]
+    antigo = (await ac.post(f"/alunos/{alunos[0]}/planos", json={"titulo": "Bloco Antigo", "treinos": []})).json()
+
+    res = await ac.post(f"/planos/{template['id']}/clonar-lote", json={"aluno_ids": alunos})
+    assert res.status_code == 201, res.text
+    clonados = res.json()
+    assert [c["aluno_id"] for c in clonados] == alunos
+    assert (await ac.get(f"/planos/{antigo['id']}")).json()["esta_ativo"] is False
+
+    for clonado in clonados:
+        plano = (await ac.get(f"/planos/{clonado['plano_id']}")).json()
+        assert (plano["aluno_id"], plano["titulo"], plano["esta_ativo"]) == (clonado["aluno_id"], "Bloco Verão (Cópia)", True)
+        assert plano["duracao_semanas"] == 6
+        # Mesma árvore, na mesma ordem, com os campos das prescrições copiados
+        copia = [(t["nome"], [(p["exercicio_id"], p["series"], p["carga_kg"], p["tempo_descanso_segundos"], p["metodo"])
+                             for p in t["prescricoes"]]) for t in plano["treinos"]]
+        esperado = [(t["nome"], [(p["exercicio_id"], p["series"], p["carga_kg"], p["tempo_descanso_segundos"], p["metodo"])
+                                for p in t["prescricoes"]]) for t in template["treinos"]]
+        assert copia == esperado
+
+    res = await ac.post(f"/planos/{template['id']}/clonar-lote", json={"aluno_ids": [alunos[0], 10**6]})
+    assert res.status_code == 404
+
+@pytest.mark.anyio
+async def test_edicao_escreve_so_o_que_mudou_e_recusa_versao_antiga(ac: AsyncClient):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    ex_id = (await ac.post("/exercicios/", json={"nome": "Ex Diff", "grupo_muscular": "Geral"})).json()["id"]
+    aluno_id = (await ac.post("/alunos/", json={"nome": "Aluno Diff", "cpf": gerar_cpf_valido()})).json()["id"]
+    plano = (await ac.post(f"/alunos/{aluno_id}/planos", json={"titulo": "Base", "treinos": [
+        {"nome": n, "prescricoes": [{"exercicio_id": ex_id, "series": 3, "repeticoes": str(r)} for r in range(8)]}
+        for n in ("A", "B", "C")
+    ]})).json()
+    assert plano["versao"] == 1
+
+    # Editor devolve a árvore inteira, com uma só carga alterada e o treino C removido
+    def _como_update(treino):
+        return {"id": treino["id"], "nome": treino["nome"], "prescricoes": [
+            {"id": p["id"], "exercicio_id": p["exercicio_id"], "series": p["series"], "repeticoes": p["repeticoes"],
+             "carga": p["carga_kg"], "descanso": p["tempo_descanso_segundos"], "metodo": p["metodo"]}
+            for p in treino["prescricoes"]
+        ]}
+    treinos = [_como_update(t) for t in plano["treinos"][:2]]
+    treinos[1]["prescricoes"][3]["carga"] = "20kg"
+
+    escritas: list[tuple[str, int]] = []
+
+    def _capturar(conn, cursor, statement, parameters, context, executemany):
+        palavras = statement.split()
+        comando = palavras[0].upper()
+        if comando in ("UPDATE", "DELETE", "INSERT"):
+            tabela = palavras[1] if comando == "UPDATE" else palavras[2]  # DELETE FROM x / INSERT INTO x
+            escritas.append((f"{comando} {tabela}", len(parameters) if executemany else 1))
+
+    event.listen(Engine, "before_cursor_execute", _capturar)
+    try:
+        res = await ac.patch(f"/planos/{plano['id']}", json={"treinos": treinos, "versao": 1})
+    finally:
+        event.remove(Engine, "before_cursor_execute", _capturar)
+    assert res.status_code == 200, res.text
+
+    # Só o plano (versão), a prescrição alterada e as remoções: nada de reescrever as outras 15 linhas
+    assert escritas == [("UPDATE planos_treino", 1), ("DELETE prescricoes", 1), ("DELETE treinos", 1), ("UPDATE prescricoes", 1)]
+    atualizado = res.json()
+    assert atualizado["versao"] == 2
+    assert [t["nome"] for t in atualizado["treinos"]] == ["A", "B"]
+    assert [p["carga_kg"] for p in atualizado["treinos"][1]["prescricoes"]] == [None, None, None, "20kg"] + [None] * 4
+
+    # Exercício inexistente numa prescrição alterada: 409 antes de gravar, versão intacta
+    treinos[0]["prescricoes"][0]["exercicio_id"] = 10**6
+    res = await ac.patch(f"/planos/{plano['id']}", json={"treinos": treinos, "versao": 2})
+    assert res.status_code == 409
+    assert "1000000" in res.json()["message"]
+
+    # Segundo editor ainda com a versão 1: recusado, e nada é gravado
+    res = await ac.patch(f"/planos/{plano['id']}", json={"titulo": "Sobrescrita", "versao": 1})
+    assert res.status_code == 409
+    atual = (await ac.get(f"/planos/{plano['id']}")).json()
+    assert (atual["titulo"], atual["versao"]) == ("Base", 2)
@@ -56,6 +56,101 @@ async def test_frequencia_mensal_retorna_schema_correto(ac: AsyncClient):
     assert 0 <= corpo["taxa_adesao"] <= 1
 
 
+@pytest.mark.anyio
+async def test_frequencia_em_lote_bate_com_a_individual(ac: AsyncClient, como_usuario):
+    from datetime import date
+    hoje = date.today()
+    ref = f"{hoje.month:02d}/{hoje.year}"
+    assiduo = await _criar_aluno(ac, nome="Assíduo", frequencia_semanal_plano=2)
+    faltoso = await _criar_aluno(ac, nome="Faltoso", frequencia_semanal_plano=3)
+    for _ in range(3):
+        await ac.post("/sessoes/", json={"aluno_id": assiduo, "realizada": True})
+    await ac.post("/sessoes/", json={"aluno_id": faltoso, "realizada": False, "precisa_reposicao": True})
+    await ac.post("/pagamentos/", json={
+        "aluno_id": faltoso, "valor": 50.0, "referencia_mes": ref, "forma_pagamento": "PIX", "quantidade_aulas": 4,
+    })
+
+    res = await ac.get("/sessoes/frequencia", params={"referencia_mes": ref})
+    assert res.status_code == 200, res.text
+    lote = res.json()
+    assert [f["aluno_id"] for f in lote] == [assiduo, faltoso]
+    for item in lote:
+        individual = (await ac.get(f"/sessoes/frequencia/{item['aluno_id']}", params={"referencia_mes": ref})).json()
+        assert item == individual
+    assert (lote[0]["sessoes_realizadas"], lote[1]["sessoes_realizadas"]) == (3, 0)
+
+    res = await ac.get("/sessoes/frequencia", params={"aluno_ids": [faltoso]})
+    assert [f["aluno_id"] for f in res.json()] == [faltoso]
+
+    # Outro trainer não enxerga os alunos, mesmo pedindo os ids
+    como_usuario(TRAINER_B)
+    res = await ac.get("/sessoes/frequencia", params={"aluno_ids": [assiduo, faltoso]})
+    assert res.status_code == 200 and res.json() == []
+
+
+@pytest.mark.anyio
+async def test_serie_de_frequencia_bate_com_calculo_mensal(ac: AsyncClient):
+    aluno_id = await _criar_aluno(ac, frequencia_semanal_plano=2)
+    for data_hora, realizada, reposicao in (
+        ("2026-01-31T23:59:59", True, False),   # último segundo de janeiro
+        ("2026-02-01T00:00:00", True, False),
+        ("2026-02-10T10:00:00", False, False),  # falta sem reposição conta
+        ("2026-02-11T10:00:00", False, True),   # falta com reposição não conta
+        ("2026-03-05T10:00:00", True, False),
+    ):
+        await ac.post("/sessoes/", json={
+            "aluno_id": aluno_id, "data_hora": data_hora, "realizada": realizada, "precisa_reposicao": reposicao,
+        })
+    await ac.post("/pagamentos/", json={
+        "aluno_id": aluno_id, "valor": 50.0, "referencia_mes": "02/2026", "forma_pagamento": "PIX", "quantidade_aulas": 2,
+    })
+
+    res = await ac.get(f"/sessoes/frequencia/{aluno_id}/serie", params={"meses": 6, "ate": "06/2026"})
+    assert res.status_code == 200, res.text
+    serie = res.json()
+    assert [m["referencia_mes"] for m in serie] == [f"{m:02d}/2026" for m in range(1, 7)]
+    assert [m["sessoes_realizadas"] for m in serie] == [1, 2, 1, 0, 0, 0]
+    for item in serie:
+        mensal = (await ac.get(f"/sessoes/frequencia/{aluno_id}", params={"referencia_mes": item["referencia_mes"]})).json()
+        assert item == mensal
+
+    # A série cobre de 6 a 24 meses
+    for meses in (5, 25):
+        res = await ac.get(f"/sessoes/frequencia/{aluno_id}/serie", params={"meses": meses})
+        assert res.status_code == 422, res.text
+
+
+@pytest.mark.anyio
+async def test_checkin_em_lote_debita_pacotes_e_avisa_por_aluno(ac: AsyncClient, como_usuario):
+    com_saldo = await _criar_aluno(ac, nome="Com saldo", tipo_pagamento="pacote", saldo_aulas=2)
+    sem_saldo = await _criar_aluno(ac, nome="Sem saldo", tipo_pagamento="pacote", saldo_aulas=0)
+    mensal = await _criar_aluno(ac, nome="Mensal")
+    payload = {
+        "aluno_ids": [com_saldo, sem_saldo, mensal, com_saldo],
+        "data_hora": "2026-07-15T18:00:00",
+        "tipo_atividade": "Funcional em grupo",
+    }
+
+    # Aluno de outro trainer na lista: nada é gravado
+    como_usuario(TRAINER_B)
+    outro = await _criar_aluno(ac, nome="Outro trainer")
+    como_usuario(TRAINER_A)
+    res = await ac.post("/sessoes/lote", json={**payload, "aluno_ids": [com_saldo, outro]})
+    assert res.status_code == 404, res.text
+
+    res = await ac.post("/sessoes/lote", json=payload)
+    assert res.status_code == 201, res.text
+    sessoes = res.json()
+    assert [s["aluno_id"] for s in sessoes] == [com_saldo, sem_saldo, mensal]
+    assert [s["aviso"] is not None for s in sessoes] == [False, True, False]
+    assert all(s["tipo_atividade"] == "Funcional em grupo" for s in sessoes)
+
+    assert (await ac.get(f"/alunos/{com_saldo}")).json()["saldo_aulas"] == 1
+    assert (await ac.get(f"/alunos/{sem_saldo}")).json()["saldo_aulas"] == 0
+    res = await ac.get("/sessoes/", params={"aluno_id": com_saldo})
+    assert [s["id"] for s in res.json()] == [sessoes[0]["id"]]
+
+
 @pytest.mark.anyio
 async def test_checkin_debita_saldo_de_pacote_e_avisa_quando_zera(ac: AsyncClient):
     aluno_id = await _criar_aluno(ac, tipo_pagamento="pacote", saldo_aulas=1)
@@ -108,3 +203,132 @@ async def test_status_invalido_rejeitado(ac: AsyncClient):
     aluno_id = await _criar_aluno(ac)
     res = await ac.patch(f"/alunos/{aluno_id}/status", params={"status": "invalido"})
     assert res.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_paginacao_por_cursor_de_sessoes_nao_repete_nem_pula(ac: AsyncClient):
+    aluno_id = await _criar_aluno(ac)
+    # Dois check-ins no mesmo horário: o id desempata a ordem
+    horarios = ["2026-03-01T10:00:00", "2026-03-02T10:00:00", "2026-03-02T10:00:00", "2026-03-03T10:00:00", "2026-03-04T10:00:00"]
+    for h in horarios:
+        res = await ac.post("/sessoes/", json={"aluno_id": aluno_id, "data_hora": h, "realizada": False})
+        assert res.status_code == 201, res.text
+
+    vistos, cursor = [], None
+    for _ in range(5):
+        params = {"aluno_id": aluno_id, "limit": 2, **({"cursor": cursor} if cursor else {})}
+        res = await ac.get("/sessoes/pagina", params=params)
+        assert res.status_code == 200, res.text
+        corpo = res.json()
+        vistos += corpo["items"]
+        cursor = corpo["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(vistos) == 5
+    assert len({s["id"] for s in vistos}) == 5
+    chaves = [(s["data_hora"], s["id"]) for s in vistos]
+    assert chaves == sorted(chaves, reverse=True)
+
+    # Check-in novo não desloca a página seguinte de quem já está navegando
+    primeira = (await ac.get("/sessoes/pagina", params={"aluno_id": aluno_id, "limit": 2})).json()
+    await ac.post("/sessoes/", json={"aluno_id": aluno_id, "data_hora": "2026-03-05T10:00:00", "realizada": False})
+    segunda = (await ac.get("/sessoes/pagina", params={"aluno_id": aluno_id, "limit": 2, "cursor": primeira["next_cursor"]})).json()
+    assert [s["id"] for s in segunda["items"]] == [s["id"] for s in vistos[2:4]]
+
+    res = await ac.get("/sessoes/pagina", params={"cursor": "invalido"})
+    assert res.status_code == 409
+
+
+@pytest.mark.anyio
+async def test_detalhe_do_aluno_carrega_apenas_colecoes_pedidas(ac: AsyncClient):
+    aluno_id = await _criar_aluno(ac, tipo_pagamento="pacote", saldo_aulas=2)
+    await ac.post("/sessoes/", json={"aluno_id": aluno_id, "realizada": True})
+    await ac.post(f"/alunos/{aluno_id}/planos", json={"titulo": "Plano", "treinos": []})
+
+    res = await ac.get(f"/alunos/{aluno_id}", params={"include": "sessoes"})
+    assert res.status_code == 200, res.text
+    corpo = res.json()
+    assert len(corpo["sessoes"]) == 1
+    assert corpo["planos_treino"] == [] and corpo["pagamentos"] == []
+    # Status do mês continua calculado mesmo sem as coleções
+    assert corpo["aulas_feitas_mes"] == 1
+    assert corpo["saldo_aulas"] == 1
+
+    completo = (await ac.get(f"/alunos/{aluno_id}")).json()
+    assert len(completo["planos_treino"]) == 1 and len(completo["sessoes"]) == 1
+
+    res = await ac.get(f"/alunos/{aluno_id}", params={"include": "planos,historico"})
+    assert res.status_code == 409
+
+
+@pytest.mark.anyio
+async def test_checkin_e_status_nao_carregam_historico_do_aluno(ac: AsyncClient):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    aluno_id = await _criar_aluno(ac)
+    consultas: list[str] = []
+
+    def _capturar(conn, cursor, statement, *args):
+        consultas.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", _capturar)
+    try:
+        res = await ac.post("/sessoes/", json={"aluno_id": aluno_id, "realizada": True})
+        assert res.status_code == 201, res.text
+        res = await ac.patch(f"/alunos/{aluno_id}/status", params={"status": "suspenso"})
+        assert res.status_code == 200, res.text
+    finally:
+        event.remove(Engine, "before_cursor_execute", _capturar)
+
+    assert res.json()["status"] == "suspenso"
+    assert any("FROM alunos" in c for c in consultas)
+    # Nada da árvore de planos nem linhas de histórico (só contagens)
+    assert not any("FROM treinos" in c or "FROM prescricoes" in c for c in consultas)
+    assert not any("pagamentos.forma_pagamento" in c for c in consultas)
+
+
+@pytest.mark.anyio
+async def test_detalhe_do_aluno_embute_historico_em_janela(ac: AsyncClient, monkeypatch):
+    from datetime import date
+    from src import controllers
+    monkeypatch.setattr(controllers, "JANELA_SESSOES", 3)
+
+    aluno_id = await _criar_aluno(ac)
+    for dia in range(1, 6):
+        await ac.post("/sessoes/", json={"aluno_id": aluno_id, "data_hora": f"2026-02-0{dia}T10:00:00", "realizada": False})
+    hoje = date.today()
+    for data_pagamento in (date(hoje.year - 3, 1, 10).isoformat(), hoje.isoformat()):
+        res = await ac.post("/pagamentos/", json={
+            "aluno_id": aluno_id, "valor": 100.0, "referencia_mes": f"{hoje.month:02d}/{hoje.year}",
+            "forma_pagamento": "PIX", "data_pagamento": data_pagamento,
+        })
+        assert res.status_code == 201, res.text
+    ex_id = (await ac.post("/exercicios/", json={"nome": "Remada", "grupo_muscular": "Costas"})).json()["id"]
+    treinos = [{"nome": "A", "prescricoes": [{"exercicio_id": ex_id, "series": 3, "repeticoes": "10"}]}]
+    antigo = (await ac.post(f"/alunos/{aluno_id}/planos", json={"titulo": "Antigo", "treinos": treinos})).json()
+    await ac.post(f"/alunos/{aluno_id}/planos", json={"titulo": "Atual", "treinos": treinos})
+
+    corpo = (await ac.get(f"/alunos/{aluno_id}")).json()
+    historico = corpo["historico"]
+    assert (historico["total_sessoes"], historico["total_pagamentos"], historico["total_planos"]) == (5, 2, 2)
+
+    # Últimas sessões; o cursor continua exatamente de onde a janela parou
+    assert [s["data_hora"][:10] for s in corpo["sessoes"]] == ["2026-02-05", "2026-02-04", "2026-02-03"]
+    resto = (await ac.get(historico["sessoes_url"], params={"cursor": historico["sessoes_next_cursor"]})).json()
+    assert [s["data_hora"][:10] for s in resto["items"]] == ["2026-02-02", "2026-02-01"]
+
+    assert [p["data_pagamento"] for p in corpo["pagamentos"]] == [hoje.isoformat()]
+    resto = (await ac.get(historico["pagamentos_url"], params={"cursor": historico["pagamentos_next_cursor"]})).json()
+    assert [p["data_pagamento"][:4] for p in resto["items"]] == [str(hoje.year - 3)]
+
+    # Plano ativo com a árvore; inativo só cabeçalho, árvore sob demanda
+    assert [(p["titulo"], len(p["treinos"])) for p in corpo["planos_treino"]] == [("Atual", 1), ("Antigo", 0)]
+    plano = (await ac.get(f"/planos/{antigo['id']}")).json()
+    assert plano["treinos"][0]["prescricoes"][0]["exercicio_id"] == ex_id
+
+    res = await ac.delete(f"/alunos/{aluno_id}")
+    assert res.status_code == 204
+    assert (await ac.get(f"/alunos/{aluno_id}")).status_code == 404
+    assert (await ac.get(f"/planos/{antigo['id']}")).status_code == 404
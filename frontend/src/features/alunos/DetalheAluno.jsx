@@ -5,13 +5,20 @@ import {
     CheckCircle2, Trash2, Plus, Eye, ChevronDown, ChevronUp, Copy, Edit,
     ShieldCheck, Zap, BookMarked
 } from 'lucide-react';
-import { alunoService, treinoService } from '../../services/api';
+import { alunoService, treinoService, sessaoService, pagamentoService } from '../../services/api';
 import { ModalPlanoTreino } from './ModalPlanoTreino';
 import { FormAlunoModal } from './FormAlunoModal';
 import { useToast } from '../../components/ToastProvider';
 
 const METODOS_AGRUPADORES = ["Bi-set", "Tri-set", "Giant-set", "Super-set"];
 
+// O detalhe traz só uma janela do histórico; o resto vem em páginas por cursor
+const TAMANHO_PAGINA_HISTORICO = 50;
+const PAGINADORES_HISTORICO = {
+    sessoes: sessaoService.pagina,
+    pagamentos: pagamentoService.pagina,
+};
+
 const METHOD_BG = {
     'Bi-set':    'bg-method-bi/8',
     'Tri-set':   'bg-method-tri/8',
@@ -37,12 +44,21 @@ export const DetalheAluno = ({ alunoId, onBack }) => {
     const [planoEdicao, setPlanoEdicao] = useState(null);
     const [expandirSessoes, setExpandirSessoes] = useState(false);
     const [expandirPagamentos, setExpandirPagamentos] = useState(false);
+    // Itens além da janela embutida e o cursor da próxima página, por tipo de histórico
+    const [historicoExtra, setHistoricoExtra] = useState({ sessoes: [], pagamentos: [] });
+    const [cursores, setCursores] = useState({ sessoes: null, pagamentos: null });
+    const [carregandoHistorico, setCarregandoHistorico] = useState(null);
 
     const carregar = async () => {
         try {
             setLoading(true);
             const data = await alunoService.obterPorId(alunoId);
             setAluno(data);
+            setHistoricoExtra({ sessoes: [], pagamentos: [] });
+            setCursores({
+                sessoes: data.historico?.sessoes_next_cursor ?? null,
+                pagamentos: data.historico?.pagamentos_next_cursor ?? null,
+            });
         } catch {
             setError("Falha ao carregar prontuário");
         } finally {
@@ -72,6 +88,29 @@ export const DetalheAluno = ({ alunoId, onBack }) => {
 
     useEffect(() => { carregar(); }, [alunoId]);
 
+    const carregarMaisHistorico = async (tipo) => {
+        const cursor = cursores[tipo];
+        if (!cursor) return;
+        try {
+            setCarregandoHistorico(tipo);
+            const pagina = await PAGINADORES_HISTORICO[tipo]({
+                aluno_id: alunoId, cursor, limit: TAMANHO_PAGINA_HISTORICO,
+            });
+            setHistoricoExtra(prev => ({ ...prev, [tipo]: [...prev[tipo], ...pagina.items] }));
+            setCursores(prev => ({ ...prev, [tipo]: pagina.next_cursor }));
+        } catch (err) {
+            toast({ tipo: 'erro', texto: 'Erro ao carregar histórico: ' + err.message });
+        } finally {
+            setCarregandoHistorico(null);
+        }
+    };
+
+    const alternarHistorico = (tipo, expandido, setExpandido) => {
+        // Na primeira expansão já busca a página seguinte à janela embutida
+        if (!expandido && historicoExtra[tipo].length === 0) carregarMaisHistorico(tipo);
+        setExpandido(!expandido);
+    };
+
     const handleDeleteAluno = async () => {
         if (confirm(`Tem certeza que deseja EXCLUIR permanentemente o cadastro de ${aluno.nome}? Todos os treinos e históricos serão perdidos.`)) {
             try {
@@ -87,7 +126,7 @@ export const DetalheAluno = ({ alunoId, onBack }) => {
     const handleSavePlano = async (novoPlano) => {
         try {
             if (planoEdicao) {
-                await treinoService.atualizarPlano(planoEdicao.id, novoPlano);
+                await treinoService.atualizarPlano(planoEdicao.id, { ...novoPlano, versao: planoEdicao.versao });
                 toast({ tipo: 'sucesso', texto: 'Plano de treino atualizado com sucesso!' });
             } else {
                 await treinoService.criarPlano(alunoId, novoPlano);
@@ -111,6 +150,19 @@ export const DetalheAluno = ({ alunoId, onBack }) => {
         }
     };
 
+    // O detalhe do aluno traz só o cabeçalho dos planos inativos: a árvore vem sob demanda
+    const handleVerPlano = async (plano) => {
+        if (plano.esta_ativo) {
+            setPlanoSelecionado(plano);
+            return;
+        }
+        try {
+            setPlanoSelecionado(await treinoService.obterPlano(plano.id));
+        } catch (err) {
+            toast({ tipo: 'erro', texto: 'Erro ao carregar plano: ' + err.message });
+        }
+    };
+
     const handleSalvarComoTemplate = async (planoId) => {
         try {
             await treinoService.clonarPlano(planoId, null);
@@ -123,6 +175,7 @@ export const DetalheAluno = ({ alunoId, onBack }) => {
     const handleEditPlano = (plano) => {
         setPlanoEdicao({
             id: plano.id,
+            versao: plano.versao,
             titulo: plano.titulo,
             objetivo_estrategico: plano.objetivo_estrategico,
             detalhes: plano.detalhes,
@@ -174,8 +227,10 @@ export const DetalheAluno = ({ alunoId, onBack }) => {
         </div>
     );
 
-    const sessoesExibidas = expandirSessoes ? aluno.sessoes : aluno.sessoes?.slice(0, 3);
-    const pagamentosExibidos = expandirPagamentos ? aluno.pagamentos : aluno.pagamentos?.slice(0, 3);
+    const sessoesExibidas = expandirSessoes ? [...(aluno.sessoes ?? []), ...historicoExtra.sessoes] : aluno.sessoes?.slice(0, 3);
+    const pagamentosExibidos = expandirPagamentos ? [...(aluno.pagamentos ?? []), ...historicoExtra.pagamentos] : aluno.pagamentos?.slice(0, 3);
+    const totalSessoes = aluno.historico?.total_sessoes ?? aluno.sessoes?.length ?? 0;
+    const totalPagamentos = aluno.historico?.total_pagamentos ?? aluno.pagamentos?.length ?? 0;
 
     return (
         <div className="space-y-8 animate-in fade-in slide-in-from-bottom-8 duration-700 pb-20">
@@ -343,7 +398,7 @@ export const DetalheAluno = ({ alunoId, onBack }) => {
                                         </div>
                                         <div className="flex gap-2">
                                             <button
-                                                onClick={() => setPlanoSelecionado(plano)}
+                                                onClick={() => handleVerPlano(plano)}
                                                 className="flex-1 flex items-center justify-center gap-2 py-2 bg-surface border border-border hover:bg-overlay text-text-primary rounded-lg text-xs font-bold uppercase tracking-widest transition-all shadow-sm"
                                             >
                                                 <Eye size={14} /> Detalhes
@@ -392,12 +447,21 @@ export const DetalheAluno = ({ alunoId, onBack }) => {
                                 )) || (
                                     <p className="text-xs text-text-muted italic py-4">Sem histórico registrado.</p>
                                 )}
-                                {aluno.sessoes?.length > 3 && (
+                                {expandirSessoes && cursores.sessoes && (
+                                    <button
+                                        onClick={() => carregarMaisHistorico('sessoes')}
+                                        disabled={carregandoHistorico === 'sessoes'}
+                                        className="w-full text-center pt-3 text-xs font-bold text-text-secondary hover:text-text-primary uppercase tracking-widest transition-colors disabled:opacity-50"
+                                    >
+                                        {carregandoHistorico === 'sessoes' ? 'Carregando...' : `Carregar mais (${sessoesExibidas.length} de ${totalSessoes})`}
+                                    </button>
+                                )}
+                                {(totalSessoes > 3 || cursores.sessoes) && (
                                     <button
-                                        onClick={() => setExpandirSessoes(!expandirSessoes)}
+                                        onClick={() => alternarHistorico('sessoes', expandirSessoes, setExpandirSessoes)}
                                         className="w-full text-center pt-3 text-xs font-bold text-brand hover:text-brand-hover uppercase tracking-widest flex items-center justify-center gap-1 transition-colors"
                                     >
-                                        {expandirSessoes ? <><ChevronUp size={12} /> Recolher</> : <><ChevronDown size={12} /> Ver Histórico Completo ({aluno.sessoes.length})</>}
+                                        {expandirSessoes ? <><ChevronUp size={12} /> Recolher</> : <><ChevronDown size={12} /> Ver Histórico Completo ({totalSessoes})</>}
                                     </button>
                                 )}
                             </div>
@@ -416,12 +480,21 @@ export const DetalheAluno = ({ alunoId, onBack }) => {
                                 )) || (
                                     <p className="text-xs text-text-muted italic py-4">Sem registros financeiros.</p>
                                 )}
-                                {aluno.pagamentos?.length > 3 && (
+                                {expandirPagamentos && cursores.pagamentos && (
+                                    <button
+                                        onClick={() => carregarMaisHistorico('pagamentos')}
+                                        disabled={carregandoHistorico === 'pagamentos'}
+                                        className="w-full text-center pt-3 text-xs font-bold text-text-secondary hover:text-text-primary uppercase tracking-widest transition-colors disabled:opacity-50"
+                                    >
+                                        {carregandoHistorico === 'pagamentos' ? 'Carregando...' : `Carregar mais (${pagamentosExibidos.length} de ${totalPagamentos})`}
+                                    </button>
+                                )}
+                                {(totalPagamentos > 3 || cursores.pagamentos) && (
                                     <button
-                                        onClick={() => setExpandirPagamentos(!expandirPagamentos)}
+                                        onClick={() => alternarHistorico('pagamentos', expandirPagamentos, setExpandirPagamentos)}
                                         className="w-full text-center pt-3 text-xs font-bold text-brand hover:text-brand-hover uppercase tracking-widest flex items-center justify-center gap-1 transition-colors"
                                     >
-                                        {expandirPagamentos ? <><ChevronUp size={12} /> Recolher</> : <><ChevronDown size={12} /> Ver Todos ({aluno.pagamentos.length})</>}
+                                        {expandirPagamentos ? <><ChevronUp size={12} /> Recolher</> : <><ChevronDown size={12} /> Ver Todos ({totalPagamentos})</>}
                                     </button>
                                 )}
                             </div>
@@ -1,26 +1,69 @@
-import { useEffect, useState } from 'react';
-import { ChevronRight, Plus, UserCircle2, CheckCircle2 } from 'lucide-react';
+import { useEffect, useRef, useState } from 'react';
+import { ChevronRight, Plus, UserCircle2, CheckCircle2, Search } from 'lucide-react';
 import { alunoService } from '../../services/api';
 import { FormAlunoModal } from './FormAlunoModal';
 import { useToast } from '../../components/ToastProvider';
 
+// Busca, status e paginação são resolvidos no servidor; a lista só guarda a página carregada
+const TAMANHO_PAGINA = 50;
+const STATUS_POR_ABA = {
+    ativos: ['ativo'],
+    inativos: ['suspenso', 'cancelado'],
+};
+
 export const ListaAlunosFeature = ({ onSelectAluno }) => {
     const toast = useToast();
     const [isModalOpen, setIsModalOpen] = useState(false);
     const [alunos, setAlunos] = useState([]);
+    const [total, setTotal] = useState(0);
     const [loading, setLoading] = useState(true);
+    const [inicializado, setInicializado] = useState(false);
+    const [carregandoMais, setCarregandoMais] = useState(false);
     const [error, setError] = useState(null);
     const [abaStatus, setAbaStatus] = useState('ativos');
+    const [busca, setBusca] = useState('');
+    const [buscaAplicada, setBuscaAplicada] = useState('');
+    // Só a resposta da consulta mais recente é aplicada (buscas rápidas podem voltar fora de ordem)
+    const consultaAtual = useRef(0);
+
+    const buscarPagina = (offset) => alunoService.buscar({
+        busca: buscaAplicada.trim(),
+        status: STATUS_POR_ABA[abaStatus],
+        limit: TAMANHO_PAGINA,
+        offset,
+    });
 
     const carregarAlunos = async () => {
+        const consulta = ++consultaAtual.current;
         try {
             setLoading(true);
-            const data = await alunoService.listar();
-            setAlunos(data);
+            const pagina = await buscarPagina(0);
+            if (consulta !== consultaAtual.current) return;
+            setAlunos(pagina.items);
+            setTotal(pagina.total);
+            setError(null);
         } catch (err) {
-            setError(err.message);
+            if (consulta === consultaAtual.current) setError(err.message);
         } finally {
-            setLoading(false);
+            if (consulta === consultaAtual.current) {
+                setLoading(false);
+                setInicializado(true);
+            }
+        }
+    };
+
+    const carregarMais = async () => {
+        const consulta = consultaAtual.current;
+        try {
+            setCarregandoMais(true);
+            const pagina = await buscarPagina(alunos.length);
+            if (consulta !== consultaAtual.current) return;
+            setAlunos(prev => [...prev, ...pagina.items]);
+            setTotal(pagina.total);
+        } catch (err) {
+            toast({ tipo: 'erro', texto: 'Erro ao carregar alunos: ' + err.message });
+        } finally {
+            setCarregandoMais(false);
         }
     };
 
@@ -35,16 +78,17 @@ export const ListaAlunosFeature = ({ onSelectAluno }) => {
         }
     };
 
+    // Espera o usuário parar de digitar antes de consultar o servidor
     useEffect(() => {
-        carregarAlunos();
-    }, []);
+        const timer = setTimeout(() => setBuscaAplicada(busca), 300);
+        return () => clearTimeout(timer);
+    }, [busca]);
 
-    const alunosFiltrados = alunos.filter(aluno => {
-        if (abaStatus === 'ativos') return aluno.status === 'ativo';
-        return aluno.status === 'suspenso' || aluno.status === 'cancelado';
-    });
+    useEffect(() => {
+        carregarAlunos();
+    }, [abaStatus, buscaAplicada]);
 
-    if (loading) {
+    if (loading && !inicializado) {
         return (
             <div className="flex flex-col items-center justify-center py-32 space-y-4">
                 <div className="w-10 h-10 border-2 border-brand/20 border-t-brand rounded-full animate-spin"></div>
@@ -94,19 +138,31 @@ export const ListaAlunosFeature = ({ onSelectAluno }) => {
                 ))}
             </div>
 
+            <div className="relative mx-2">
+                <Search size={16} className="absolute left-4 top-1/2 -translate-y-1/2 text-text-muted" />
+                <input
+                    type="search"
+                    value={busca}
+                    onChange={(e) => setBusca(e.target.value)}
+                    placeholder="Buscar por nome ou CPF..."
+                    aria-label="Buscar aluno por nome ou CPF"
+                    className="w-full bg-surface border border-border rounded-xl pl-11 pr-4 py-3 text-sm text-text-primary outline-none focus:ring-2 focus:ring-brand/10 transition-all placeholder:text-text-muted"
+                />
+            </div>
+
             {error && (
                 <div className="p-4 bg-danger/10 border border-danger/20 text-danger text-xs font-bold uppercase tracking-wide rounded-xl mx-2">
                     Erro ao carregar: {error}
                 </div>
             )}
 
-            {alunosFiltrados.length === 0 ? (
+            {alunos.length === 0 ? (
                 <div className="py-20 sm:py-32 border border-dashed border-border rounded-xl text-center mx-2 bg-surface/50">
                     <p className="text-text-muted font-medium italic">Nenhum aluno encontrado nesta categoria.</p>
                 </div>
             ) : (
                 <div className="mx-2 bg-surface border border-border rounded-xl overflow-hidden shadow-sm">
-                    {alunosFiltrados.map((aluno, idx) => (
+                    {alunos.map((aluno, idx) => (
                         <div
                             key={aluno.id}
                             role="button"
@@ -120,7 +176,7 @@ export const ListaAlunosFeature = ({ onSelectAluno }) => {
                             }}
                             aria-label={`Ver prontuário de ${aluno.nome}`}
                             className={`group flex items-center gap-3 sm:gap-4 p-4 transition-colors duration-150 cursor-pointer hover:bg-overlay active:bg-overlay focus-visible:outline-none focus-visible:ring-2 focus-visible:ring-brand/30
-                                ${idx !== alunosFiltrados.length - 1 ? 'border-b border-border/60' : ''}
+                                ${idx !== alunos.length - 1 ? 'border-b border-border/60' : ''}
                                 ${aluno.status !== 'ativo' ? 'opacity-75' : ''}`}
                         >
                             <div className="w-10 h-10 sm:w-11 sm:h-11 rounded-lg bg-overlay flex items-center justify-center text-text-muted group-hover:bg-brand/10 group-hover:text-brand transition-colors">
@@ -172,6 +228,19 @@ export const ListaAlunosFeature = ({ onSelectAluno }) => {
                 </div>
             )}
 
+            {alunos.length < total && (
+                <div className="flex flex-col items-center gap-2 mx-2">
+                    <button
+                        onClick={carregarMais}
+                        disabled={carregandoMais}
+                        className="px-5 py-2 text-xs font-bold text-brand hover:text-brand-hover uppercase tracking-widest transition-colors disabled:opacity-50"
+                    >
+                        {carregandoMais ? 'Carregando...' : 'Carregar mais'}
+                    </button>
+                    <p className="text-xs text-text-muted">{alunos.length} de {total} alunos</p>
+                </div>
+            )}
+
             <FormAlunoModal
                 isOpen={isModalOpen}
                 onClose={() => setIsModalOpen(false)}
@@ -1,11 +1,16 @@
 import { useState, useEffect } from 'react';
-import { X, DollarSign, UserCircle2, Calendar, Hash } from 'lucide-react';
+import { X, DollarSign, UserCircle2, Calendar, Hash, Search } from 'lucide-react';
 import { alunoService, pagamentoService } from '../../services/api';
 import { useToast } from '../../components/ToastProvider';
 
+// O seletor mostra só os primeiros resultados da busca no servidor, não o roster inteiro
+const LIMITE_SUGESTOES = 20;
+
 export const ModalPagamento = ({ isOpen, onClose, onSuccess }) => {
     const toast = useToast();
     const [alunos, setAlunos] = useState([]);
+    const [totalAlunos, setTotalAlunos] = useState(0);
+    const [buscaAluno, setBuscaAluno] = useState('');
     const [loading, setLoading] = useState(false);
     const [alunoSelecionado, setAlunoSelecionado] = useState(null);
     const [formData, setFormData] = useState({
@@ -18,22 +23,34 @@ export const ModalPagamento = ({ isOpen, onClose, onSuccess }) => {
     });
 
     useEffect(() => {
-        if (isOpen) {
-            alunoService.listar().then(setAlunos).catch(console.error);
-        }
-    }, [isOpen]);
+        if (!isOpen) return;
+        let ativo = true;
+        const timer = setTimeout(() => {
+            alunoService.buscar({ busca: buscaAluno.trim(), limit: LIMITE_SUGESTOES })
+                .then(({ items, total }) => {
+                    if (!ativo) return;
+                    setAlunos(items);
+                    setTotalAlunos(total);
+                })
+                .catch(console.error);
+        }, 300);
+        return () => { ativo = false; clearTimeout(timer); };
+    }, [isOpen, buscaAluno]);
 
-    useEffect(() => {
-        if (formData.aluno_id) {
-            const aluno = alunos.find(a => a.id === parseInt(formData.aluno_id));
-            setAlunoSelecionado(aluno);
-            if (aluno && aluno.tipo_pagamento === 'pacote' && !formData.valor) {
-                setFormData(prev => ({ ...prev, valor: aluno.valor_mensalidade }));
-            }
-        } else {
-            setAlunoSelecionado(null);
-        }
-    }, [formData.aluno_id, alunos]);
+    const selecionarAluno = (alunoId) => {
+        // O selecionado fica guardado: uma nova busca pode tirá-lo da lista de sugestões
+        const aluno = alunos.find(a => a.id === parseInt(alunoId)) ?? null;
+        setAlunoSelecionado(aluno);
+        setFormData(prev => ({
+            ...prev,
+            aluno_id: alunoId,
+            valor: aluno?.tipo_pagamento === 'pacote' && !prev.valor ? aluno.valor_mensalidade : prev.valor,
+        }));
+    };
+
+    const opcoesAlunos = alunoSelecionado && !alunos.some(a => a.id === alunoSelecionado.id)
+        ? [alunoSelecionado, ...alunos]
+        : alunos;
 
     if (!isOpen) return null;
 
@@ -80,17 +97,33 @@ export const ModalPagamento = ({ isOpen, onClose, onSuccess }) => {
                         <label className="text-xs font-bold text-text-secondary uppercase tracking-wide ml-1 flex items-center gap-2">
                             <UserCircle2 size={14} className="text-brand" /> Aluno Pagador
                         </label>
+                        <div className="relative">
+                            <Search size={14} className="absolute left-5 top-1/2 -translate-y-1/2 text-text-muted" />
+                            <input
+                                type="search"
+                                className="w-full bg-overlay border border-border rounded-2xl pl-11 pr-5 py-3 text-text-primary font-medium outline-none focus:ring-2 focus:ring-brand/10 transition-all placeholder:text-text-muted"
+                                value={buscaAluno}
+                                onChange={(e) => setBuscaAluno(e.target.value)}
+                                placeholder="Buscar por nome ou CPF..."
+                                aria-label="Buscar aluno pagador"
+                            />
+                        </div>
                         <select
                             required
                             className="w-full bg-overlay border border-border rounded-2xl px-5 py-4 text-text-primary font-bold outline-none focus:ring-2 focus:ring-brand/10 transition-all appearance-none cursor-pointer"
                             value={formData.aluno_id}
-                            onChange={(e) => setFormData({...formData, aluno_id: e.target.value})}
+                            onChange={(e) => selecionarAluno(e.target.value)}
                         >
                             <option value="">Selecione o atleta...</option>
-                            {alunos.map(aluno => (
+                            {opcoesAlunos.map(aluno => (
                                 <option key={aluno.id} value={aluno.id}>{aluno.nome} ({aluno.tipo_pagamento})</option>
                             ))}
                         </select>
+                        {totalAlunos > alunos.length && (
+                            <p className="text-2xs text-text-muted font-medium ml-1">
+                                Mostrando {alunos.length} de {totalAlunos} alunos. Refine a busca para encontrar outros.
+                            </p>
+                        )}
                     </div>
 
                     <div className="grid grid-cols-2 gap-6">
@@ -1,10 +1,9 @@
 import { useState, useEffect } from 'react';
 import { Dumbbell, Plus, Book, CheckCircle2, AlertCircle, Trash2, Pencil } from 'lucide-react';
-import { alunoService, treinoService } from '../../services/api';
+import { treinoService } from '../../services/api';
 import { ModalPlanoTreino } from '../alunos/ModalPlanoTreino';
 
 export const ModuloTreinos = () => {
-    const [alunos, setAlunos] = useState([]);
     const [loading, setLoading] = useState(false);
     const [mensagem, setMensagem] = useState({ tipo: '', texto: '' });
     const [isModalOpen, setIsModalOpen] = useState(false);
@@ -13,12 +12,7 @@ export const ModuloTreinos = () => {
 
     const carregarDados = async () => {
         try {
-            const [listaAlunos, listaTemplates] = await Promise.all([
-                alunoService.listar(),
-                treinoService.listarTemplates()
-            ]);
-            setAlunos(listaAlunos);
-            setTemplates(listaTemplates);
+            setTemplates(await treinoService.listarTemplates());
         } catch {
             // falha silenciosa — dados ficam em estado vazio
         }
@@ -32,7 +26,7 @@ export const ModuloTreinos = () => {
         setLoading(true);
         try {
             if (templateEdicao) {
-                await treinoService.atualizarPlano(templateEdicao.id, payload);
+                await treinoService.atualizarPlano(templateEdicao.id, { ...payload, versao: templateEdicao.versao });
                 setMensagem({ tipo: 'sucesso', texto: 'Modelo atualizado com sucesso!' });
             } else if (payload.aluno_id) {
                 await treinoService.criarPlano(payload.aluno_id, payload);
@@ -1,13 +1,26 @@
 const BASE_URL = import.meta.env.VITE_API_URL || (import.meta.env.PROD ? '' : 'http://127.0.0.1:8000');
 
 /**
- * Utilitário base para chamadas API
+ * Query string sem parâmetros vazios; listas viram o parâmetro repetido (?status=a&status=b)
  */
-async function apiFetch(endpoint, options = {}) {
+function montarQuery(params = {}) {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([chave, valor]) => {
+        if (valor === null || valor === undefined || valor === '') return;
+        (Array.isArray(valor) ? valor : [valor]).forEach((v) => query.append(chave, v));
+    });
+    return query.toString();
+}
+
+/**
+ * Requisição base: autenticação e tratamento de erro; devolve a Response (para ler headers)
+ */
+async function apiRequest(endpoint, options = {}) {
     const token = localStorage.getItem('token');
     
     const headers = {
-        'Content-Type': 'application/json',
+        // Uploads (FormData) deixam o navegador definir o multipart com boundary
+        ...(options.body instanceof FormData ? {} : { 'Content-Type': 'application/json' }),
         ...options.headers,
     };
 
@@ -32,13 +45,27 @@ async function apiFetch(endpoint, options = {}) {
         throw new Error(errorData.message || 'Erro na comunicação com o servidor');
     }
 
+    return response;
+}
+
+/**
+ * Utilitário base para chamadas API
+ */
+async function apiFetch(endpoint, options = {}) {
+    const response = await apiRequest(endpoint, options);
+
     if (response.status === 204) return null;
     
     return response.json();
 }
 
 export const alunoService = {
-    listar: () => apiFetch('/alunos/'),
+    // Roster filtrado no servidor (busca, status, limit, offset); total vem do header X-Total-Count
+    buscar: async (params) => {
+        const response = await apiRequest(`/alunos/?${montarQuery(params)}`);
+        const items = await response.json();
+        return { items, total: Number(response.headers.get('X-Total-Count') ?? items.length) };
+    },
     obterPorId: (id) => apiFetch(`/alunos/${id}`),
     criar: (dados) => apiFetch('/alunos/', {
         method: 'POST',
@@ -71,6 +98,7 @@ export const treinoService = {
     }),
     
     // Gestão de Planos
+    obterPlano: (planoId) => apiFetch(`/planos/${planoId}`),
     criarPlano: (alunoId, dados) => apiFetch(`/alunos/${alunoId}/planos`, {
         method: 'POST',
         body: JSON.stringify(dados),
@@ -86,6 +114,22 @@ export const treinoService = {
         const url = alunoId ? `/planos/${planoId}/clonar?aluno_id=${alunoId}` : `/planos/${planoId}/clonar`;
         return apiFetch(url, { method: 'POST' });
     },
+    // Autosave: envia só as operações alteradas; versao faz o servidor recusar (409) edição concorrente
+    aplicarOperacoes: (planoId, operacoes, versao = null) => apiFetch(`/planos/${planoId}/operacoes`, {
+        method: 'POST',
+        body: JSON.stringify({ versao, operacoes }),
+    }),
+    atualizarPrescricao: (prescricaoId, campos) => apiFetch(`/prescricoes/${prescricaoId}`, {
+        method: 'PATCH',
+        body: JSON.stringify(campos),
+    }),
+    deletarPrescricao: (prescricaoId) => apiFetch(`/prescricoes/${prescricaoId}`, {
+        method: 'DELETE',
+    }),
+    clonarPlanoEmLote: (planoId, alunoIds) => apiFetch(`/planos/${planoId}/clonar-lote`, {
+        method: 'POST',
+        body: JSON.stringify({ aluno_ids: alunoIds }),
+    }),
 
     // Templates Globais
     listarTemplates: () => apiFetch('/planos/templates'),
@@ -101,6 +145,13 @@ export const financeiroService = {
 
 export const pagamentoService = {
     listar: () => apiFetch('/pagamentos/'),
+    // Página por cursor: repasse o next_cursor recebido para obter a próxima
+    pagina: (params) => apiFetch(`/pagamentos/pagina?${montarQuery(params)}`),
+    importar: (arquivo) => {
+        const form = new FormData();
+        form.append('arquivo', arquivo);
+        return apiFetch('/pagamentos/importar', { method: 'POST', body: form });
+    },
     registrar: (dados) => apiFetch('/pagamentos/', {
         method: 'POST',
         body: JSON.stringify(dados),
@@ -119,12 +170,25 @@ export const sessaoService = {
         const query = new URLSearchParams(params).toString();
         return apiFetch(`/sessoes/?${query}`);
     },
+    // Página por cursor: repasse o next_cursor recebido para obter a próxima
+    pagina: (params) => apiFetch(`/sessoes/pagina?${montarQuery(params)}`),
     frequencia: (alunoId, referenciaMes) =>
         apiFetch(`/sessoes/frequencia/${alunoId}?referencia_mes=${encodeURIComponent(referenciaMes)}`),
+    serieFrequencia: (alunoId, meses = 12) =>
+        apiFetch(`/sessoes/frequencia/${alunoId}/serie?meses=${meses}`),
+    frequenciaLote: (referenciaMes, alunoIds = []) => {
+        const query = new URLSearchParams({ referencia_mes: referenciaMes });
+        alunoIds.forEach((id) => query.append('aluno_ids', id));
+        return apiFetch(`/sessoes/frequencia?${query}`);
+    },
     registrar: (dados) => apiFetch('/sessoes/', {
         method: 'POST',
         body: JSON.stringify(dados),
     }),
+    registrarLote: (dados) => apiFetch('/sessoes/lote', {
+        method: 'POST',
+        body: JSON.stringify(dados),
+    }),
     deletar: (id) => apiFetch(`/sessoes/${id}`, {
         method: 'DELETE',
     }),